@@ -2,21 +2,64 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bootstrap import Bootstrap
-from config import Config
+from sqlalchemy import event
+from config import get_config
+from app.tenancy import TenantSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': TenantSession})
 migrate = Migrate()
 bootstrap = Bootstrap()
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(config_class)
+    app.config.from_object(config_class or get_config())
 
     db.init_app(app)
+    configure_sqlite(app)
     migrate.init_app(app, db)
     bootstrap.init_app(app)
 
     from app import routes
     app.register_blueprint(routes.bp)
 
+    from app import (
+        catalogue, events, history_store, history_writer, order_form, page_cache, query_metrics, seeding, tenancy
+    )
+    from app.models import ProductHistory
+    # En premier : les requêtes SQL des autres hooks before_request sont aussi comptées
+    query_metrics.init_app(app)
+    tenancy.init_app(app, db)
+    catalogue.init_app(app)
+    catalogue.register_commands(app)
+    seeding.register_commands(app)
+    order_form.register_commands(app)
+    history_store.register_commands(app)
+    history_writer.init_app(app, db, ProductHistory.__table__, app.extensions.get(tenancy.ENGINES_KEY))
+    page_cache.init_app(app)
+    events.init_app(app)
+
     return app
+
+
+def configure_sqlite(app):
+    """Applique les PRAGMA de ``SQLITE_PRAGMAS`` à chaque nouvelle connexion SQLite."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+
+    with app.app_context():
+        engine = db.engine
+    apply_sqlite_pragmas(engine, pragmas)
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Applique les PRAGMA donnés à chaque nouvelle connexion du moteur."""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
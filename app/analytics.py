@@ -0,0 +1,170 @@
+"""Analyse de la consommation et prévision des commandes.
+
+Les consommations sont les baisses nettes de quantité de chaque mise à jour
+de l'historique, tous emplacements confondus (les remises à zéro et les
+entrées de stock sont ignorées) : les lignes d'un transfert entre
+emplacements partagent le même horodatage et s'annulent. Elles sont
+agrégées par produit et par jour côté SQL, puis les fenêtres
+glissantes sont calculées avec NumPy sur la matrice produits × jours, sans
+boucle Python sur les lignes d'historique.
+
+Les règles d'usage du bon de commande (« (1/RA) », « (5 poches/RA) »,
+« 1 pour 2 RA », « avoir toujours 5 unités en stock ») servent de repli
+quand l'historique ne montre aucune consommation, et de stock minimal.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+
+from app import db
+from app.catalogue import current_mapping, get_catalogue
+from app.models import ProductHistory
+from app.tenancy import current_tenant
+
+_PER_SESSIONS = re.compile(r'(\d+)\s+pour\s+(\d+)\s*RA', re.IGNORECASE)
+_PER_SESSION = re.compile(r'\(\s*(\d+)(?:\s+\w+)?\s*/\s*RA\s*\)', re.IGNORECASE)
+_MIN_STOCK = re.compile(r'(\d+)\s+unités?\s+en\s+stock', re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class UsageRule:
+    """Règle d'usage d'un produit : quantité par séance (RA) et stock minimal."""
+    per_session: float = None
+    min_stock: int = 0
+
+
+def parse_usage_rule(text):
+    """Extrait la règle d'usage d'un libellé de bon de commande."""
+    per_session = None
+    match = _PER_SESSIONS.search(text)
+    if match:
+        per_session = int(match.group(1)) / int(match.group(2))
+    else:
+        match = _PER_SESSION.search(text)
+        if match:
+            per_session = float(match.group(1))
+    match = _MIN_STOCK.search(text)
+    return UsageRule(per_session, int(match.group(1)) if match else 0)
+
+
+def usage_rules(mapping=None):
+    """Règle d'usage de chaque produit (celle du premier libellé qui en a une)."""
+    mapping = current_mapping() if mapping is None else mapping
+    rules = {}
+    for product, names in mapping.items():
+        parsed = [parse_usage_rule(name) for name in names]
+        rules[product] = next(
+            (rule for rule in parsed if rule.per_session is not None or rule.min_stock),
+            UsageRule()
+        )
+    return rules
+
+
+def daily_consumption(days, end=None):
+    """Consommation quotidienne de chaque produit du tenant sur les ``days`` jours précédant ``end``.
+
+    Returns:
+        tuple: (liste des noms, matrice ``numpy`` noms × jours, le plus récent à droite)
+    """
+    end = end or datetime.utcnow()
+    start = end - timedelta(days=days)
+    # Variation nette de chaque opération, tous emplacements confondus ; le
+    # produit du catalogue est lu dans l'historique, qui survit à la
+    # suppression de la ligne de stock
+    operations = (
+        select(ProductHistory.catalogue_id, ProductHistory.timestamp,
+               func.sum(ProductHistory.old_quantity - ProductHistory.new_quantity).label('consumed'))
+        .where(
+            ProductHistory.tenant == current_tenant(),
+            ProductHistory.action == 'update',
+            ProductHistory.catalogue_id.is_not(None),
+            ProductHistory.timestamp >= start,
+            ProductHistory.timestamp < end,
+        )
+        .group_by(ProductHistory.catalogue_id, ProductHistory.timestamp)
+        .subquery()
+    )
+    # Nombre de jours écoulés depuis le début de la fenêtre
+    offset = cast(func.julianday(operations.c.timestamp) - func.julianday(start), Integer)
+    rows = db.session.execute(
+        select(operations.c.catalogue_id, offset, func.sum(operations.c.consumed))
+        .where(operations.c.consumed > 0)
+        .group_by(operations.c.catalogue_id, offset)
+    ).all()
+
+    catalogue = get_catalogue()
+    names = list(catalogue.names)
+    matrix = np.zeros((len(names), days), dtype=np.int64)
+    index = {catalogue.id_of(name): position for position, name in enumerate(names)}
+    # L'historique peut désigner un produit retiré depuis du catalogue
+    rows = [row for row in rows if row[0] in index]
+    if rows:
+        # Lignes déjà agrégées par produit et par jour : au plus produits × jours
+        positions = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        offsets = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        quantities = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+        np.add.at(matrix, (positions, np.clip(offsets, 0, days - 1)), quantities)
+    return names, matrix
+
+
+def rolling_rates(matrix, window):
+    """Moyenne glissante (par jour) de chaque ligne de la matrice sur ``window`` jours."""
+    cumulative = np.concatenate(
+        [np.zeros((matrix.shape[0], 1), dtype=np.int64), np.cumsum(matrix, axis=1)], axis=1
+    )
+    end = np.arange(1, matrix.shape[1] + 1)
+    start = np.maximum(end - window, 0)
+    return (cumulative[:, end] - cumulative[:, start]) / window
+
+
+def forecast(window_days=28, coverage_days=28, sessions_per_week=6, stock=None, end=None):
+    """Prévision de rupture et quantité à commander pour chaque produit.
+
+    Le débit observé sur la dernière fenêtre est utilisé s'il est positif,
+    sinon celui déduit de la règle d'usage et du nombre de séances.
+
+    Args:
+        window_days (int): Fenêtre d'observation de la consommation
+        coverage_days (int): Nombre de jours que la commande doit couvrir
+        sessions_per_week (float): Nombre de séances de dialyse par semaine
+        stock (dict): Stock total par produit (par défaut, l'inventaire courant)
+
+    Returns:
+        dict: ``{nom: {'stock', 'daily_rate', 'rate_source', 'days_until_stockout',
+        'suggested_order'}}``
+    """
+    if stock is None:
+        from app.totals import compute_product_totals
+        stock = {name: totals['total'] for name, totals in compute_product_totals().items()}
+
+    names, matrix = daily_consumption(window_days, end)
+    names += [name for name in stock if name not in names]
+    observed = np.zeros(len(names))
+    observed[:matrix.shape[0]] = rolling_rates(matrix, window_days)[:, -1]
+
+    rules = usage_rules()
+    rule_rates = np.array([
+        (rules[name].per_session or 0) * sessions_per_week / 7 if name in rules else 0
+        for name in names
+    ])
+    min_stock = np.array([rules[name].min_stock if name in rules else 0 for name in names])
+    stock_levels = np.array([stock.get(name, 0) for name in names], dtype=float)
+
+    rates = np.where(observed > 0, observed, rule_rates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.where(rates > 0, stock_levels / rates, np.inf)
+    suggested = np.maximum(np.ceil(rates * coverage_days) + min_stock - stock_levels, 0)
+
+    return {
+        name: {
+            'stock': int(stock_levels[index]),
+            'daily_rate': round(float(rates[index]), 3),
+            'rate_source': 'history' if observed[index] > 0 else ('rule' if rule_rates[index] > 0 else None),
+            'days_until_stockout': None if np.isinf(days_left[index]) else round(float(days_left[index]), 1),
+            'suggested_order': int(suggested[index]),
+        }
+        for index, name in enumerate(names)
+    }
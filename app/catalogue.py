@@ -0,0 +1,254 @@
+"""Catalogue des produits et des emplacements, stocké en base et lu au travers d'un cache.
+
+Les produits et les libellés du bon de commande sont dans les tables
+``catalogue_product`` et ``catalogue_alias``, les emplacements de stockage
+dans la table ``location`` ; l'inventaire y fait référence par des IDs
+entiers. Le catalogue est chargé une fois en mémoire sous forme de
+dictionnaires (nom -> ID, ID -> nom, nom -> libellés) : les recherches et
+la validation des emplacements sont en O(1) et ne touchent pas la base.
+
+La ligne ``catalogue_state`` porte un numéro de version incrémenté à
+chaque modification. Le cache le relit au plus toutes les
+``CATALOGUE_CHECK_INTERVAL`` secondes et se recharge s'il a changé ; une
+modification faite par ce processus invalide le cache immédiatement.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import func, select, update
+
+from app import db
+
+EXTENSION_KEY = 'catalogue'
+
+# Noms déjà utilisés à côté des emplacements (colonne des totaux, filtre « tous »)
+RESERVED_LOCATION_NAMES = frozenset({'total', 'all'})
+
+
+@dataclass(frozen=True)
+class Catalogue:
+    """Instantané immuable du catalogue."""
+    version: int
+    names: tuple       # Noms dans l'ordre d'affichage
+    ids: dict          # nom -> ID
+    names_by_id: dict  # ID -> nom
+    mapping: dict      # nom -> libellés du bon de commande
+    locations: tuple        # Emplacements dans l'ordre d'affichage
+    location_codes: dict    # emplacement -> code entier
+    location_names: dict    # code entier -> emplacement
+    location_labels: dict   # emplacement -> libellé affiché
+
+    def id_of(self, name):
+        return self.ids.get(name)
+
+    def require_id(self, name):
+        """ID d'un produit du catalogue.
+
+        Raises:
+            ValueError: Si le produit n'est pas au catalogue
+        """
+        try:
+            return self.ids[name]
+        except KeyError:
+            raise ValueError(f'Produit inconnu du catalogue: {name}') from None
+
+    def name_of(self, catalogue_id):
+        return self.names_by_id.get(catalogue_id)
+
+    def location_code_of(self, location):
+        return self.location_codes.get(location)
+
+    def require_location_code(self, location):
+        """Code entier d'un emplacement.
+
+        Raises:
+            ValueError: Si l'emplacement n'existe pas
+        """
+        try:
+            return self.location_codes[location]
+        except (KeyError, TypeError):
+            raise ValueError(f"Location must be one of: {', '.join(self.locations)}") from None
+
+    def location_name_of(self, code):
+        return self.location_names.get(code)
+
+
+def _read_version():
+    from app.models import CatalogueState
+    return db.session.execute(select(CatalogueState.version).where(CatalogueState.id == 1)).scalar() or 0
+
+
+def load_catalogue(version=None):
+    """Lit le catalogue complet en trois requêtes."""
+    from app.models import CatalogueAlias, CatalogueProduct, Location
+    if version is None:
+        version = _read_version()
+    rows = db.session.execute(
+        select(CatalogueProduct.id, CatalogueProduct.name)
+        .order_by(CatalogueProduct.position, CatalogueProduct.id)
+    ).all()
+    names_by_id = {catalogue_id: name for catalogue_id, name in rows}
+    mapping = {name: [] for _, name in rows}
+    for catalogue_id, label in db.session.execute(
+            select(CatalogueAlias.catalogue_id, CatalogueAlias.label).order_by(CatalogueAlias.id)):
+        mapping[names_by_id[catalogue_id]].append(label)
+    locations = db.session.execute(
+        select(Location.id, Location.name, Location.label).order_by(Location.position, Location.id)
+    ).all()
+    return Catalogue(
+        version=version,
+        names=tuple(mapping),
+        ids={name: catalogue_id for catalogue_id, name in rows},
+        names_by_id=names_by_id,
+        mapping={name: labels for name, labels in mapping.items() if labels},
+        locations=tuple(name for _, name, _ in locations),
+        location_codes={name: code for code, name, _ in locations},
+        location_names={code: name for code, name, _ in locations},
+        location_labels={name: label for _, name, label in locations},
+    )
+
+
+class CatalogueCache:
+    """Cache du catalogue, rechargé quand sa version change."""
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._catalogue = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        catalogue = self._catalogue
+        if catalogue is not None and time.monotonic() - self._checked < self.check_interval:
+            return catalogue
+        with self._lock, db.session.no_autoflush:
+            version = _read_version()
+            if self._catalogue is None or self._catalogue.version != version:
+                self._catalogue = load_catalogue(version)
+            self._checked = time.monotonic()
+            return self._catalogue
+
+    def invalidate(self):
+        self._catalogue = None
+
+
+def init_app(app):
+    app.extensions[EXTENSION_KEY] = CatalogueCache(app.config.get('CATALOGUE_CHECK_INTERVAL', 5.0))
+
+
+def get_catalogue():
+    """Catalogue en service (depuis le cache de l'application)."""
+    return current_app.extensions[EXTENSION_KEY].get()
+
+
+def current_mapping():
+    """Libellés du bon de commande par produit ; catalogue initial hors application."""
+    if has_app_context():
+        return get_catalogue().mapping
+    from app.models import PRODUCT_NAME_MAPPING
+    return PRODUCT_NAME_MAPPING
+
+
+def _bump_version():
+    from app.models import CatalogueState
+    db.session.execute(update(CatalogueState).values(version=CatalogueState.version + 1))
+
+
+def save_product(name, aliases=None):
+    """Crée ou met à jour un produit du catalogue et valide la transaction.
+
+    Args:
+        name (str): Nom du produit
+        aliases (list): Libellés du bon de commande (inchangés si None)
+
+    Returns:
+        tuple: (CatalogueProduct, True s'il a été créé)
+    """
+    from app.models import CatalogueAlias, CatalogueProduct
+    name = (name or '').strip()
+    if not name:
+        raise ValueError('Le nom du produit est obligatoire')
+    try:
+        product = CatalogueProduct.query.filter_by(name=name).first()
+        created = product is None
+        if created:
+            position = db.session.query(func.max(CatalogueProduct.position)).scalar()
+            product = CatalogueProduct(name=name, position=(position or 0) + 1)
+            db.session.add(product)
+        if aliases is not None:
+            product.aliases = [CatalogueAlias(label=str(label)) for label in aliases]
+        _bump_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    current_app.extensions[EXTENSION_KEY].invalidate()
+    return product, created
+
+
+def save_location(name, label=None):
+    """Crée un emplacement de stockage, ou change son libellé, et valide la transaction.
+
+    Le code entier d'un emplacement ne change jamais : l'inventaire,
+    l'historique et les instantanés y font référence.
+
+    Args:
+        name (str): Nom de l'emplacement
+        label (str): Libellé affiché (par défaut, le nom ; inchangé si None
+            pour un emplacement existant)
+
+    Raises:
+        ValueError: Si le nom est vide, réservé ou n'est pas un identifiant
+            (il sert de clé des totaux et de classe CSS)
+
+    Returns:
+        tuple: (Location, True s'il a été créé)
+    """
+    from app.models import Location
+    name = (name or '').strip()
+    if not name:
+        raise ValueError("Le nom de l'emplacement est obligatoire")
+    if not name.isidentifier():
+        raise ValueError(f"Nom d'emplacement invalide (lettres, chiffres et _ uniquement) : {name}")
+    if name in RESERVED_LOCATION_NAMES:
+        raise ValueError(f"Nom d'emplacement réservé : {name}")
+    try:
+        location = Location.query.filter_by(name=name).first()
+        created = location is None
+        if created:
+            code, position = db.session.execute(
+                select(func.max(Location.id), func.max(Location.position))
+            ).one()
+            location = Location(id=(code or 0) + 1, name=name, position=(position or 0) + 1,
+                                label=label or name.title())
+            db.session.add(location)
+        elif label is not None:
+            location.label = label
+        _bump_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    current_app.extensions[EXTENSION_KEY].invalidate()
+    return location, created
+
+
+def register_commands(app):
+    @app.cli.command('catalogue-add')
+    @click.argument('name')
+    @click.option('--alias', 'aliases', multiple=True, help='Libellé du bon de commande (répétable)')
+    def catalogue_add_command(name, aliases):
+        """Ajoute un produit au catalogue, ou remplace ses libellés."""
+        _, created = save_product(name, list(aliases) if aliases else None)
+        click.echo(f"{name}: {'ajouté' if created else 'mis à jour'}")
+
+    @app.cli.command('location-add')
+    @click.argument('name')
+    @click.option('--label', default=None, help='Libellé affiché')
+    def location_add_command(name, label):
+        """Ajoute un emplacement de stockage, ou change son libellé."""
+        location, created = save_location(name, label)
+        click.echo(f"{name} (code {location.id}): {'ajouté' if created else 'mis à jour'}")
@@ -0,0 +1,211 @@
+"""Diffusion des modifications de l'inventaire (Server-Sent Events).
+
+Les routes d'écriture publient un événement après validation ; chaque
+tableau de bord connecté à ``/api/events`` le reçoit par un abonnement
+limité à son tenant (les événements des autres tenants ne sont jamais
+placés dans sa file).
+
+Deux backends :
+
+* ``local`` : pub/sub en mémoire, limité au processus ;
+* ``file`` : chaque worker ajoute ses événements à un fichier partagé
+  (``EVENTS_FILE``) et suit ce fichier pour diffuser ceux des autres
+  workers. C'est un substitut local à un broker (Redis...) pour les
+  déploiements multi-workers sur une seule machine. Au-delà de
+  ``EVENTS_FILE_MAX_BYTES``, le fichier est renommé (``.1``) : les workers
+  finissent de le lire puis suivent le nouveau fichier (un worker en retard
+  de plus d'un fichier complet perd les événements intermédiaires, comme un
+  abonné trop lent). Une ligne illisible est journalisée et ignorée.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+
+from app.tenancy import current_tenant
+
+EXTENSION_KEY = 'event_broker'
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """File bornée des événements d'un client ; les plus anciens sont perdus si elle déborde."""
+
+    def __init__(self, broker, tenant=None, maxsize=100):
+        self._broker = broker
+        self.tenant = tenant  # None : événements de tous les tenants
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Retourne le prochain événement, ou None après ``timeout`` secondes."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Pub/sub en mémoire, propre au processus."""
+
+    def __init__(self):
+        self._subscribers = {}  # tenant (None : tous) -> abonnements
+        self._lock = threading.Lock()
+
+    def subscribe(self, tenant=None):
+        """Abonne un client aux événements d'un tenant (de tous si ``tenant`` est None)."""
+        subscription = Subscription(self, tenant)
+        with self._lock:
+            self._subscribers.setdefault(tenant, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.tenant)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.tenant]
+
+    def publish(self, event):
+        self.dispatch(event)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = [
+                subscription
+                for tenant in {event.get('tenant'), None}
+                for subscription in self._subscribers.get(tenant, ())
+            ]
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def close(self):
+        pass
+
+
+class FileBroker(LocalBroker):
+    """Pub/sub entre processus d'une même machine via un fichier en ajout seul."""
+
+    def __init__(self, path, poll_interval=0.2, max_bytes=None):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+        open(path, 'a').close()
+        # Seuls les événements publiés après le démarrage sont diffusés
+        self._events = open(path, 'rb')
+        self._events.seek(0, os.SEEK_END)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._follow, name='event-follower', daemon=True)
+        self._thread.start()
+
+    def publish(self, event):
+        # Une seule écriture en mode ajout : les lignes des workers ne s'entremêlent pas
+        line = (json.dumps(event) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            written = os.fstat(fd)
+            if self.max_bytes and written.st_size > self.max_bytes:
+                self._rotate(written)
+        finally:
+            os.close(fd)
+
+    def _rotate(self, written):
+        """Renomme le fichier plein, sauf si un autre worker l'a déjà fait."""
+        try:
+            if _same_file(os.stat(self.path), written):
+                os.replace(self.path, self.path + '.1')
+        except FileNotFoundError:
+            pass
+
+    def _follow(self):
+        pending = b''
+        try:
+            while not self._stopped.is_set():
+                chunk = self._events.read()
+                if chunk:
+                    pending = self._dispatch_lines(pending + chunk)
+                    continue
+                replacement = self._replacement()
+                if replacement is None:
+                    time.sleep(self.poll_interval)
+                    continue
+                # Dernières lignes écrites dans l'ancien fichier avant son renommage
+                self._dispatch_lines(pending + self._events.read() + b'\n')
+                pending = b''
+                self._events.close()
+                self._events = replacement
+        finally:
+            self._events.close()
+
+    def _replacement(self):
+        """Nouveau fichier ouvert si celui suivi a été renommé, sinon None."""
+        try:
+            if _same_file(os.stat(self.path), os.fstat(self._events.fileno())):
+                return None
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            return None  # Pas encore recréé par une publication
+
+    def _dispatch_lines(self, data):
+        """Diffuse les lignes complètes et retourne la ligne incomplète restante."""
+        *lines, pending = data.split(b'\n')
+        for line in lines:
+            if not line:
+                continue
+            try:
+                self.dispatch(json.loads(line))
+            except Exception:
+                logger.exception('Événement illisible ignoré dans %s : %r', self.path, line[:200])
+        return pending
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+def _same_file(first, second):
+    return (first.st_dev, first.st_ino) == (second.st_dev, second.st_ino)
+
+
+def init_app(app):
+    if app.config.get('EVENTS_BACKEND') == 'file':
+        broker = FileBroker(app.config['EVENTS_FILE'], max_bytes=app.config.get('EVENTS_FILE_MAX_BYTES'))
+    else:
+        broker = LocalBroker()
+    app.extensions[EXTENSION_KEY] = broker
+    return broker
+
+
+def get_broker():
+    return current_app.extensions[EXTENSION_KEY]
+
+
+def publish(event_type, data):
+    """Publie un événement ``{'tenant': ..., 'type': ..., 'data': ...}`` à tous les abonnés."""
+    get_broker().publish({'tenant': current_tenant(), 'type': event_type, 'data': data})
+
+
+def format_sse(event):
+    """Formate un événement pour un flux ``text/event-stream``."""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
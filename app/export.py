@@ -0,0 +1,80 @@
+"""Export CSV en flux continu.
+
+Les lignes sont lues par lots côté serveur (``yield_per``) sous forme de
+tuples de colonnes, puis encodées et envoyées lot par lot : la mémoire
+utilisée reste constante quelle que soit la taille de la table.
+"""
+import csv
+import io
+
+from sqlalchemy import select
+
+from app import db
+from app.catalogue import get_catalogue
+from app.models import Product, ProductHistory
+from app.tenancy import current_tenant
+
+BATCH_SIZE = 1000
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+PRODUCT_HEADER = ['Nom', 'Quantité', 'Emplacement', 'Dernière modification']
+HISTORY_HEADER = [
+    'ID', 'ID produit', 'Date', 'Action',
+    'Ancienne quantité', 'Nouvelle quantité', 'Ancien emplacement', 'Nouvel emplacement'
+]
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value is not None else ''
+
+
+def _stream_csv(header, statement, format_row, batch_size=BATCH_SIZE):
+    """Génère le contenu CSV encodé en UTF-8, un lot de lignes à la fois."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(header)
+    yield flush()
+
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        writer.writerows(format_row(row) for row in rows)
+        yield flush()
+
+
+def iter_products_csv(batch_size=BATCH_SIZE):
+    """Flux CSV de l'inventaire courant du tenant."""
+    statement = select(
+        Product.catalogue_id, Product.quantity, Product.location_code, Product.last_modified
+    ).where(Product.tenant == current_tenant()).order_by(Product.id)
+    catalogue = get_catalogue()
+    return _stream_csv(
+        PRODUCT_HEADER,
+        statement,
+        lambda row: (catalogue.name_of(row.catalogue_id), row.quantity,
+                     catalogue.location_name_of(row.location_code), _format_datetime(row.last_modified)),
+        batch_size,
+    )
+
+
+def iter_history_csv(batch_size=BATCH_SIZE):
+    """Flux CSV de l'historique complet du tenant, pour les audits."""
+    statement = select(
+        ProductHistory.id, ProductHistory.product_id, ProductHistory.timestamp,
+        ProductHistory.action, ProductHistory.old_quantity, ProductHistory.new_quantity,
+        ProductHistory.old_location_code, ProductHistory.new_location_code
+    ).where(ProductHistory.tenant == current_tenant()).order_by(ProductHistory.timestamp, ProductHistory.id)
+    locations = get_catalogue().location_names
+    return _stream_csv(
+        HISTORY_HEADER,
+        statement,
+        lambda row: (row[0], row[1], _format_datetime(row[2]), *row[3:6],
+                     locations.get(row[6]), locations.get(row[7])),
+        batch_size,
+    )
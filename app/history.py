@@ -0,0 +1,123 @@
+"""Lecture paginée de l'historique des produits.
+
+La pagination se fait par curseur sur ``(timestamp, id)`` : chaque page
+reprend là où la précédente s'est arrêtée grâce à l'index
+``ix_product_history_tenant_timestamp_id``, sans ``OFFSET``. Le coût d'une
+page ne dépend donc ni de la taille de la table ni du nombre de tenants.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+
+from app.models import ProductHistory
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(entry):
+    """Construit le curseur pointant après l'entrée donnée."""
+    return f'{entry.timestamp.isoformat()}_{entry.id}'
+
+
+def decode_cursor(cursor):
+    """Décode un curseur ``<timestamp ISO>_<id>``.
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    timestamp, _, entry_id = cursor.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(entry_id)
+
+
+def _parse_end(value):
+    """Date de fin telle que saisie : ``date`` sans heure, sinon ``datetime``."""
+    end = datetime.fromisoformat(value)
+    if 'T' not in value and ' ' not in value.strip():
+        return end.date()
+    return end
+
+
+def _end_bound(end):
+    """Borne supérieure exclue : une date sans heure inclut toute la journée."""
+    if isinstance(end, datetime):
+        return end
+    return datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+
+def parse_filters(args):
+    """Extrait les paramètres de pagination et de filtre d'une requête.
+
+    ``end`` sans heure (``2025-01-31``) est conservé tel quel (une ``date``,
+    réaffichée telle quelle dans le formulaire) et inclut toute la journée.
+
+    Raises:
+        ValueError: Si un paramètre est invalide
+    """
+    limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit doit être compris entre 1 et {MAX_PAGE_SIZE}')
+    product_id = args.get('product_id')
+    start = args.get('start')
+    end = args.get('end')
+    return {
+        'cursor': args.get('cursor') or None,
+        'limit': limit,
+        'product_id': int(product_id) if product_id else None,
+        'action': args.get('action') or None,
+        'start': datetime.fromisoformat(start) if start else None,
+        'end': _parse_end(end) if end else None,
+    }
+
+
+def build_history_query(cursor=None, limit=DEFAULT_PAGE_SIZE, product_id=None,
+                        action=None, start=None, end=None):
+    """Construit la requête d'une page d'historique (une entrée de plus que ``limit``).
+
+    Args:
+        cursor (str): Curseur renvoyé par la page précédente
+        limit (int): Nombre maximal d'entrées
+        product_id (int): Filtre sur le produit
+        action (str): Filtre sur le type d'action
+        start (datetime): Borne inférieure incluse sur la date
+        end (datetime | date): Borne supérieure exclue sur la date ; une
+            ``date`` sans heure inclut toute la journée
+    """
+    query = ProductHistory.of_tenant().options(joinedload(ProductHistory.product))
+    if product_id is not None:
+        query = query.filter(ProductHistory.product_id == product_id)
+    if action is not None:
+        query = query.filter(ProductHistory.action == action)
+    if start is not None:
+        query = query.filter(ProductHistory.timestamp >= start)
+    if end is not None:
+        query = query.filter(ProductHistory.timestamp < _end_bound(end))
+    if cursor is not None:
+        timestamp, entry_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            ProductHistory.timestamp < timestamp,
+            and_(ProductHistory.timestamp == timestamp, ProductHistory.id < entry_id),
+        ))
+
+    # Une entrée de plus que demandé pour savoir s'il existe une page suivante
+    return (
+        query.order_by(ProductHistory.timestamp.desc(), ProductHistory.id.desc())
+        .limit(limit + 1)
+    )
+
+
+def fetch_history_page(cursor=None, limit=DEFAULT_PAGE_SIZE, **filters):
+    """Retourne une page d'historique, de la plus récente à la plus ancienne.
+
+    Les filtres sont ceux de :func:`build_history_query`.
+
+    Returns:
+        tuple: (liste de ProductHistory, curseur de la page suivante ou None)
+    """
+    entries = build_history_query(cursor, limit, **filters).all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1])
+    return entries, next_cursor
@@ -0,0 +1,280 @@
+"""Stockage compact de l'historique : instantanés complets et variations.
+
+Les lignes ``ProductHistory`` anciennes peuvent être compactées
+(``flask compact-history``) :
+
+* chaque ligne devient un ``HistoryDelta`` (variation de quantité entière,
+  codes entiers pour l'action et l'emplacement) ;
+* un ``InventorySnapshot`` enregistre l'état complet de l'inventaire à la
+  date de coupure ;
+* les lignes complètes sont supprimées.
+
+L'état « à la date T » se reconstruit à partir du dernier instantané
+antérieur à T, puis des variations comprises entre cet instantané et T et
+enfin de la dernière ligne complète de chaque produit, sans rejouer tout
+l'historique. Des instantanés quotidiens (``flask snapshot-inventory``)
+bornent ce travail au nombre de produits. Les lignes récentes
+restent dans ``ProductHistory`` et l'API d'historique est inchangée.
+
+Les vues d'audit (``/history``, ``/api/history``, export CSV) ne lisent
+que ``ProductHistory`` : les ``HISTORY_AUDIT_DAYS`` derniers jours ne
+peuvent pas être compactés, pour qu'elles les couvrent toujours en entier.
+
+Instantanés et variations sont propres à chaque tenant ; les commandes
+CLI traitent tous les tenants, ou celui donné par ``--tenant``.
+"""
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.catalogue import get_catalogue
+from app.models import ACTION_CODES, HistoryDelta, InventorySnapshot, InventorySnapshotItem, Product, ProductHistory
+from app.tenancy import current_tenant, known_tenants, use_tenant
+
+BATCH_SIZE = 1000
+
+
+def _latest_snapshot(moment):
+    return (
+        InventorySnapshot.of_tenant()
+        .filter(InventorySnapshot.timestamp <= moment)
+        .order_by(InventorySnapshot.timestamp.desc())
+        .first()
+    )
+
+
+def _apply_rows(state, rows, delete_code=ACTION_CODES['delete']):
+    """Applique des lignes ``(product_id, action_code, quantity_delta, location_code)``."""
+    for product_id, action_code, quantity_delta, location_code in rows:
+        if action_code == delete_code:
+            state.pop(product_id, None)
+            continue
+        quantity = state.get(product_id, (0, None))[0]
+        state[product_id] = (quantity + quantity_delta, location_code)
+
+
+def inventory_state_as_of(moment):
+    """Reconstruit l'inventaire du tenant courant à une date donnée.
+
+    Returns:
+        dict: ``{product_id: (quantité, code d'emplacement)}``
+    """
+    state = {}
+    since = None
+    snapshot = _latest_snapshot(moment)
+    if snapshot is not None:
+        since = snapshot.timestamp
+        state = {
+            product_id: (quantity, location_code)
+            for product_id, quantity, location_code in db.session.execute(
+                select(InventorySnapshotItem.product_id, InventorySnapshotItem.quantity,
+                       InventorySnapshotItem.location_code)
+                .where(InventorySnapshotItem.snapshot_id == snapshot.id)
+            )
+        }
+
+    # Variations compactées, puis lignes complètes, entre l'instantané et la date
+    deltas = select(
+        HistoryDelta.product_id, HistoryDelta.action_code,
+        HistoryDelta.quantity_delta, HistoryDelta.location_code
+    ).where(
+        HistoryDelta.tenant == current_tenant(), HistoryDelta.timestamp <= moment
+    ).order_by(HistoryDelta.timestamp, HistoryDelta.id)
+    if since is not None:
+        deltas = deltas.where(HistoryDelta.timestamp > since)
+    _apply_rows(state, db.session.execute(deltas.execution_options(yield_per=BATCH_SIZE)))
+
+    # Les lignes complètes portent la quantité absolue : seule la dernière
+    # ligne de chaque produit compte (fonction de fenêtre sur l'index
+    # (product_id, timestamp)).
+    for product_id, action, new_quantity, new_location_code in db.session.execute(
+            latest_history_statement(moment, since)):
+        if action == 'delete':
+            state.pop(product_id, None)
+        else:
+            state[product_id] = (new_quantity or 0, new_location_code or 0)
+    return state
+
+
+def latest_history_statement(moment, since=None):
+    """Requête de la dernière ligne d'historique de chaque produit du tenant avant ``moment``."""
+    condition = (ProductHistory.tenant == current_tenant()) & (ProductHistory.timestamp <= moment)
+    if since is not None:
+        condition = condition & (ProductHistory.timestamp > since)
+    ranked = select(
+        ProductHistory.product_id, ProductHistory.action,
+        ProductHistory.new_quantity, ProductHistory.new_location_code,
+        func.row_number().over(
+            partition_by=ProductHistory.product_id,
+            order_by=(ProductHistory.timestamp.desc(), ProductHistory.id.desc())
+        ).label('rank')
+    ).where(condition).subquery()
+    return select(
+        ranked.c.product_id, ranked.c.action, ranked.c.new_quantity, ranked.c.new_location_code
+    ).where(ranked.c.rank == 1)
+
+
+def inventory_as_of(moment):
+    """Inventaire à une date donnée, avec les emplacements en clair.
+
+    Returns:
+        dict: ``{product_id: {'quantity': int, 'location': str}}``
+    """
+    catalogue = get_catalogue()
+    return {
+        product_id: {'quantity': quantity, 'location': catalogue.location_name_of(location_code)}
+        for product_id, (quantity, location_code) in inventory_state_as_of(moment).items()
+    }
+
+
+def product_names(product_ids):
+    """Noms des produits du tenant courant, y compris ceux supprimés depuis.
+
+    Un produit supprimé est nommé d'après le produit du catalogue enregistré
+    dans son historique.
+
+    Returns:
+        dict: ``{product_id: nom}`` ; les produits dont le nom ne se résout
+        plus dans le catalogue sont absents
+    """
+    catalogue_ids = dict(db.session.execute(
+        select(Product.id, Product.catalogue_id)
+        .where(Product.tenant == current_tenant(), Product.id.in_(product_ids))
+    ).all())
+    deleted = set(product_ids) - catalogue_ids.keys()
+    if deleted:
+        catalogue_ids.update(db.session.execute(
+            select(ProductHistory.product_id, func.max(ProductHistory.catalogue_id))
+            .where(ProductHistory.tenant == current_tenant(), ProductHistory.product_id.in_(deleted),
+                   ProductHistory.catalogue_id.is_not(None))
+            .group_by(ProductHistory.product_id)
+        ).all())
+    names_by_id = get_catalogue().names_by_id
+    return {
+        product_id: names_by_id[catalogue_id]
+        for product_id, catalogue_id in catalogue_ids.items() if catalogue_id in names_by_id
+    }
+
+
+def _to_delta(row):
+    tenant, product_id, timestamp, action, old_quantity, new_quantity, new_location_code = row
+    return {
+        'tenant': tenant,
+        'product_id': product_id,
+        'timestamp': timestamp,
+        'action_code': ACTION_CODES[action],
+        'quantity_delta': (new_quantity or 0) - (old_quantity or 0),
+        'location_code': new_location_code or 0,
+    }
+
+
+def write_snapshot(moment, state):
+    """Enregistre un instantané de l'état donné (sans valider la transaction)."""
+    snapshot = InventorySnapshot(tenant=current_tenant(), timestamp=moment)
+    db.session.add(snapshot)
+    db.session.flush()
+    if state:
+        db.session.execute(insert(InventorySnapshotItem), [
+            {'snapshot_id': snapshot.id, 'product_id': product_id,
+             'quantity': quantity, 'location_code': location_code}
+            for product_id, (quantity, location_code) in state.items()
+        ])
+    return snapshot
+
+
+def materialize_snapshot(moment):
+    """Enregistre et valide l'instantané de l'inventaire à une date donnée.
+
+    Returns:
+        InventorySnapshot: Instantané créé, ou existant à cette date
+    """
+    existing = InventorySnapshot.of_tenant().filter_by(timestamp=moment).first()
+    if existing is not None:
+        return existing
+    try:
+        snapshot = write_snapshot(moment, inventory_state_as_of(moment))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return snapshot
+
+
+def compact_history(before):
+    """Compacte l'historique du tenant courant antérieur à ``before`` et valide la transaction.
+
+    Raises:
+        ValueError: Si un instantané tombe dans la période compactée (de la
+            première ligne à compacter jusqu'à ``before`` inclus), ou si
+            ``before`` tombe dans la période couverte par les vues d'audit
+
+    Returns:
+        int: Nombre de lignes compactées
+    """
+    audit_start = datetime.utcnow() - timedelta(days=current_app.config['HISTORY_AUDIT_DAYS'])
+    if before > audit_start:
+        raise ValueError(
+            f"L'historique postérieur au {audit_start.isoformat(timespec='seconds')} "
+            "doit rester consultable (HISTORY_AUDIT_DAYS)"
+        )
+    # Les instantanés postérieurs (instantané quotidien...) restent valables
+    condition = (ProductHistory.tenant == current_tenant()) & (ProductHistory.timestamp < before)
+    start = db.session.scalar(select(func.min(ProductHistory.timestamp)).where(condition)) or before
+    latest = _latest_snapshot(before)
+    if latest is not None and latest.timestamp >= start:
+        raise ValueError(f'Un instantané existe déjà au {latest.timestamp.isoformat()}')
+
+    try:
+        state = inventory_state_as_of(before)
+        rows = db.session.execute(
+            select(ProductHistory.tenant, ProductHistory.product_id, ProductHistory.timestamp, ProductHistory.action,
+                   ProductHistory.old_quantity, ProductHistory.new_quantity, ProductHistory.new_location_code)
+            .where(condition)
+            .order_by(ProductHistory.timestamp, ProductHistory.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        count = 0
+        for batch in rows.partitions():
+            db.session.execute(insert(HistoryDelta), [_to_delta(row) for row in batch])
+            count += len(batch)
+        db.session.execute(delete(ProductHistory).where(condition))
+        write_snapshot(before, state)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def _tenants(tenant):
+    return [tenant] if tenant else known_tenants()
+
+
+def register_commands(app):
+    tenant_option = click.option('--tenant', default=None, help='Patient à traiter (par défaut : tous)')
+
+    @app.cli.command('compact-history')
+    @click.option('--before', type=click.DateTime(), required=True,
+                  help="Date de coupure : l'historique antérieur est compacté")
+    @tenant_option
+    def compact_history_command(before, tenant):
+        """Compacte l'historique ancien en instantané + variations."""
+        for name in _tenants(tenant):
+            with use_tenant(name):
+                count = compact_history(before)
+            click.echo(f'{name}: {count} ligne(s) d\'historique compactée(s)')
+
+    @app.cli.command('snapshot-inventory')
+    @click.option('--at', 'moment', type=click.DateTime(), default=None,
+                  help="Date de l'instantané (par défaut : aujourd'hui à minuit)")
+    @tenant_option
+    def snapshot_inventory_command(moment, tenant):
+        """Enregistre l'instantané quotidien de l'inventaire."""
+        moment = moment or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        for name in _tenants(tenant):
+            with use_tenant(name):
+                snapshot = materialize_snapshot(moment)
+            click.echo(f'{name}: instantané du {snapshot.timestamp.isoformat()}')
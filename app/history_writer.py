@@ -0,0 +1,335 @@
+"""Écriture différée de l'historique des produits.
+
+Quand ``HISTORY_WRITER_ENABLED`` est activé, ``Product.log_change`` ne
+crée plus de ligne ``ProductHistory`` dans la transaction de la
+modification. L'événement est mis de côté sur la session, puis :
+
+* à la validation de la transaction principale, il est placé dans une file bornée
+  (et ajouté au journal local s'il est configuré) ; si la file reste pleine
+  plus de ``HISTORY_SUBMIT_TIMEOUT`` secondes, il est écrit directement ;
+* en cas d'annulation, il est abandonné (seuls les événements du point de
+  sauvegarde annulé le sont quand l'annulation porte sur un point de
+  sauvegarde ; ceux d'un point de sauvegarde libéré passent à la
+  transaction englobante).
+
+Un thread d'arrière-plan vide la file par lots (``HISTORY_BATCH_SIZE``
+événements ou ``HISTORY_FLUSH_INTERVAL`` secondes) avec un seul
+``INSERT`` par lot. Un lot en échec est retenté ``HISTORY_RETRIES`` fois
+(délai doublé à chaque tentative), puis journalisé et abandonné. La file
+est vidée à l'arrêt du processus ; avec ``HISTORY_JOURNAL_PATH``, les
+événements non écrits (y compris les lots en échec) sont rejoués au
+démarrage suivant (au moins une fois). Le journal est réécrit avec les
+seuls événements en attente dès qu'il dépasse ``HISTORY_JOURNAL_MAX_BYTES``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+PENDING_KEY = 'pending_history'
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """File d'événements d'historique vidée par un thread d'arrière-plan."""
+
+    def __init__(self, engine, table, batch_size=100, flush_interval=1.0,
+                 max_queue=10000, journal_path=None, tenant_engines=None,
+                 submit_timeout=1.0, retries=3, retry_backoff=0.1, journal_max_bytes=1 << 20):
+        self.engine = engine
+        # Bases séparées par tenant : chaque événement est écrit dans la base de son tenant
+        self.tenant_engines = tenant_engines
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.submit_timeout = submit_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.journal_max_bytes = journal_max_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._journal_size = 0
+        # Lignes du journal des événements pas encore écrits en base, par numéro de séquence
+        self._outstanding = {}
+        self._sequence = 0
+        self._thread = None
+        self._written = 0
+        self._batches = 0
+        self._failed = 0
+        self._last_flush = None
+
+    def start(self):
+        """Rejoue le journal éventuel puis démarre le thread d'écriture."""
+        if self.journal_path:
+            self._recover()
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Écrit les événements restants et arrête le thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        with self._journal_lock:
+            if self._journal is not None:
+                # Seuls les événements en échec restent à rejouer
+                self._compact()
+                self._journal.close()
+                self._journal = None
+        atexit.unregister(self.stop)
+
+    def flush(self):
+        """Attend que tous les événements soumis soient écrits en base."""
+        self._queue.join()
+
+    def stage(self, session, values):
+        """Met de côté un événement jusqu'à la validation de la session.
+
+        L'événement est rattaché à la transaction la plus interne : l'annulation
+        d'un point de sauvegarde n'abandonne que les événements qu'il contient.
+        """
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        session.info.setdefault(PENDING_KEY, (self, []))[1].append((transaction, values))
+
+    def submit(self, events):
+        """Ajoute des événements validés à la file.
+
+        Si la file reste pleine plus de ``submit_timeout`` secondes, les
+        événements sont écrits directement plutôt que de bloquer la requête.
+        """
+        for values in events:
+            item = (time.monotonic(), self._log(values), values)
+            try:
+                self._queue.put(item, timeout=self.submit_timeout)
+            except queue.Full:
+                self._persist([item])
+
+    def metrics(self):
+        """Profondeur de la file, retard de l'événement le plus ancien et compteurs."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0] if self._queue.queue else None
+        lag = time.monotonic() - oldest[0] if oldest is not None and oldest is not _STOP else 0.0
+        return {
+            'queue_depth': self._queue.qsize(),
+            'lag_seconds': lag,
+            'written': self._written,
+            'batches': self._batches,
+            'failed': self._failed,
+            'last_flush': self._last_flush.isoformat() if self._last_flush else None,
+        }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self._persist(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _persist(self, batch):
+        """Écrit un lot en base, avec nouvelles tentatives.
+
+        Returns:
+            bool: False si toutes les tentatives ont échoué ; le lot reste
+            alors dans le journal pour être rejoué au démarrage suivant
+        """
+        delay = self.retry_backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self._insert([values for _, _, values in batch])
+                break
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Échec de l'écriture de %d événements d'historique", len(batch))
+                    with self._journal_lock:
+                        self._failed += len(batch)
+                    return False
+                time.sleep(delay)
+                delay *= 2
+        self._checkpoint([sequence for _, sequence, _ in batch])
+        return True
+
+    def _insert(self, rows):
+        if self.tenant_engines is None:
+            groups = {self.engine: rows}
+        else:
+            groups = {}
+            for values in rows:
+                groups.setdefault(self.tenant_engines.get(values['tenant']), []).append(values)
+        for engine, values in groups.items():
+            with engine.begin() as connection:
+                connection.execute(insert(self.table), values)
+
+    def _log(self, values):
+        with self._journal_lock:
+            self._sequence += 1
+            if self._journal is not None:
+                line = json.dumps({'seq': self._sequence, 'event': _serialize(values)}) + '\n'
+                self._outstanding[self._sequence] = line
+                self._append(line)
+            return self._sequence
+
+    def _checkpoint(self, sequences):
+        """Marque des événements comme écrits en base."""
+        with self._journal_lock:
+            self._written += len(sequences)
+            self._batches += 1
+            self._last_flush = datetime.utcnow()
+            if self._journal is None:
+                return
+            for sequence in sequences:
+                self._outstanding.pop(sequence, None)
+            if self._journal_size > self.journal_max_bytes:
+                self._compact()
+            else:
+                self._append(json.dumps({'committed': sequences}) + '\n')
+
+    def _append(self, line):
+        self._journal.write(line)
+        self._journal.flush()
+        self._journal_size += len(line)
+
+    def _compact(self):
+        """Réécrit le journal avec les seuls événements en attente (verrou du journal tenu)."""
+        self._journal.close()
+        temporary = self.journal_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as journal:
+            journal.writelines(self._outstanding.values())
+        os.replace(temporary, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal_size = sum(len(line) for line in self._outstanding.values())
+
+    def _recover(self):
+        """Écrit en base les événements du journal postérieurs au dernier point de validation."""
+        if not os.path.exists(self.journal_path):
+            return 0
+        events = {}
+        committed = set()
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Dernière ligne tronquée par un arrêt brutal
+                if 'committed' in record:
+                    committed.update(record['committed'])
+                else:
+                    events[record['seq']] = _deserialize(record['event'])
+        pending = [values for sequence, values in sorted(events.items())
+                   if sequence not in committed]
+        if pending:
+            self._insert(pending)
+        # Le journal repart de zéro
+        open(self.journal_path, 'w').close()
+        return len(pending)
+
+
+def _serialize(values):
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in values.items()}
+
+
+def _deserialize(values):
+    values = dict(values)
+    if values.get('timestamp'):
+        values['timestamp'] = datetime.fromisoformat(values['timestamp'])
+    return values
+
+
+@event.listens_for(Session, 'after_commit')
+def _submit_pending(session):
+    savepoint = session.get_nested_transaction()
+    if savepoint is not None:
+        # Point de sauvegarde libéré : ses événements suivent la transaction englobante
+        pending = session.info.get(PENDING_KEY)
+        if pending is not None:
+            pending[1][:] = [(savepoint.parent if transaction is savepoint else transaction, values)
+                             for transaction, values in pending[1]]
+        return
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending is not None:
+        writer, events = pending
+        writer.submit([values for _, values in events])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+        return
+    # Annulation d'un point de sauvegarde : la transaction englobante garde ses événements
+    pending = session.info.get(PENDING_KEY)
+    if pending is not None:
+        pending[1][:] = [(transaction, values) for transaction, values in pending[1]
+                         if not _within(transaction, previous_transaction)]
+
+
+def _within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+def init_app(app, db, table, tenant_engines=None):
+    """Démarre l'écriture différée si elle est activée dans la configuration."""
+    if not app.config.get('HISTORY_WRITER_ENABLED'):
+        return None
+    with app.app_context():
+        engine = db.engine
+    writer = HistoryWriter(
+        engine,
+        table,
+        batch_size=app.config['HISTORY_BATCH_SIZE'],
+        flush_interval=app.config['HISTORY_FLUSH_INTERVAL'],
+        max_queue=app.config['HISTORY_QUEUE_SIZE'],
+        journal_path=app.config.get('HISTORY_JOURNAL_PATH'),
+        tenant_engines=tenant_engines,
+        submit_timeout=app.config['HISTORY_SUBMIT_TIMEOUT'],
+        retries=app.config['HISTORY_RETRIES'],
+        retry_backoff=app.config['HISTORY_RETRY_BACKOFF'],
+        journal_max_bytes=app.config['HISTORY_JOURNAL_MAX_BYTES'],
+    )
+    app.extensions['history_writer'] = writer
+    return writer.start()
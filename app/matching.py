@@ -0,0 +1,158 @@
+"""Correspondance entre les libellés du bon de commande et les produits.
+
+Le matcher est construit une seule fois à partir des libellés du catalogue
+(et reconstruit seulement quand le catalogue change de version) :
+
+* niveau exact : dictionnaire ``libellé normalisé -> produit`` ;
+* niveau approché : arbre préfixe (trie) des libellés, qui accepte un
+  libellé de cellule commençant par un alias connu (``SERINGUE 20 ML
+  STERILE``) ou un début de libellé sans ambiguïté (``SERINGUE 2``) d'au
+  moins ``MIN_PREFIX_LENGTH`` caractères, ou formé de mots entiers.
+"""
+import re
+from dataclasses import dataclass, field
+
+from flask import has_app_context
+
+from app.catalogue import current_mapping, get_catalogue
+
+EXACT = 'exact'
+FUZZY = 'fuzzy'
+
+# Longueur minimale d'un début de libellé accepté s'il ne s'arrête pas sur une fin de mot
+MIN_PREFIX_LENGTH = 4
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Normalise un libellé : majuscules et espaces réduits."""
+    return _WHITESPACE.sub(' ', text).strip().upper()
+
+
+class _TrieNode:
+    __slots__ = ('children', 'product', 'products')
+
+    def __init__(self):
+        self.children = {}
+        self.product = None      # Produit si un alias se termine ici
+        self.products = set()    # Produits de tous les alias sous ce nœud
+
+
+@dataclass
+class MatchReport:
+    """Résultat de la correspondance des lignes d'un bon de commande.
+
+    Chaque liste contient des tuples ``(table, ligne, libellé)`` (indices à
+    partir de 0) ; ``exact`` et ``fuzzy`` y ajoutent le produit trouvé.
+    """
+    exact: list = field(default_factory=list)
+    fuzzy: list = field(default_factory=list)
+    unmatched: list = field(default_factory=list)
+
+    def add(self, position, text, product, kind):
+        if kind == EXACT:
+            self.exact.append((*position, text, product))
+        elif kind == FUZZY:
+            self.fuzzy.append((*position, text, product))
+        else:
+            self.unmatched.append((*position, text))
+
+    def to_dict(self):
+        return {
+            'exact': [list(entry) for entry in self.exact],
+            'fuzzy': [list(entry) for entry in self.fuzzy],
+            'unmatched': [list(entry) for entry in self.unmatched],
+        }
+
+
+class ProductNameMatcher:
+    """Associe un libellé de bon de commande à un nom de produit."""
+
+    def __init__(self, mapping, fuzzy=True):
+        self.fuzzy = fuzzy
+        self.aliases = {}
+        self._root = _TrieNode()
+        for product, names in mapping.items():
+            for name in names:
+                alias = normalize(name)
+                self.aliases.setdefault(alias, product)
+                self._insert(alias, product)
+
+    def _insert(self, alias, product):
+        node = self._root
+        node.products.add(product)
+        for char in alias:
+            node = node.children.setdefault(char, _TrieNode())
+            node.products.add(product)
+        if node.product is None:
+            node.product = product
+
+    def _match_prefix(self, text):
+        """Cherche l'alias le plus long qui préfixe le libellé (sur une limite de mot),
+        sinon un produit unique dont un alias commence par le libellé (d'au moins
+        ``MIN_PREFIX_LENGTH`` caractères, ou s'arrêtant sur une fin de mot de l'alias)."""
+        node = self._root
+        best = None
+        for index, char in enumerate(text):
+            node = node.children.get(char)
+            if node is None:
+                return best
+            if node.product is not None:
+                following = text[index + 1:index + 2]
+                if not following or not following.isalnum():
+                    best = node.product
+        if best is None and len(node.products) == 1 and (
+                len(text) >= MIN_PREFIX_LENGTH or _ends_word(node)):
+            best = next(iter(node.products))
+        return best
+
+    def match(self, text):
+        """Retourne ``(produit, type)`` où type vaut 'exact', 'fuzzy' ou None."""
+        key = normalize(text)
+        if not key:
+            return None, None
+        product = self.aliases.get(key)
+        if product is not None:
+            return product, EXACT
+        if self.fuzzy:
+            product = self._match_prefix(key)
+            if product is not None:
+                return product, FUZZY
+        return None, None
+
+
+def _ends_word(node):
+    """Vrai si un alias se termine sur ce nœud ou s'y poursuit par un séparateur."""
+    return node.product is not None or any(not char.isalnum() for char in node.children)
+
+
+_cache = {'key': None, 'matcher': None}
+
+
+def _mapping_key(mapping):
+    return tuple((product, tuple(names)) for product, names in mapping.items())
+
+
+def get_matcher(mapping=None):
+    """Retourne le matcher en cache, reconstruit si le catalogue a changé.
+
+    Sans ``mapping``, la clé du cache est l'instantané du catalogue (un par
+    version) : rien n'est recalculé tant que le catalogue ne change pas. Un
+    mapping explicite (processus de travail, tests) est comparé par contenu.
+    """
+    if mapping is None and has_app_context():
+        catalogue = get_catalogue()
+        if _cache['key'] is not catalogue:
+            _cache['matcher'] = ProductNameMatcher(catalogue.mapping)
+            _cache['key'] = catalogue
+        return _cache['matcher']
+    key = _mapping_key(current_mapping() if mapping is None else mapping)
+    if _cache['key'] != key:
+        _cache['matcher'] = ProductNameMatcher(dict(key))
+        _cache['key'] = key
+    return _cache['matcher']
+
+
+# Construit dès l'import pour que la première requête n'en paie pas le coût
+get_matcher()
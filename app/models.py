@@ -1,8 +1,14 @@
 from datetime import datetime
-from sqlalchemy.orm import validates
+from flask import current_app, has_app_context
+from sqlalchemy import event, insert, literal, null, select, text, tuple_, update
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+from sqlalchemy.orm.exc import StaleDataError
 from app import db
+from app.catalogue import get_catalogue
+from app.tenancy import DEFAULT_TENANT, current_tenant
 
-# Liste des produits disponibles
+# Catalogue initial, copié dans les tables du catalogue à leur création ;
+# le catalogue en service se lit avec app.catalogue.get_catalogue()
 AVAILABLE_PRODUCTS = [
     'Lignes à sang',
     'K7 Ergo Flow',
@@ -21,7 +27,7 @@ AVAILABLE_PRODUCTS = [
     'Seringues 10 ml'
 ]
 
-# Mapping entre les noms dans le bon de commande et les noms dans la base de données
+# Libellés initiaux du bon de commande pour chaque produit du catalogue
 PRODUCT_NAME_MAPPING = {
     'Lignes à sang': ['PHYSIDIA LIGNES A SANG A-V PHYSILINE (1/RA)'],
     'K7 Ergo Flow': ['PHYSIDIA CASSETTE dialysat PHYSI.FLOW. ERGO (1 pour 2 RA soit 3/semaine)'],
@@ -39,25 +45,200 @@ PRODUCT_NAME_MAPPING = {
     'Seringues 10 ml': ['SERINGUE 10ML', 'SERINGUE 10', 'SERINGUES 10']
 }
 
-class Product(db.Model):
+# Emplacements initiaux (nom -> libellé), codés 1, 2, ... dans cet ordre
+DEFAULT_LOCATIONS = {
+    'box': 'Box',
+    'apartment': 'Appartement',
+}
+
+class TenantMixin:
+    """Colonne ``tenant`` : chaque patient (ou site) a son propre inventaire."""
+    # Par défaut, le tenant de la requête en cours
+    tenant = db.Column(db.String(64), nullable=False, default=current_tenant, server_default=DEFAULT_TENANT)
+
+    @classmethod
+    def of_tenant(cls, tenant=None):
+        """Requête limitée aux lignes du tenant donné (par défaut, le tenant courant)."""
+        return cls.query.filter(cls.tenant == (tenant or current_tenant()))
+
+
+# Tables communes à tous les tenants (jamais copiées dans les bases par tenant)
+SHARED_TABLE = {'info': {'shared': True}}
+
+
+class CatalogueProduct(db.Model):
+    """Produit du catalogue ; l'inventaire y fait référence par son ID."""
+    __table_args__ = SHARED_TABLE
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Ordre d'affichage
+    aliases = db.relationship('CatalogueAlias', lazy=True, cascade='all, delete-orphan',
+                              order_by='CatalogueAlias.id')
+
+    def __repr__(self):
+        return f'<CatalogueProduct {self.name}>'
+
+
+class CatalogueAlias(db.Model):
+    """Libellé du bon de commande correspondant à un produit du catalogue."""
+    __table_args__ = SHARED_TABLE
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    catalogue_id = db.Column(db.Integer, db.ForeignKey('catalogue_product.id', ondelete='CASCADE'),
+                             nullable=False, index=True)
+    label = db.Column(db.String(255), nullable=False)
+
+
+class Location(db.Model):
+    """Emplacement de stockage ; l'inventaire et l'historique y font référence par son code."""
+    __table_args__ = SHARED_TABLE
+
+    # Code entier attribué à la création et jamais réutilisé
+    id = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    label = db.Column(db.String(100), nullable=False)  # Libellé affiché
+    position = db.Column(db.Integer, nullable=False, default=0)  # Ordre d'affichage
+
+    def __repr__(self):
+        return f'<Location {self.name}>'
+
+
+class CatalogueState(db.Model):
+    """Version du catalogue, incrémentée à chaque modification (une seule ligne)."""
+    __table_args__ = SHARED_TABLE
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def seed_catalogue(metadata, connection, tables=(), **kwargs):
+    """Copie le catalogue initial dans les tables du catalogue qui viennent d'être créées."""
+    if CatalogueProduct.__table__ not in tables:
+        return
+    connection.execute(insert(CatalogueProduct), [
+        {'name': name, 'position': position} for position, name in enumerate(AVAILABLE_PRODUCTS)
+    ])
+    ids = dict(connection.execute(select(CatalogueProduct.name, CatalogueProduct.id)).all())
+    connection.execute(insert(CatalogueAlias), [
+        {'catalogue_id': ids[name], 'label': label}
+        for name, labels in PRODUCT_NAME_MAPPING.items() for label in labels
+    ])
+    connection.execute(insert(CatalogueState), [{'id': 1, 'version': 1}])
+
+
+@event.listens_for(db.metadata, 'after_create')
+def seed_locations(metadata, connection, tables=(), **kwargs):
+    """Copie les emplacements initiaux dans la table des emplacements qui vient d'être créée."""
+    if Location.__table__ not in tables:
+        return
+    connection.execute(insert(Location), [
+        {'id': code, 'name': name, 'label': label, 'position': code}
+        for code, (name, label) in enumerate(DEFAULT_LOCATIONS.items(), start=1)
+    ])
+
+
+class CodeComparator(Comparator):
+    """Compare un nom (produit, emplacement) par son code entier, sans jointure.
+
+    ``resolve`` traduit un nom en code à l'aide du catalogue en cache (None
+    si le nom est inconnu : la comparaison ne trouve alors aucune ligne).
+    """
+
+    def __init__(self, expression, resolve):
+        super().__init__(expression)
+        self.resolve = resolve
+
+    def __eq__(self, other):
+        return self.__clause_element__() == self.resolve(other)
+
+    def __ne__(self, other):
+        return self.__clause_element__() != self.resolve(other)
+
+    def in_(self, names):
+        return self.__clause_element__().in_([self.resolve(name) for name in names])
+
+
+def _location_code_of(location):
+    return get_catalogue().location_code_of(location)
+
+
+def location_property(code_attribute, nullable=True):
+    """Emplacement en clair, stocké sous forme de code entier dans ``code_attribute``.
+
+    L'affectation valide le nom auprès du catalogue en cache et lève
+    ValueError s'il est inconnu ; les requêtes comparent les codes.
+    """
+    def fget(self):
+        return get_catalogue().location_name_of(getattr(self, code_attribute))
+
+    def fset(self, location):
+        if location is None and nullable:
+            setattr(self, code_attribute, None)
+        else:
+            setattr(self, code_attribute, get_catalogue().require_location_code(location))
+
+    def comparator(cls):
+        return CodeComparator(getattr(cls, code_attribute), _location_code_of)
+
+    return hybrid_property(fget, fset, custom_comparator=comparator)
+
+
+# SQLite n'a qu'un écrivain à la fois : un numéro calculé dans l'instruction
+# d'écriture (verrou d'écriture tenu jusqu'à la validation) croît dans l'ordre
+# des validations, contrairement à ``last_modified`` fixé avant l'écriture.
+# Les lignes d'une même instruction partagent le même numéro.
+NEXT_CHANGE_SEQ = text('(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM product)')
+
+
+class Product(TenantMixin, db.Model):
+    __table_args__ = (
+        # Un seul produit par couple (produit du catalogue, emplacement) pour un tenant
+        db.Index('ix_product_tenant_catalogue_location', 'tenant', 'catalogue_id', 'location_code', unique=True),
+        # Synchronisation incrémentale des clients
+        db.Index('ix_product_tenant_change_seq_id', 'tenant', 'change_seq', 'id'),
+        # Calcul du numéro de modification suivant (MAX)
+        db.Index('ix_product_change_seq', 'change_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    catalogue_id = db.Column(db.Integer, db.ForeignKey('catalogue_product.id'), nullable=False)
     quantity = db.Column(db.Integer, default=0)
-    location = db.Column(db.String(50), nullable=False)  # 'box' ou 'apartment'
+    location_code = db.Column(db.SmallInteger, db.ForeignKey('location.id'), nullable=False)
     description = db.Column(db.Text)
     last_modified = db.Column(db.DateTime, default=datetime.utcnow)
-    history = db.relationship('ProductHistory', backref='product', lazy=True, cascade='all, delete-orphan')
+    # Numéro de modification, calculé par la base dans l'instruction d'écriture
+    change_seq = db.Column(db.Integer, nullable=False, default=NEXT_CHANGE_SEQ, onupdate=NEXT_CHANGE_SEQ)
+    # Verrouillage optimiste : incrémentée à chaque écriture
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # L'historique survit à la suppression du produit (pas de clé étrangère, rien n'est supprimé)
+    history = db.relationship('ProductHistory', backref='product', lazy=True, passive_deletes='all',
+                              primaryjoin='Product.id == foreign(ProductHistory.product_id)')
+
+    # Chaque UPDATE de l'ORM porte ``WHERE version = <version lue>`` et lève
+    # StaleDataError si la ligne a été modifiée entre-temps
+    __mapper_args__ = {'version_id_col': version}
 
-    VALID_LOCATIONS = ['box', 'apartment']
+    # Emplacement en clair ('box', 'apartment', ...), lu dans le catalogue en cache
+    location = location_property('location_code', nullable=False)
 
     def __repr__(self):
         return f'<Product {self.name}>'
 
-    @validates('location')
-    def validate_location(self, key, location):
-        if location not in self.VALID_LOCATIONS:
-            raise ValueError(f"Location must be one of: {', '.join(self.VALID_LOCATIONS)}")
-        return location
+    @hybrid_property
+    def name(self):
+        """Nom du produit, lu dans le catalogue en cache."""
+        return get_catalogue().name_of(self.catalogue_id)
+
+    @name.inplace.setter
+    def _name_setter(self, name):
+        self.catalogue_id = get_catalogue().require_id(name)
+
+    @name.inplace.comparator
+    @classmethod
+    def _name_comparator(cls):
+        return CodeComparator(cls.catalogue_id, lambda name: get_catalogue().id_of(name))
 
     def to_dict(self):
         return {
@@ -66,15 +247,18 @@ class Product(db.Model):
             'quantity': self.quantity,
             'location': self.location,
             'description': self.description,
-            'last_modified': self.last_modified.isoformat()
+            'last_modified': self.last_modified.isoformat(),
+            'version': self.version
         }
 
-    def log_change(self, action, old_values=None):
+    def log_change(self, action, old_values=None, timestamp=None):
         """Log un changement dans l'historique du produit.
         
         Args:
             action (str): Type d'action ('create', 'update', 'delete', 'reset')
             old_values (dict): Anciennes valeurs avant modification
+            timestamp (datetime): Date de l'opération (par défaut, maintenant) ;
+                les lignes d'une même opération (transfert) la partagent
         """
         if old_values is None:
             old_values = {}
@@ -85,49 +269,252 @@ class Product(db.Model):
                 old_values.get('location') == self.location):
                 return
         
+        timestamp = timestamp or datetime.utcnow()
+        old_location_code = get_catalogue().location_code_of(old_values.get('location'))
+        # Un produit supprimé n'a plus ni quantité ni emplacement
+        if action == 'delete':
+            new_quantity, new_location_code = None, None
+        else:
+            new_quantity, new_location_code = self.quantity, self.location_code
+        # Écriture différée : l'événement sera écrit en lot après la validation
+        writer = current_app.extensions.get('history_writer') if has_app_context() else None
+        if writer is not None:
+            writer.stage(db.session(), {
+                'tenant': self.tenant,
+                'product_id': self.id,
+                'catalogue_id': self.catalogue_id,
+                'timestamp': timestamp,
+                'action': action,
+                'old_quantity': old_values.get('quantity'),
+                'new_quantity': new_quantity,
+                'old_location_code': old_location_code,
+                'new_location_code': new_location_code
+            })
+            return
+
         history = ProductHistory(
+            tenant=self.tenant,
             product=self,
+            catalogue_id=self.catalogue_id,
+            timestamp=timestamp,
             action=action,
             old_quantity=old_values.get('quantity'),
-            new_quantity=self.quantity,
-            old_location=old_values.get('location'),
-            new_location=self.location
+            new_quantity=new_quantity,
+            old_location_code=old_location_code,
+            new_location_code=new_location_code
         )
         db.session.add(history)
 
     @classmethod
-    def initialize_products(cls):
-        """Initialise tous les produits disponibles avec une quantité de 0 s'ils n'existent pas déjà"""
-        for product_name in AVAILABLE_PRODUCTS:
-            # Vérifie si le produit existe déjà dans le box
-            if not cls.query.filter_by(name=product_name, location='box').first():
-                product = cls(name=product_name, quantity=0, location='box')
-                db.session.add(product)
-                db.session.flush()  # Pour obtenir l'ID du produit
-                product.log_change('create')
-
-            # Vérifie si le produit existe déjà dans l'appartement
-            if not cls.query.filter_by(name=product_name, location='apartment').first():
-                product = cls(name=product_name, quantity=0, location='apartment')
-                db.session.add(product)
-                db.session.flush()  # Pour obtenir l'ID du produit
-                product.log_change('create')
-        
+    def initialize_products(cls, tenant=None):
+        """Initialise tous les produits disponibles avec une quantité de 0 s'ils n'existent pas déjà.
+
+        Une seule requête récupère les couples (produit, emplacement) existants,
+        puis seuls les couples manquants sont insérés en lot.
+
+        Args:
+            tenant (str): Tenant à initialiser (par défaut, le tenant courant)
+
+        Returns:
+            int: Nombre de produits créés
+        """
+        tenant = tenant or current_tenant()
+        existing = set(
+            db.session.query(cls.catalogue_id, cls.location_code).filter(cls.tenant == tenant)
+        )
+        catalogue = get_catalogue()
+        missing = [
+            cls(tenant=tenant, catalogue_id=catalogue_id, quantity=0, location_code=location_code)
+            for catalogue_id in catalogue.ids.values()
+            for location_code in catalogue.location_codes.values()
+            if (catalogue_id, location_code) not in existing
+        ]
+        if not missing:
+            return 0
+
+        db.session.add_all(missing)
+        db.session.flush()  # Pour obtenir les IDs des produits
+        for product in missing:
+            product.log_change('create')
         db.session.commit()
+        return len(missing)
+
+    @classmethod
+    def find_targets(cls, moves):
+        """Lignes déjà présentes aux emplacements cibles de déplacements, en une requête.
+
+        Args:
+            moves (list): Couples ``(produit, code d'emplacement cible)``
+
+        Returns:
+            dict: ``{(catalogue_id, location_code): Product}``
+        """
+        keys = {(product.catalogue_id, code) for product, code in moves if code != product.location_code}
+        if not keys:
+            return {}
+        rows = cls.of_tenant().filter(tuple_(cls.catalogue_id, cls.location_code).in_(keys))
+        return {(product.catalogue_id, product.location_code): product for product in rows}
+
+    def apply_change(self, quantity, location_code, now, target=None):
+        """Applique une nouvelle quantité et un nouvel emplacement, sans valider la transaction.
+
+        Un produit existe au plus une fois par emplacement : si ``target``
+        (la ligne du même produit à l'emplacement cible) existe, la quantité
+        y est ajoutée et cette ligne-ci passe à zéro ; sinon la ligne change
+        simplement d'emplacement.
+
+        Returns:
+            list: Couples ``(produit modifié, anciennes valeurs)``, à journaliser
+        """
+        if target is not None and location_code != self.location_code and target.location_code == location_code:
+            changed = [
+                (self, {'quantity': self.quantity, 'location': self.location}),
+                (target, {'quantity': target.quantity, 'location': target.location}),
+            ]
+            target.quantity = (target.quantity or 0) + quantity
+            self.quantity = 0
+            self.last_modified = target.last_modified = now
+            return changed
+
+        if self.quantity == quantity and self.location_code == location_code:
+            return []
+        changed = [(self, {'quantity': self.quantity, 'location': self.location})]
+        self.quantity = quantity
+        self.location_code = location_code
+        self.last_modified = now
+        return changed
+
+    @classmethod
+    def bulk_update(cls, changes):
+        """Met à jour plusieurs produits sans valider la transaction.
+
+        Les produits sont chargés en une seule requête ``IN``, les lignes
+        inchangées sont ignorées et l'historique est inséré en lot.
+
+        Args:
+            changes (list): Liste de ``{'id': int, 'quantity': int, 'location': str}``,
+                avec éventuellement la ``version`` lue par le client
+
+        Returns:
+            tuple: (produits modifiés, IDs introuvables)
+
+        Raises:
+            StaleDataError: Si une version fournie n'est plus celle du produit
+        """
+        ids = {int(change['id']) for change in changes}
+        # Les produits d'un autre tenant sont considérés comme introuvables
+        products = {product.id: product for product in cls.of_tenant().filter(cls.id.in_(ids))}
+        missing = sorted(ids - products.keys())
+        if missing:
+            return [], missing
+
+        stale = [change['id'] for change in changes
+                 if change.get('version') is not None
+                 and int(change['version']) != products[int(change['id'])].version]
+        if stale:
+            raise StaleDataError(f'Produits modifiés entre-temps : {stale}')
+
+        now = datetime.utcnow()
+        catalogue = get_catalogue()
+        parsed = [
+            (products[int(change['id'])], int(change['quantity']),
+             catalogue.require_location_code(change['location']))
+            for change in changes
+        ]
+        # Déplacements vers un emplacement où le produit existe déjà : fusion
+        targets = cls.find_targets([(product, location_code) for product, _, location_code in parsed])
+        updated = {}
+        history = []
+        for product, quantity, location_code in parsed:
+            target = targets.get((product.catalogue_id, location_code))
+            # Les lignes inchangées ne sont ni modifiées ni journalisées
+            for changed, old_values in product.apply_change(quantity, location_code, now, target):
+                history.append({
+                    'tenant': changed.tenant,
+                    'product_id': changed.id,
+                    'catalogue_id': changed.catalogue_id,
+                    'timestamp': now,
+                    'action': 'update',
+                    'old_quantity': old_values['quantity'],
+                    'new_quantity': changed.quantity,
+                    'old_location_code': catalogue.location_code_of(old_values['location']),
+                    'new_location_code': changed.location_code
+                })
+                updated[changed.id] = changed
+
+        if history:
+            db.session.flush()
+            db.session.execute(insert(ProductHistory), history)
+        return list(updated.values()), missing
+
+    @classmethod
+    def reset_quantities(cls, location=None, tenant=None):
+        """Remet les quantités du tenant à zéro sans valider la transaction.
+
+        L'historique est écrit par un seul ``INSERT ... SELECT`` (qui lit les
+        anciennes quantités), puis les produits sont mis à jour par un seul
+        ``UPDATE``.
+
+        Args:
+            location (str): Emplacement à remettre à zéro (tous si None)
+            tenant (str): Tenant concerné (par défaut, le tenant courant)
+
+        Returns:
+            int: Nombre de produits remis à zéro
+        """
+        filters = [cls.tenant == (tenant or current_tenant())]
+        if location is not None:
+            filters.append(cls.location_code == get_catalogue().require_location_code(location))
+
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(ProductHistory).from_select(
+                ['tenant', 'product_id', 'catalogue_id', 'timestamp', 'action', 'old_quantity',
+                 'new_quantity', 'old_location_code', 'new_location_code'],
+                select(
+                    cls.tenant, cls.id, cls.catalogue_id, literal(now, db.DateTime), literal('reset'), cls.quantity,
+                    literal(0), null(), cls.location_code
+                ).where(*filters)
+            )
+        )
+        result = db.session.execute(
+            update(cls).where(*filters).values(quantity=0, last_modified=now, version=cls.version + 1)
+        )
+        return result.rowcount
+
+class ProductHistory(TenantMixin, db.Model):
+    __table_args__ = (
+        # Index de la pagination par curseur (timestamp, id), sert aussi au tri par date
+        db.Index('ix_product_history_tenant_timestamp_id', 'tenant', 'timestamp', 'id'),
+        # Historique d'un produit
+        db.Index('ix_product_history_product_id_timestamp', 'product_id', 'timestamp'),
+    )
 
-class ProductHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    # Sans clé étrangère : les lignes d'un produit supprimé restent consultables
+    product_id = db.Column(db.Integer, nullable=False)
+    # Produit du catalogue, pour retrouver le nom d'un produit supprimé
+    catalogue_id = db.Column(db.Integer)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     action = db.Column(db.String(50), nullable=False)  # create, update, delete, reset
     old_quantity = db.Column(db.Integer)
     new_quantity = db.Column(db.Integer)
-    old_location = db.Column(db.String(50))
-    new_location = db.Column(db.String(50))
+    old_location_code = db.Column(db.SmallInteger)
+    new_location_code = db.Column(db.SmallInteger)
+
+    old_location = location_property('old_location_code')
+    new_location = location_property('new_location_code')
 
     def __repr__(self):
         return f'<ProductHistory {self.product_id} {self.action}>'
 
+    @property
+    def name(self):
+        """Nom du produit, lu dans le catalogue en cache (y compris après sa suppression)."""
+        if self.catalogue_id is not None:
+            return get_catalogue().name_of(self.catalogue_id)
+        return self.product.name if self.product is not None else None
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -139,3 +526,45 @@ class ProductHistory(db.Model):
             'old_location': self.old_location,
             'new_location': self.new_location
         }
+
+
+# Codes entiers des actions dans l'historique compact
+ACTION_CODES = {'create': 1, 'update': 2, 'delete': 3, 'reset': 4}
+
+
+class InventorySnapshot(TenantMixin, db.Model):
+    """État complet de l'inventaire d'un tenant à une date donnée."""
+    __table_args__ = (
+        db.Index('ix_inventory_snapshot_tenant_timestamp', 'tenant', 'timestamp', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    items = db.relationship('InventorySnapshotItem', lazy=True, cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<InventorySnapshot {self.timestamp}>'
+
+
+class InventorySnapshotItem(db.Model):
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('inventory_snapshot.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    location_code = db.Column(db.SmallInteger, nullable=False)
+
+
+class HistoryDelta(TenantMixin, db.Model):
+    """Entrée d'historique compactée : variation de quantité et codes entiers."""
+    __table_args__ = (
+        db.Index('ix_history_delta_tenant_timestamp_id', 'tenant', 'timestamp', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    action_code = db.Column(db.SmallInteger, nullable=False)
+    quantity_delta = db.Column(db.Integer, nullable=False)
+    location_code = db.Column(db.SmallInteger, nullable=False)
+
+    def __repr__(self):
+        return f'<HistoryDelta {self.product_id} {self.quantity_delta:+d}>'
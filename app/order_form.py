@@ -0,0 +1,319 @@
+"""Génération des bons de commande à partir du modèle DOCX.
+
+Le modèle est analysé une seule fois : le XML du document principal, le
+contenu brut des autres parties du paquet et la position des cellules de
+quantité (ligne -> produit -> cellule) sont mis en cache. Le cache est
+invalidé quand la date de modification ou la taille du fichier change, ou
+quand les libellés du catalogue changent.
+
+Chaque bon de commande est rempli sur une copie de l'arbre XML
+(``deepcopy`` lxml), puis réécrit dans l'archive avec les autres parties
+inchangées, sans réouvrir le modèle avec python-docx.
+"""
+import copy
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import click
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from lxml import etree
+from werkzeug.utils import secure_filename
+
+from app.catalogue import current_mapping
+from app.matching import MatchReport, get_matcher
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'templates', 'BON COMMANDE PATIENT_KP100225.docx'
+)
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Colonnes du tableau : libellé du produit en 2e colonne, quantité en 4e
+NAME_COLUMN = 1
+QUANTITY_COLUMN = 3
+
+
+class OrderTemplate:
+    """Modèle de bon de commande pré-analysé."""
+
+    def __init__(self, path, matcher):
+        self.path = path
+        self.matcher = matcher
+        document = Document(path)
+
+        self.main_part = document.part.partname.lstrip('/')
+        self.element = document.element
+        with zipfile.ZipFile(path) as archive:
+            self.parts = [
+                (info, None if info.filename == self.main_part else archive.read(info))
+                for info in archive.infolist()
+            ]
+
+        # Les cellules de quantité sont vidées et stylées une fois pour toutes
+        # dans l'arbre en cache ; seul le texte change ensuite à chaque bon.
+        targets = []
+        self.report = MatchReport()
+        for table_index, table in enumerate(document.tables):
+            for row_index, row in enumerate(table.rows):
+                cells = row.cells
+                if len(cells) <= QUANTITY_COLUMN:
+                    continue
+                text = cells[NAME_COLUMN].text.strip()
+                product, kind = matcher.match(text)
+                self.report.add((table_index, row_index), text, product, kind)
+                if product:
+                    targets.append((_prepare_cell(cells[QUANTITY_COLUMN]), product))
+
+        # Position (ordre dans le document) du texte de chaque cellule de quantité
+        text_index = {t: index for index, t in enumerate(self.element.iter(qn('w:t')))}
+        self.targets = [(text_index[t], product) for t, product in targets]
+
+    def fill(self, quantities):
+        """Remplit une copie du modèle et retourne le fichier DOCX.
+
+        Args:
+            quantities (dict): Quantité à inscrire par nom de produit
+
+        Returns:
+            bytes: Contenu du document généré
+        """
+        element = copy.deepcopy(self.element)
+        texts = list(element.iter(qn('w:t')))
+        for position, product in self.targets:
+            texts[position].text = str(quantities.get(product, 0))
+
+        xml = etree.tostring(element, xml_declaration=True, encoding='UTF-8', standalone=True)
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for info, data in self.parts:
+                archive.writestr(info, xml if data is None else data)
+        return output.getvalue()
+
+
+def _prepare_cell(cell):
+    """Vide et met en forme une cellule de quantité, retourne son élément ``w:t``."""
+    cell.text = ''
+    paragraph = cell.paragraphs[0]
+    run = paragraph.runs[0]
+    font = run.font
+    font.size = Pt(12)
+    font.name = 'Arial'
+    paragraph.alignment = 1  # CENTER
+    # L'élément w:t doit exister pour être retrouvé dans les copies
+    return run._r.add_t('')
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_template(path=TEMPLATE_PATH, mapping=None):
+    """Retourne le modèle analysé en cache, rechargé si le fichier ou le catalogue a changé.
+
+    Raises:
+        FileNotFoundError: Si le modèle est introuvable
+    """
+    stat = os.stat(path)
+    matcher = get_matcher(mapping)
+    key = (stat.st_mtime_ns, stat.st_size, id(matcher))
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, OrderTemplate(path, matcher))
+            _cache[path] = cached
+    return cached[1]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# Un seul thread d'archivage : les écritures disque sortent du chemin de la requête
+_archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='order-archive')
+
+
+def archive_order(config, filename, content):
+    """Planifie l'archivage d'un bon de commande si l'option est activée.
+
+    Args:
+        config (dict): Configuration de l'application
+        filename (str): Nom du fichier à écrire
+        content (bytes): Contenu du document
+
+    Returns:
+        Future: Tâche d'archivage, ou None si l'archivage est désactivé
+    """
+    if not config.get('ORDER_ARCHIVE_ENABLED'):
+        return None
+    return _archive_executor.submit(
+        _write_archive,
+        config['ORDER_ARCHIVE_DIR'],
+        filename,
+        content,
+        config.get('ORDER_ARCHIVE_RETENTION_DAYS'),
+        config.get('ORDER_ARCHIVE_MAX_FILES'),
+    )
+
+
+def _write_archive(directory, filename, content, retention_days=None, max_files=None):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    with open(path, 'wb') as f:
+        f.write(content)
+    prune_archive(directory, retention_days, max_files)
+    return path
+
+
+def prune_archive(directory, retention_days=None, max_files=None):
+    """Supprime les archives plus anciennes que la durée de rétention,
+    puis les plus anciennes au-delà du nombre maximal de fichiers.
+
+    Returns:
+        int: Nombre de fichiers supprimés
+    """
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.docx')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    expired = []
+    if retention_days is not None:
+        limit = time.time() - retention_days * 86400
+        expired = [entry for entry in entries if entry.stat().st_mtime < limit]
+        entries = [entry for entry in entries if entry.stat().st_mtime >= limit]
+    if max_files is not None:
+        expired += entries[max_files:]
+    for entry in expired:
+        os.remove(entry.path)
+    return len(expired)
+
+
+def _fill_order(path, mapping, quantities):
+    """Remplit un bon de commande (exécuté dans un processus de travail)."""
+    return get_template(path, mapping).fill(quantities)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def generate_batch(orders, workers=1, path=TEMPLATE_PATH):
+    """Génère plusieurs bons de commande, dans l'ordre des inventaires donnés.
+
+    Le remplissage par python-docx/lxml est limité par le CPU et garde le
+    GIL : au-delà d'un worker, il est réparti sur un pool de processus où
+    chaque processus garde son propre modèle en cache.
+
+    Args:
+        orders (iterable): Quantités par nom de produit, une par bon
+        workers (int): Nombre de processus
+        path (str): Chemin du modèle
+
+    Yields:
+        bytes: Contenu de chaque document
+    """
+    if workers <= 1:
+        # Même matcher (clé : catalogue) et donc même modèle en cache qu'un bon unique
+        template = get_template(path)
+        for quantities in orders:
+            yield template.fill(quantities)
+        return
+    # Les processus de travail n'ont pas accès au catalogue : ses libellés leur sont transmis
+    mapping = current_mapping()
+    orders = list(orders)
+    pool = _get_pool(workers)
+    chunksize = max(1, len(orders) // (workers * 4))
+    yield from pool.map(_fill_order, [path] * len(orders), [mapping] * len(orders), orders,
+                        chunksize=chunksize)
+
+
+class _ZipStream(io.RawIOBase):
+    """Flux d'écriture non positionnable qui accumule les octets écrits."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_orders_zip(orders, workers=1, path=TEMPLATE_PATH):
+    """Génère une archive ZIP des bons de commande, envoyée au fil de sa construction.
+
+    Args:
+        orders (list): ``[{'name': str, 'quantities': dict}, ...]``
+
+    Yields:
+        bytes: Morceaux successifs de l'archive
+    """
+    stream = _ZipStream()
+    names = set()
+    # Les DOCX sont déjà compressés : inutile de les recompresser
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        contents = generate_batch((order['quantities'] for order in orders), workers, path)
+        for index, (order, content) in enumerate(zip(orders, contents), start=1):
+            name = secure_filename(order.get('name') or '') or f'BON_COMMANDE_{index}'
+            if name in names:
+                name = f'{name}_{index}'
+            names.add(name)
+            archive.writestr(f'{name}.docx', content)
+            yield stream.pop()
+    yield stream.pop()
+
+
+def parse_orders(orders):
+    """Valide la liste d'inventaires d'une génération par lot.
+
+    Raises:
+        ValueError: Si la liste est vide ou mal formée
+    """
+    if not isinstance(orders, list) or not orders:
+        raise ValueError("'orders' doit être une liste non vide")
+    parsed = []
+    for order in orders:
+        if not isinstance(order, dict) or not isinstance(order.get('quantities'), dict):
+            raise ValueError("Chaque bon doit contenir un dictionnaire 'quantities'")
+        parsed.append({
+            'name': str(order.get('name') or ''),
+            'quantities': {str(name): int(quantity) for name, quantity in order['quantities'].items()},
+        })
+    return parsed
+
+
+def register_commands(app):
+    @app.cli.command('generate-orders')
+    @click.argument('input_file', type=click.File('r', encoding='utf-8'))
+    @click.argument('output_file', type=click.File('wb'))
+    @click.option('--workers', type=int, default=None, help='Nombre de processus')
+    def generate_orders_command(input_file, output_file, workers):
+        """Génère une archive ZIP de bons de commande à partir d'un fichier JSON."""
+        orders = parse_orders(json.load(input_file))
+        workers = workers or app.config['ORDER_BATCH_WORKERS']
+        for chunk in iter_orders_zip(orders, workers):
+            output_file.write(chunk)
+        click.echo(f'{len(orders)} bon(s) de commande généré(s)')
@@ -0,0 +1,122 @@
+"""Cache des pages rendues, indexé par une version de l'inventaire.
+
+Chaque route d'écriture appelle :func:`bump_inventory_version` après avoir
+validé sa transaction, ce qui invalide toutes les entrées. Tant que la
+version ne change pas, les pages et fragments rendus sont réutilisés, et
+un client qui renvoie l'ETag reçu obtient un 304 sans aucune requête SQL.
+
+Chaque tenant a son propre cache : une modification n'invalide que les
+pages de son tenant.
+
+Le cache est propre au processus : avec plusieurs workers, chacun a sa
+version et ``PAGE_CACHE_TTL`` borne la durée pendant laquelle une page
+modifiée par un autre worker peut être servie.
+"""
+import itertools
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from flask import current_app
+
+from app.tenancy import current_tenant
+
+EXTENSION_KEY = 'page_cache'
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    version: int
+    created: float
+    etag: str
+    value: object
+
+
+class PageCache:
+    """Cache de rendus invalidé par un compteur de version."""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.version = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # Préfixe propre à l'instance : un ETag d'un autre processus ne correspond jamais
+        self._token = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Attend que la version dépasse ``version`` ; retourne True si c'est le cas."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.version != version, timeout)
+
+    def get(self, key):
+        """Retourne l'entrée valide pour ``key``, ou None."""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self.version:
+            return None
+        if self.ttl and time.monotonic() - entry.created > self.ttl:
+            return None
+        return entry
+
+    def get_or_render(self, key, render):
+        """Retourne l'entrée en cache, ou la crée avec ``render()``."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        version = self.version
+        value = render()
+        entry = CacheEntry(version, time.monotonic(), f'{self._token}-{version}-{next(self._sequence)}', value)
+        with self._lock:
+            # Une écriture pendant le rendu rend ce résultat obsolète
+            if version == self.version:
+                self._entries[key] = entry
+        return entry
+
+
+class TenantCaches:
+    """Un :class:`PageCache` par tenant, créé à la demande."""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant):
+        cache = self._caches.get(tenant)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.setdefault(tenant, PageCache(self.ttl))
+        return cache
+
+    def bump_all(self):
+        with self._lock:
+            caches = list(self._caches.values())
+        for cache in caches:
+            cache.bump()
+
+
+def init_app(app):
+    app.extensions[EXTENSION_KEY] = TenantCaches(app.config.get('PAGE_CACHE_TTL'))
+
+
+def get_cache():
+    """Cache du tenant courant."""
+    return current_app.extensions[EXTENSION_KEY].get(current_tenant())
+
+
+def bump_inventory_version():
+    """À appeler après chaque modification validée de l'inventaire."""
+    get_cache().bump()
+
+
+def bump_all():
+    """Invalide les pages de tous les tenants (modification du catalogue)."""
+    current_app.extensions[EXTENSION_KEY].bump_all()
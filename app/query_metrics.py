@@ -0,0 +1,283 @@
+"""Instrumentation des requêtes SQL émises par chaque requête HTTP (optionnelle).
+
+Activée par ``QUERY_METRICS_ENABLED``. Des écouteurs d'événements
+SQLAlchemy (``before_cursor_execute``/``after_cursor_execute``, sur tous
+les moteurs, y compris les bases par tenant) comptent et chronomètrent les
+requêtes SQL ; ``before_request``/``after_request`` mesurent la durée de
+chaque requête HTTP et :
+
+* ajoutent un en-tête ``Server-Timing`` (``db`` : durée SQL et nombre de
+  requêtes, ``app`` : durée totale), affiché par les outils de
+  développement du navigateur ;
+* cumulent des compteurs par route, exposés au format Prometheus sur
+  ``/metrics``, et conservent les requêtes SQL les plus lentes
+  (``/api/query-metrics``) ;
+* comparent le nombre de requêtes SQL au budget de la route
+  (``QUERY_BUDGETS``, sinon ``QUERY_BUDGET_DEFAULT``) : un dépassement est
+  journalisé, et lève :class:`QueryBudgetExceeded` si
+  ``QUERY_BUDGET_STRICT`` est activé (tests), ce qui fait échouer le test
+  qui introduit une régression N+1.
+
+Les réponses en flux (exports CSV) exécutent une partie de leurs requêtes
+après ``after_request`` : seules les requêtes d'avant l'envoi sont comptées.
+
+Hors requête HTTP, :func:`assert_max_queries` borne de même un bloc de code.
+"""
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXTENSION_KEY = 'query_metrics'
+START_KEY = 'query_metrics_start'
+
+# Enregistreurs actifs dans le contexte courant (requête HTTP, bloc de test)
+_recorders = ContextVar('query_recorders', default=())
+_listen_lock = threading.Lock()
+_listening = False
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Une route ou un bloc de code a exécuté plus de requêtes SQL que son budget."""
+
+
+class QueryRecorder:
+    """Nombre, durée et requêtes SQL les plus lentes d'une requête HTTP ou d'un bloc de code."""
+
+    def __init__(self, slowest=5):
+        self.count = 0
+        self.duration = 0.0
+        self.keep = slowest
+        self._slowest = []  # Tas de (durée, requête SQL)
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        _keep_slowest(self._slowest, self.keep, (duration, statement))
+
+    def slowest(self):
+        """Requêtes SQL les plus lentes, de la plus lente à la plus rapide."""
+        return sorted(self._slowest, reverse=True)
+
+    def describe(self):
+        return '\n'.join(f'  {duration * 1000:.2f} ms  {statement}' for duration, statement in self.slowest())
+
+
+def _keep_slowest(heap, size, item):
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif size and item[0] > heap[0][0]:
+        heapq.heapreplace(heap, item)
+
+
+@contextmanager
+def recording(recorder):
+    """Enregistre dans ``recorder`` les requêtes SQL exécutées dans le bloc."""
+    _listen()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fait échouer le bloc s'il exécute plus de ``limit`` requêtes SQL (pour les tests).
+
+    Raises:
+        QueryBudgetExceeded: Si le bloc dépasse ``limit`` requêtes
+    """
+    with recording(QueryRecorder()) as recorder:
+        yield recorder
+    if recorder.count > limit:
+        raise QueryBudgetExceeded(
+            f'{recorder.count} requêtes SQL (maximum : {limit}), les plus lentes :\n{recorder.describe()}'
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _recorders.get():
+        conn.info.setdefault(START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recorders = _recorders.get()
+    starts = conn.info.get(START_KEY)
+    if not recorders or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    for recorder in recorders:
+        recorder.record(statement, duration)
+
+
+def _handle_error(exception_context):
+    # La requête en échec n'atteint pas after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(START_KEY):
+        connection.info[START_KEY].pop()
+
+
+def _listen():
+    """Installe une seule fois les écouteurs, communs à tous les moteurs du processus."""
+    global _listening
+    with _listen_lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class QueryMetrics:
+    """Compteurs par route, cumulés depuis le démarrage du processus."""
+
+    def __init__(self, budgets=None, default_budget=None, strict=False, slowest=5):
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        self.strict = strict
+        self.keep = slowest
+        self._routes = {}
+        self._slowest = []  # Tas de (durée, requête SQL, route)
+        self._lock = threading.Lock()
+
+    def budget_for(self, endpoint):
+        return self.budgets.get(endpoint, self.default_budget)
+
+    def observe(self, endpoint, method, status, recorder, elapsed, exceeded=False):
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {
+                'responses': {}, 'duration': 0.0, 'queries': 0,
+                'query_duration': 0.0, 'max_queries': 0, 'budget_exceeded': 0,
+            })
+            key = (method, status)
+            route['responses'][key] = route['responses'].get(key, 0) + 1
+            route['duration'] += elapsed
+            route['queries'] += recorder.count
+            route['query_duration'] += recorder.duration
+            route['max_queries'] = max(route['max_queries'], recorder.count)
+            route['budget_exceeded'] += exceeded
+            for duration, statement in recorder.slowest():
+                _keep_slowest(self._slowest, self.keep, (duration, statement, endpoint))
+
+    def to_dict(self):
+        with self._lock:
+            routes = {
+                endpoint: {
+                    'requests': sum(route['responses'].values()),
+                    'duration': round(route['duration'], 6),
+                    'queries': route['queries'],
+                    'query_duration': round(route['query_duration'], 6),
+                    'max_queries': route['max_queries'],
+                    'budget': self.budget_for(endpoint),
+                    'budget_exceeded': route['budget_exceeded'],
+                }
+                for endpoint, route in sorted(self._routes.items())
+            }
+            slowest = [
+                {'duration': round(duration, 6), 'statement': statement, 'endpoint': endpoint}
+                for duration, statement, endpoint in sorted(self._slowest, reverse=True)
+            ]
+        return {'routes': routes, 'slowest': slowest}
+
+    def render_prometheus(self):
+        """Compteurs au format texte de Prometheus."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP diadom_http_requests_total Requêtes HTTP traitées.',
+                '# TYPE diadom_http_requests_total counter',
+            ]
+            for endpoint, route in routes:
+                for (method, status), count in sorted(route['responses'].items()):
+                    lines.append(f'diadom_http_requests_total{{endpoint="{_escape(endpoint)}",'
+                                 f'method="{method}",status="{status}"}} {count}')
+            series = [
+                ('diadom_http_request_duration_seconds_total', 'counter',
+                 'Durée cumulée des requêtes HTTP.', 'duration'),
+                ('diadom_db_queries_total', 'counter', 'Requêtes SQL exécutées.', 'queries'),
+                ('diadom_db_query_duration_seconds_total', 'counter',
+                 'Durée cumulée des requêtes SQL.', 'query_duration'),
+                ('diadom_db_queries_per_request_max', 'gauge',
+                 'Nombre maximal de requêtes SQL pour une requête HTTP.', 'max_queries'),
+                ('diadom_query_budget_exceeded_total', 'counter',
+                 'Requêtes HTTP au-delà du budget de requêtes SQL.', 'budget_exceeded'),
+            ]
+            for name, kind, description, field in series:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {kind}')
+                for endpoint, route in routes:
+                    value = route[field]
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def server_timing(recorder, elapsed):
+    """Valeur de l'en-tête ``Server-Timing`` (durées en millisecondes)."""
+    return (f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+            f'app;dur={elapsed * 1000:.2f}')
+
+
+def _before_request():
+    recorder = QueryRecorder(current_app.extensions[EXTENSION_KEY].keep)
+    token = _recorders.set(_recorders.get() + (recorder,))
+    g.query_metrics = (recorder, token, time.perf_counter())
+
+
+def _after_request(response):
+    state = g.get('query_metrics')
+    if state is None:
+        return response
+    recorder, _, started = state
+    elapsed = time.perf_counter() - started
+    metrics = current_app.extensions[EXTENSION_KEY]
+    endpoint = request.endpoint or 'unknown'
+    budget = metrics.budget_for(endpoint)
+    exceeded = budget is not None and recorder.count > budget
+
+    response.headers.add('Server-Timing', server_timing(recorder, elapsed))
+    metrics.observe(endpoint, request.method, response.status_code, recorder, elapsed, exceeded)
+    if exceeded:
+        message = (f'{endpoint}: {recorder.count} requêtes SQL (budget : {budget}), '
+                   f'les plus lentes :\n{recorder.describe()}')
+        current_app.logger.warning(message)
+        if metrics.strict:
+            raise QueryBudgetExceeded(message)
+    return response
+
+
+def _teardown_request(exception=None):
+    state = g.pop('query_metrics', None)
+    if state is not None:
+        _recorders.reset(state[1])
+
+
+def init_app(app):
+    if not app.config.get('QUERY_METRICS_ENABLED'):
+        return
+    _listen()
+    app.extensions[EXTENSION_KEY] = QueryMetrics(
+        budgets=app.config.get('QUERY_BUDGETS'),
+        default_budget=app.config.get('QUERY_BUDGET_DEFAULT'),
+        strict=app.config.get('QUERY_BUDGET_STRICT', False),
+        slowest=app.config.get('QUERY_METRICS_SLOWEST', 5),
+    )
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_metrics():
+    """Compteurs de l'application, ou None si l'instrumentation est désactivée."""
+    return current_app.extensions.get(EXTENSION_KEY)
@@ -1,13 +1,18 @@
-from flask import Blueprint, jsonify, request, render_template, flash, redirect, url_for, send_file
+from flask import Blueprint, Response, abort, current_app, jsonify, request, render_template, flash, redirect, session, url_for, send_file, stream_with_context
+from markupsafe import Markup
 from app import db
-from app.models import Product, ProductHistory, AVAILABLE_PRODUCTS, PRODUCT_NAME_MAPPING
+from app.models import Product
+from app import analytics, catalogue, events, export, history, history_store, order_form, page_cache, query_metrics, sync
+from app.totals import compute_product_totals
+from app.seeding import ensure_products_seeded, invalidate_all_seeds, invalidate_seed
+from app.tenancy import current_tenant
 from datetime import datetime
-import io
-import csv
 from sqlalchemy import func
-from docx import Document
-from docx.shared import Pt
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+import io
 import os
+import uuid
 from pathlib import Path
 
 bp = Blueprint('main', __name__)
@@ -19,82 +24,256 @@ def format_datetime(value):
 
 @bp.route('/')
 def index():
-    # Initialiser les produits s'ils n'existent pas
-    Product.initialize_products()
-    
-    # Récupérer tous les produits
-    products = Product.query.all()
-    
-    # Initialiser le dictionnaire des totaux
-    product_totals = {}
-    for product_name in AVAILABLE_PRODUCTS:
-        product_totals[product_name] = {
-            'box': 0,
-            'apartment': 0,
-            'total': 0
-        }
-    
-    # Calculer les totaux
-    for product in products:
-        if product.quantity is not None:  # Vérifier que la quantité n'est pas None
-            product_totals[product.name][product.location] = product.quantity
-            product_totals[product.name]['total'] += product.quantity
+    cache = page_cache.get_cache()
+    # Les messages flash rendent la page unique : elle n'est alors ni mise en cache ni validée par ETag
+    cacheable = not session.get('_flashes')
+    if cacheable:
+        entry = cache.get('index')
+        if entry is not None and entry.etag in request.if_none_match:
+            return _with_etag(Response(status=304), entry.etag)
+
+    # Initialiser les produits s'ils n'existent pas (une seule fois par application)
+    if ensure_products_seeded():
+        cache.bump()
+
+    if cacheable:
+        entry = cache.get_or_render('index', _render_index)
+        return _with_etag(Response(entry.value), entry.etag)
+    return _render_index()
+
+def _render_index():
+    current = catalogue.get_catalogue()
+    # Emplacements (nom, libellé) dans l'ordre d'affichage
+    locations = [(name, current.location_labels[name]) for name in current.locations]
+    # Fragment des totaux, rendu une fois par version de l'inventaire
+    totals_fragment = page_cache.get_cache().get_or_render(
+        'totals', lambda: Markup(render_template('_product_totals.html', product_totals=compute_product_totals(),
+                                                 locations=locations))
+    ).value
+
+    # Récupérer tous les produits du tenant
+    products = Product.of_tenant().all()
     
     return render_template('index.html', 
                          products=products,
-                         product_totals=product_totals,
-                         available_products=AVAILABLE_PRODUCTS,
+                         totals_fragment=totals_fragment,
+                         available_products=current.names,
+                         locations=locations,
+                         location_labels=current.location_labels,
                          format_datetime=format_datetime)
 
+def _product_payload(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'quantity': product.quantity,
+        'location': product.location,
+        'last_modified': format_datetime(product.last_modified),
+        'version': product.version
+    }
+
+def _expected_version(data):
+    """Version attendue par le client : en-tête If-Match, sinon champ ``version``.
+
+    Returns:
+        int: Version attendue, ou None si le client n'en précise pas
+    """
+    if request.if_match and not request.if_match.star_tag:
+        etags = request.if_match.as_set()
+        if len(etags) != 1:
+            raise ValueError('If-Match doit contenir une seule version')
+        return int(etags.pop())
+    if data.get('version') is not None:
+        return int(data['version'])
+    return None
+
+def _version_conflict(product):
+    response = jsonify({
+        'error': 'Le produit a été modifié entre-temps',
+        'product': _product_payload(product)
+    })
+    response.status_code = 409
+    response.set_etag(str(product.version))
+    return response
+
+def _bulk_conflict(ids):
+    # Même réponse que PUT, avec l'état actuel de toutes les lignes demandées
+    db.session.rollback()
+    products = Product.of_tenant().filter(Product.id.in_(ids)).order_by(Product.id)
+    response = jsonify({
+        'error': 'Le produit a été modifié entre-temps',
+        'products': [_product_payload(product) for product in products]
+    })
+    response.status_code = 409
+    return response
+
+def _inventory_changed(event_type, data):
+    """Invalide les pages en cache et notifie les clients connectés à /api/events."""
+    page_cache.bump_inventory_version()
+    events.publish(event_type, data)
+
+def _location_taken():
+    # Ligne arrivée à l'emplacement cible entre la lecture et l'écriture
+    db.session.rollback()
+    return jsonify({'error': 'Ce produit existe déjà à cet emplacement'}), 409
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    # Le navigateur doit revalider à chaque affichage
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @bp.route('/api/products', methods=['POST'])
 def add_product():
     try:
-        product = Product(
-            name=request.form['name'],
-            quantity=int(request.form['quantity']),
-            location=request.form['location']
-        )
-        db.session.add(product)
-        db.session.flush()  # Pour obtenir l'ID du produit
-        product.log_change('create')
+        name = request.form['name']
+        quantity = int(request.form['quantity'])
+        location = request.form['location']
+
+        # Un produit existe au plus une fois par emplacement : s'il existe déjà,
+        # sa quantité est remplacée
+        product = Product.of_tenant().filter_by(name=name, location=location).first()
+        if product is not None:
+            old_values = {'quantity': product.quantity, 'location': product.location}
+            product.quantity = quantity
+            product.last_modified = datetime.utcnow()
+            product.log_change('update', old_values)
+        else:
+            product = Product(name=name, quantity=quantity, location=location)
+            db.session.add(product)
+            db.session.flush()  # Pour obtenir l'ID du produit
+            product.log_change('create')
         db.session.commit()
+        _inventory_changed('products', {'products': [_product_payload(product)]})
         flash('Produit ajouté avec succès', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors de l\'ajout: {str(e)}', 'danger')
     return redirect(url_for('main.index'))
 
+@bp.route('/api/products/changes')
+def product_changes():
+    since = request.args.get('since') or None
+    try:
+        wait = min(float(request.args.get('wait', 0)), current_app.config['LONG_POLL_MAX_WAIT'])
+        cache = page_cache.get_cache()
+        version = cache.version
+        products, ids, cursor = sync.fetch_changes(since)
+        # Long-polling : attendre une modification si rien n'a changé
+        if not products and wait > 0:
+            db.session.close()
+            if cache.wait_for_change(version, wait):
+                products, ids, cursor = sync.fetch_changes(since)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'products': [product.to_dict() for product in products],
+        'ids': ids,
+        'cursor': cursor
+    })
+
+@bp.route('/api/events')
+def inventory_events():
+    keepalive = current_app.config['EVENTS_KEEPALIVE']
+    broker = events.get_broker()
+    tenant = current_tenant()
+
+    # Pas de stream_with_context : le flux peut durer des heures, il ne doit
+    # garder ni le contexte de requête ni une connexion à la base
+    def stream():
+        # Abonnement limité au tenant : seuls ses événements arrivent dans la file
+        subscription = broker.subscribe(tenant)
+        try:
+            yield ': connected\n\n'
+            while True:
+                event = subscription.get(timeout=keepalive)
+                if event is None:
+                    # Commentaire SSE périodique : garde la connexion ouverte à travers les proxys
+                    yield ': keep-alive\n\n'
+                else:
+                    yield events.format_sse(event)
+        finally:
+            subscription.close()
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @bp.route('/api/products/<int:id>', methods=['PUT'])
 def update_product(id):
     try:
         data = request.get_json()
-        product = Product.query.get_or_404(id)
-        
-        old_values = {
-            'quantity': product.quantity,
-            'location': product.location
-        }
+        product = Product.of_tenant().filter_by(id=id).first_or_404()
+        expected_version = _expected_version(data)
+        if expected_version is not None and expected_version != product.version:
+            return _version_conflict(product)
         
+        quantity = int(data['quantity'])
+        location_code = catalogue.get_catalogue().require_location_code(data['location'])
+        # Déplacement vers un emplacement où le produit existe déjà : les
+        # quantités y sont regroupées et cette ligne passe à zéro
+        target = Product.find_targets([(product, location_code)]).get((product.catalogue_id, location_code))
+
         # Ne mettre à jour que si les valeurs sont différentes
-        if (product.quantity != data['quantity'] or 
-            product.location != data['location']):
-            
-            product.quantity = data['quantity']
-            product.location = data['location']
-            product.last_modified = datetime.utcnow()
-            
-            product.log_change('update', old_values)
+        now = datetime.utcnow()
+        changed = product.apply_change(quantity, location_code, now, target)
+        for changed_product, old_values in changed:
+            changed_product.log_change('update', old_values, now)
+        payload = []
+        if changed:
+            # UPDATE ... WHERE id = ? AND version = ? : échoue si une autre
+            # requête a modifié le produit depuis sa lecture
+            try:
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                current = Product.of_tenant().filter_by(id=id).first()
+                if current is None:
+                    return jsonify({'error': 'Produit introuvable'}), 404
+                return _version_conflict(current)
+            except IntegrityError:
+                return _location_taken()
+            payload = [_product_payload(changed_product) for changed_product, _ in changed]
+            _inventory_changed('products', {'products': payload})
+
+        response = jsonify({
+            'status': 'success',
+            'product': _product_payload(product),
+            'products': payload
+        })
+        response.set_etag(str(product.version))
+        return response
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/products', methods=['PATCH'])
+def bulk_update_products():
+    try:
+        changes = request.get_json()
+        if not isinstance(changes, list):
+            return jsonify({'error': 'Une liste de produits est attendue'}), 400
+
+        try:
+            products, missing = Product.bulk_update(changes)
+            if missing:
+                db.session.rollback()
+                return jsonify({'error': 'Produits introuvables', 'missing': missing}), 404
             db.session.commit()
-        
+        except StaleDataError:
+            # Version fournie périmée, ou ligne modifiée par une autre requête avant l'écriture
+            return _bulk_conflict({int(change['id']) for change in changes})
+        except IntegrityError:
+            return _location_taken()
+        payload = [_product_payload(product) for product in products]
+        _inventory_changed('products', {'products': payload})
+
         return jsonify({
             'status': 'success',
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'quantity': product.quantity,
-                'location': product.location,
-                'last_modified': format_datetime(product.last_modified)
-            }
+            'updated': len(products),
+            'products': payload
         })
     except Exception as e:
         db.session.rollback()
@@ -103,9 +282,13 @@ def update_product(id):
 @bp.route('/api/products/<int:id>', methods=['DELETE'])
 def delete_product(id):
     try:
-        product = Product.query.get_or_404(id)
+        product = Product.of_tenant().filter_by(id=id).first_or_404()
+        product.log_change('delete', {'quantity': product.quantity, 'location': product.location})
         db.session.delete(product)
         db.session.commit()
+        _inventory_changed('delete', {'id': id})
+        # Le produit supprimé sera recréé à la prochaine vérification du catalogue
+        invalidate_seed()
         return '', 204
     except Exception as e:
         db.session.rollback()
@@ -114,141 +297,250 @@ def delete_product(id):
 @bp.route('/api/reset-inventory', methods=['POST'])
 def reset_inventory():
     try:
-        products = Product.query.all()
-        for product in products:
-            old_quantity = product.quantity
-            product.quantity = 0
-            product.last_modified = datetime.utcnow()
-            product.log_change('reset', {'quantity': old_quantity})
+        # Emplacement optionnel : sans emplacement, tout l'inventaire est remis à zéro
+        location = request.values.get('location') or None
+        Product.reset_quantities(location)
         db.session.commit()
+        _inventory_changed('reset', {'location': location})
         flash('Inventaire remis à zéro avec succès', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors de la remise à zéro: {str(e)}', 'danger')
     return redirect(url_for('main.index'))
 
+def _csv_response(chunks, prefix):
+    filename = f'{prefix}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/api/export-csv')
 def export_csv():
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # En-têtes
-    writer.writerow(['Nom', 'Quantité', 'Emplacement', 'Dernière modification'])
-    
-    # Données
-    products = Product.query.all()
-    for product in products:
-        writer.writerow([
-            product.name,
-            product.quantity,
-            product.location,
-            product.last_modified.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'inventaire_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    return _csv_response(export.iter_products_csv(), 'inventaire')
+
+@bp.route('/api/export-history-csv')
+def export_history_csv():
+    return _csv_response(export.iter_history_csv(), 'historique')
+
+def _forecast():
+    config = current_app.config
+    return analytics.forecast(
+        window_days=config['ANALYTICS_WINDOW_DAYS'],
+        coverage_days=config['ORDER_COVERAGE_DAYS'],
+        sessions_per_week=config['SESSIONS_PER_WEEK']
     )
 
+@bp.route('/api/forecast')
+def forecast():
+    return jsonify(_forecast())
+
 @bp.route('/api/generate-order', methods=['GET'])
 def generate_order():
     try:
-        # Chemin du modèle de bon de commande
-        template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'BON COMMANDE PATIENT_KP100225.docx')
-        
-        if not os.path.exists(template_path):
+        if not os.path.exists(order_form.TEMPLATE_PATH):
             return jsonify({'error': 'Le modèle de bon de commande est introuvable'}), 404
 
-        # Charger le document
-        doc = Document(template_path)
+        # Modèle analysé une seule fois, puis mis en cache
+        template = order_form.get_template()
         
-        # Récupérer les totaux par produit
-        products = Product.query.all()
-        product_totals = {}
-        
-        # Initialiser les totaux
-        for product_name in AVAILABLE_PRODUCTS:
-            product_totals[product_name] = {
-                'box': 0,
-                'apartment': 0,
-                'total': 0
-            }
-        
-        # Calculer les totaux
-        for product in products:
-            if product.quantity is not None:
-                product_totals[product.name][product.location] = product.quantity
-                product_totals[product.name]['total'] += product.quantity
-
-        print("\nTotaux calculés pour chaque produit:")
-        for name, totals in product_totals.items():
-            print(f"  {name}: box={totals['box']}, apartment={totals['apartment']}, total={totals['total']}")
-
-        # Parcourir les tableaux du document
-        for table_index, table in enumerate(doc.tables):
-            print(f"\nTraitement Table {table_index + 1}")
-            for row_index, row in enumerate(table.rows):
-                if len(row.cells) < 4:
-                    print(f"  Ligne {row_index + 1}: Ignorée (moins de 4 colonnes)")
-                    continue
-
-                # Lire le nom du produit dans la 2e colonne
-                product_cell_text = row.cells[1].text.strip().upper()
-                print(f"  Ligne {row_index + 1}: Produit trouvé dans la 2e colonne: '{product_cell_text}'")
-                
-                # Chercher une correspondance exacte dans le mapping
-                matched_product = None
-                for db_name, word_names in PRODUCT_NAME_MAPPING.items():
-                    upper_names = [name.upper() for name in word_names]
-                    if product_cell_text in upper_names:
-                        matched_product = db_name
-                        print(f"    -> Correspond à '{db_name}' dans la base")
-                        break
-                
-                if matched_product:
-                    # Mettre à jour la 4e colonne avec le total
-                    total_cell = row.cells[3]
-                    total = product_totals[matched_product]['total']
-                    
-                    old_text = total_cell.text.strip()
-                    total_cell.text = str(total)
-                    print(f"    -> Mise à jour 4e colonne: '{old_text}' -> '{total}'")
-                    
-                    # Appliquer le style
-                    paragraph = total_cell.paragraphs[0]
-                    run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
-                    font = run.font
-                    font.size = Pt(12)
-                    font.name = 'Arial'
-                    paragraph.alignment = 1  # CENTER
-                else:
-                    print(f"    -> Aucune correspondance trouvée dans la base")
+        # Quantités à inscrire : stock actuel, ou quantités suggérées par la prévision
+        if request.args.get('fill') == 'forecast':
+            quantities = {name: values['suggested_order'] for name, values in _forecast().items()}
+        else:
+            product_totals = compute_product_totals()
+            quantities = {name: totals['total'] for name, totals in product_totals.items()}
+        content = template.fill(quantities)
 
-        # Sauvegarder le document généré
-        output_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'generated_files')
-        os.makedirs(output_path, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(output_path, f'BON_COMMANDE_{timestamp}.docx')
-        doc.save(output_file)
+        report = template.report
+        _log_match_report(report)
 
-        print(f"\nDocument sauvegardé: {output_file}")
+        # Le document est envoyé depuis la mémoire ; l'archivage éventuel est asynchrone
+        now = datetime.now()
+        filename = f'BON_COMMANDE_{now.strftime("%Y%m%d_%H%M%S")}.docx'
+        # Nom d'archive unique même pour deux requêtes dans la même seconde
+        archive_name = f'BON_COMMANDE_{now.strftime("%Y%m%d_%H%M%S_%f")}_{uuid.uuid4().hex[:8]}.docx'
+        order_form.archive_order(current_app.config, archive_name, content)
 
-        return send_file(
-            output_file,
+        response = send_file(
+            io.BytesIO(content),
             as_attachment=True,
-            download_name=f'BON_COMMANDE_{timestamp}.docx',
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            download_name=filename,
+            mimetype=order_form.DOCX_MIMETYPE
+        )
+        # Détail ligne par ligne : /api/order-match
+        response.headers['X-Order-Match'] = (
+            f'exact={len(report.exact)}; fuzzy={len(report.fuzzy)}; unmatched={len(report.unmatched)}'
         )
+        return response
 
     except Exception as e:
         print(f"\nErreur: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _log_match_report(report):
+    current_app.logger.info('Correspondances du bon de commande : %d exactes, %d approchées, %d sans correspondance',
+                            len(report.exact), len(report.fuzzy), len(report.unmatched))
+    for table_index, row_index, text, product in report.fuzzy:
+        current_app.logger.info('Ligne %d.%d « %s » associée approximativement à %s',
+                                table_index, row_index, text, product)
+
+@bp.route('/api/order-match')
+def order_match():
+    """Détail, ligne par ligne, de la correspondance entre le modèle et le catalogue."""
+    if not os.path.exists(order_form.TEMPLATE_PATH):
+        return jsonify({'error': 'Le modèle de bon de commande est introuvable'}), 404
+    report = order_form.get_template(order_form.TEMPLATE_PATH).report
+    return jsonify({
+        'counts': {kind: len(entries) for kind, entries in report.to_dict().items()},
+        **report.to_dict()
+    })
+
+@bp.route('/api/generate-orders', methods=['POST'])
+def generate_orders():
+    data = request.get_json(silent=True) or {}
+    try:
+        orders = order_form.parse_orders(data.get('orders'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not os.path.exists(order_form.TEMPLATE_PATH):
+        return jsonify({'error': 'Le modèle de bon de commande est introuvable'}), 404
+
+    filename = f'BONS_COMMANDE_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    return Response(
+        stream_with_context(order_form.iter_orders_zip(orders, current_app.config['ORDER_BATCH_WORKERS'])),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def _catalogue_payload(current):
+    return {
+        'version': current.version,
+        'products': [
+            {'id': current.id_of(name), 'name': name, 'aliases': current.mapping.get(name, [])}
+            for name in current.names
+        ]
+    }
+
+@bp.route('/api/catalogue')
+def list_catalogue():
+    return jsonify(_catalogue_payload(catalogue.get_catalogue()))
+
+@bp.route('/api/catalogue', methods=['POST'])
+def save_catalogue_product():
+    data = request.get_json(silent=True) or {}
+    aliases = data.get('aliases')
+    if aliases is not None and not isinstance(aliases, list):
+        return jsonify({'error': "'aliases' doit être une liste"}), 400
+    try:
+        product, created = catalogue.save_product(data.get('name'), aliases)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Les pages de tous les tenants affichent le catalogue, et un nouveau
+    # produit doit être ajouté à leur inventaire
+    page_cache.bump_all()
+    invalidate_all_seeds()
+    return jsonify(_catalogue_payload(catalogue.get_catalogue())), 201 if created else 200
+
+def _locations_payload(current):
+    return {
+        'version': current.version,
+        'locations': [
+            {'code': current.location_codes[name], 'name': name, 'label': current.location_labels[name]}
+            for name in current.locations
+        ]
+    }
+
+@bp.route('/api/locations')
+def list_locations():
+    return jsonify(_locations_payload(catalogue.get_catalogue()))
+
+@bp.route('/api/locations', methods=['POST'])
+def save_location():
+    data = request.get_json(silent=True) or {}
+    try:
+        location, created = catalogue.save_location(data.get('name'), data.get('label'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Un nouvel emplacement ajoute une colonne aux totaux et des produits à l'inventaire
+    page_cache.bump_all()
+    invalidate_all_seeds()
+    return jsonify(_locations_payload(catalogue.get_catalogue())), 201 if created else 200
+
+@bp.route('/api/history-writer')
+def history_writer_metrics():
+    writer = current_app.extensions.get('history_writer')
+    if writer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **writer.metrics()})
+
+@bp.route('/api/query-metrics')
+def query_metrics_summary():
+    metrics = query_metrics.get_metrics()
+    if metrics is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **metrics.to_dict()})
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    metrics = query_metrics.get_metrics()
+    if metrics is None:
+        abort(404)
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/inventory/as-of')
+def inventory_as_of():
+    try:
+        moment = datetime.fromisoformat(request.args['ts'])
+    except KeyError:
+        return jsonify({'error': "Paramètre 'ts' manquant"}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    state = history_store.inventory_as_of(moment)
+    names = history_store.product_names(state)
+    products = []
+    totals = {}
+    for product_id, values in sorted(state.items()):
+        # Produit retiré du catalogue depuis : il n'a plus de nom, il est ignoré
+        name = names.get(product_id)
+        if name is None:
+            continue
+        products.append({'product_id': product_id, 'name': name, **values})
+        totals[name] = totals.get(name, 0) + values['quantity']
+    return jsonify({'ts': moment.isoformat(), 'products': products, 'totals': totals})
+
 @bp.route('/history')
 def view_history():
-    history = ProductHistory.query.order_by(ProductHistory.timestamp.desc()).all()
-    return render_template('history.html', history=history, format_datetime=format_datetime)
+    try:
+        filters = history.parse_filters(request.args)
+        entries, next_cursor = history.fetch_history_page(**filters)
+    except ValueError as e:
+        flash(f'Filtre invalide: {str(e)}', 'danger')
+        filters = history.parse_filters({})
+        entries, next_cursor = history.fetch_history_page(**filters)
+
+    # Paramètres conservés dans le lien vers la page suivante
+    next_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+    return render_template('history.html',
+                         history=entries,
+                         next_cursor=next_cursor,
+                         next_args=next_args,
+                         filters=filters,
+                         format_datetime=format_datetime)
+
+@bp.route('/api/history')
+def api_history():
+    try:
+        filters = history.parse_filters(request.args)
+        entries, next_cursor = history.fetch_history_page(**filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'history': [entry.to_dict() for entry in entries],
+        'next_cursor': next_cursor
+    })
@@ -0,0 +1,54 @@
+"""Initialisation unique du catalogue de produits.
+
+L'initialisation n'est plus exécutée à chaque affichage de la page
+d'accueil : elle est faite une seule fois par application et par tenant
+(commande ``flask seed-products`` ou premier appel à
+:func:`ensure_products_seeded`), puis un ensemble en mémoire des tenants
+initialisés court-circuite toute vérification.
+"""
+import click
+from flask import current_app
+
+from app.models import Product
+from app.tenancy import current_tenant, use_tenant
+
+SEEDED_KEY = 'inventory_seeded'
+
+
+def ensure_products_seeded(app=None):
+    """Initialise les produits du tenant courant si ce n'est pas déjà fait pour cette application.
+
+    Returns:
+        bool: True si la vérification a été effectuée, False si elle a été ignorée
+    """
+    app = app or current_app._get_current_object()
+    seeded = app.extensions.setdefault(SEEDED_KEY, set())
+    tenant = current_tenant()
+    if tenant in seeded:
+        return False
+    Product.initialize_products(tenant)
+    seeded.add(tenant)
+    return True
+
+
+def invalidate_seed(app=None):
+    """Force une nouvelle vérification du catalogue du tenant courant au prochain appel."""
+    app = app or current_app._get_current_object()
+    app.extensions.get(SEEDED_KEY, set()).discard(current_tenant())
+
+
+def invalidate_all_seeds(app=None):
+    """Force une nouvelle vérification du catalogue de tous les tenants."""
+    app = app or current_app._get_current_object()
+    app.extensions.get(SEEDED_KEY, set()).clear()
+
+
+def register_commands(app):
+    @app.cli.command('seed-products')
+    @click.option('--tenant', default=None, help='Patient à initialiser (par défaut : DEFAULT_TENANT)')
+    def seed_products_command(tenant):
+        """Crée les produits manquants du catalogue (quantité 0)."""
+        with use_tenant(tenant or app.config['DEFAULT_TENANT']):
+            created = Product.initialize_products()
+            app.extensions.setdefault(SEEDED_KEY, set()).add(current_tenant())
+        click.echo(f'{created} produit(s) créé(s)')
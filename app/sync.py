@@ -0,0 +1,56 @@
+"""Synchronisation incrémentale des clients qui interrogent l'inventaire.
+
+Le curseur ``<change_seq>_<id>`` désigne le dernier produit modifié vu
+par le client ; seuls les produits du tenant modifiés après lui sont
+renvoyés, grâce à l'index ``ix_product_tenant_change_seq_id``. Le numéro de
+modification ``change_seq`` est attribué par la base au moment de
+l'écriture, dans l'ordre des validations : une transaction lente ne peut
+pas valider une modification « derrière » un curseur déjà renvoyé, ce qui
+arrivait avec ``last_modified`` (horodaté avant l'écriture). La liste des
+IDs existants (une lecture d'index) permet au client de retirer les
+produits supprimés.
+"""
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models import Product
+from app.tenancy import current_tenant
+
+
+def encode_cursor(product):
+    return f'{product.change_seq}_{product.id}'
+
+
+def decode_cursor(cursor):
+    """Décode un curseur ``<change_seq>_<id>``.
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    change_seq, _, product_id = cursor.rpartition('_')
+    return int(change_seq), int(product_id)
+
+
+def build_changes_query(since=None):
+    """Requête des produits modifiés après le curseur, du plus ancien au plus récent."""
+    query = Product.of_tenant()
+    if since is not None:
+        change_seq, product_id = decode_cursor(since)
+        query = query.filter(or_(
+            Product.change_seq > change_seq,
+            and_(Product.change_seq == change_seq, Product.id > product_id),
+        ))
+    return query.order_by(Product.change_seq, Product.id)
+
+
+def fetch_changes(since=None):
+    """Retourne les produits modifiés après le curseur donné.
+
+    Returns:
+        tuple: (produits modifiés, IDs des produits existants, nouveau curseur)
+    """
+    products = build_changes_query(since).all()
+    ids = [product_id for (product_id,) in
+           db.session.query(Product.id).filter(Product.tenant == current_tenant()).order_by(Product.id)]
+    cursor = encode_cursor(products[-1]) if products else since
+    return products, ids, cursor
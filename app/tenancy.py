@@ -0,0 +1,163 @@
+"""Partitionnement de l'inventaire par patient (ou par site).
+
+Chaque requête est rattachée à un *tenant* : en-tête ``TENANT_HEADER``,
+sinon paramètre ``?tenant=`` (mémorisé dans la session du navigateur),
+sinon ``DEFAULT_TENANT``. Les produits et l'historique portent une colonne
+``tenant`` en tête de leurs index, et toutes les requêtes filtrent sur le
+tenant courant : le coût d'une page dépend des lignes du patient, pas du
+nombre total de patients.
+
+Avec ``TENANT_DATABASE_DIR``, chaque tenant a en plus son propre fichier
+SQLite (``<tenant>.db``) : la session choisit le moteur du tenant courant
+à chaque requête SQL. Les fichiers sont créés à la première utilisation.
+Les tables communes (``info={'shared': True}``, comme le catalogue) restent
+dans la base principale.
+"""
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, jsonify, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, inspect
+
+DEFAULT_TENANT = 'default'
+ENGINES_KEY = 'tenant_engines'
+
+# Sert aussi de nom de fichier : pas de séparateur ni de point
+TENANT_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]{0,63}')
+
+
+def validate_tenant(tenant):
+    """Vérifie un identifiant de tenant.
+
+    Raises:
+        ValueError: Si l'identifiant est invalide
+    """
+    if not TENANT_PATTERN.fullmatch(tenant or ''):
+        raise ValueError(f'Identifiant de patient invalide: {tenant!r}')
+    return tenant
+
+
+def current_tenant():
+    """Tenant de la requête (ou du bloc :func:`use_tenant`) en cours."""
+    if not has_app_context():
+        return DEFAULT_TENANT
+    return g.get('tenant') or current_app.config.get('DEFAULT_TENANT', DEFAULT_TENANT)
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Exécute un bloc pour le tenant donné (commandes CLI, tâches, tests)."""
+    previous = g.get('tenant')
+    g.tenant = validate_tenant(tenant)
+    try:
+        yield tenant
+    finally:
+        g.tenant = previous
+
+
+def resolve_tenant():
+    """Détermine le tenant de la requête (``before_request``)."""
+    config = current_app.config
+    tenant = request.headers.get(config['TENANT_HEADER'])
+    if tenant is None and request.args.get('tenant'):
+        tenant = request.args['tenant']
+        # Le navigateur reste ensuite sur ce patient
+        session['tenant'] = tenant
+    if tenant is None:
+        tenant = session.get('tenant') or config['DEFAULT_TENANT']
+    try:
+        g.tenant = validate_tenant(tenant)
+    except ValueError as e:
+        session.pop('tenant', None)
+        return jsonify({'error': str(e)}), 400
+
+
+class TenantEngines:
+    """Moteurs SQLite par tenant, créés à la demande."""
+
+    def __init__(self, directory, metadata, pragmas=None, engine_options=None):
+        self.directory = directory
+        self.metadata = metadata
+        self.pragmas = pragmas or {}
+        self.engine_options = engine_options or {}
+        self._engines = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, tenant):
+        return os.path.join(self.directory, f'{validate_tenant(tenant)}.db')
+
+    def get(self, tenant):
+        engine = self._engines.get(tenant)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(tenant)
+            if engine is None:
+                from app import apply_sqlite_pragmas
+                engine = create_engine(f'sqlite:///{self.path(tenant)}', **self.engine_options)
+                apply_sqlite_pragmas(engine, self.pragmas)
+                self.metadata.create_all(engine, tables=[
+                    table for table in self.metadata.sorted_tables if not table.info.get('shared')
+                ])
+                self._engines[tenant] = engine
+        return engine
+
+    def tenants(self):
+        """Tenants ayant déjà un fichier de base."""
+        return sorted(name[:-3] for name in os.listdir(self.directory)
+                      if name.endswith('.db') and TENANT_PATTERN.fullmatch(name[:-3]))
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+class TenantSession(Session):
+    """Session qui utilise la base du tenant courant quand les bases sont séparées."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            engines = current_app.extensions.get(ENGINES_KEY)
+            if engines is not None and not _is_shared(mapper, clause):
+                return engines.get(current_tenant())
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_shared(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table.info.get('shared', False)
+    table = getattr(clause, 'table', None)
+    return table is not None and table.info.get('shared', False)
+
+
+def get_engines():
+    """Moteurs par tenant, ou None si tous les tenants partagent la base."""
+    return current_app.extensions.get(ENGINES_KEY)
+
+
+def known_tenants():
+    """Tenants existants : fichiers de base, ou valeurs de la colonne ``tenant``."""
+    engines = get_engines()
+    if engines is not None:
+        return engines.tenants()
+    from app import db
+    from app.models import Product
+    return [tenant for (tenant,) in db.session.query(Product.tenant).distinct().order_by(Product.tenant)]
+
+
+def init_app(app, db):
+    app.before_request(resolve_tenant)
+    directory = app.config.get('TENANT_DATABASE_DIR')
+    if directory:
+        app.extensions[ENGINES_KEY] = TenantEngines(
+            directory,
+            db.metadata,
+            pragmas=app.config.get('SQLITE_PRAGMAS'),
+            engine_options=app.config.get('SQLALCHEMY_ENGINE_OPTIONS'),
+        )
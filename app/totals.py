@@ -0,0 +1,51 @@
+"""Calcul des totaux de produits côté SQL.
+
+Les quantités sont agrégées en une seule requête ``GROUP BY catalogue_id``
+avec un pivot ``SUM(CASE ...)`` par code d'emplacement, quel que soit le
+nombre d'emplacements : aucun objet ``Product`` n'est chargé, seules des
+lignes de tuples sont lues, et les noms viennent du catalogue en cache.
+"""
+from sqlalchemy import case, func
+
+from app import db
+from app.catalogue import get_catalogue
+from app.models import Product
+from app.tenancy import current_tenant
+
+
+def fetch_totals(tenant=None):
+    """Retourne les totaux par produit du tenant sous forme de tuples.
+
+    Returns:
+        list[tuple]: ``(nom, quantité par emplacement..., total)``, les
+        emplacements étant dans l'ordre du catalogue
+    """
+    catalogue = get_catalogue()
+    quantity = func.coalesce(Product.quantity, 0)
+    columns = [
+        func.sum(case((Product.location_code == catalogue.location_codes[location], quantity), else_=0))
+        for location in catalogue.locations
+    ]
+    query = (
+        db.session.query(Product.catalogue_id, *columns, func.sum(quantity))
+        .filter(Product.tenant == (tenant or current_tenant()))
+        .group_by(Product.catalogue_id)
+    )
+    return [(catalogue.name_of(catalogue_id), *quantities) for catalogue_id, *quantities in query]
+
+
+def compute_product_totals(tenant=None):
+    """Retourne les totaux par produit du tenant indexés par nom.
+
+    Tous les produits du catalogue sont présents (à 0 s'ils n'existent pas
+    dans l'inventaire), dans l'ordre du catalogue.
+
+    Returns:
+        dict: ``{nom: {emplacement: int, ..., 'total': int}}``
+    """
+    catalogue = get_catalogue()
+    keys = [*catalogue.locations, 'total']
+    totals = {name: dict.fromkeys(keys, 0) for name in catalogue.names}
+    for name, *quantities in fetch_totals(tenant):
+        totals[name] = dict(zip(keys, quantities))
+    return totals
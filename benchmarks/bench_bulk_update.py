@@ -0,0 +1,75 @@
+"""Débit des mises à jour de quantités : PUT unitaires contre PATCH par lot.
+
+Usage :
+    python benchmarks/bench_bulk_update.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.catalogue import get_catalogue  # noqa: E402
+from app.models import CatalogueProduct, CatalogueState, Product  # noqa: E402
+from config import Config  # noqa: E402
+
+BATCH_SIZES = (10, 100, 1000)
+
+
+def make_app(path, rows):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        # Un produit du catalogue par ligne : un produit n'existe qu'une fois par emplacement
+        catalogue_ids = db.session.execute(
+            insert(CatalogueProduct).returning(CatalogueProduct.id),
+            [{'name': f'Produit {i}', 'position': 1000 + i} for i in range(rows)]
+        ).scalars().all()
+        db.session.execute(update(CatalogueState).values(version=CatalogueState.version + 1))
+        db.session.commit()
+        location_code = get_catalogue().require_location_code('box')
+        db.session.add_all(
+            Product(catalogue_id=catalogue_id, quantity=0, location_code=location_code)
+            for catalogue_id in catalogue_ids
+        )
+        db.session.commit()
+        ids = [product_id for (product_id,) in db.session.query(Product.id).order_by(Product.id)]
+    return app, ids
+
+
+def main():
+    for size in BATCH_SIZES:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        app, ids = make_app(path, size)
+        client = app.test_client()
+
+        start = time.perf_counter()
+        for product_id in ids:
+            client.put(f'/api/products/{product_id}', json={'quantity': 1, 'location': 'box'})
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.patch('/api/products', json=[
+            {'id': product_id, 'quantity': 2, 'location': 'box'} for product_id in ids
+        ])
+        bulk = time.perf_counter() - start
+        assert response.status_code == 200, response.data
+
+        print(f"lot de {size:5}: PUT unitaires {size / single:8.0f} lignes/s, "
+              f"PATCH {size / bulk:8.0f} lignes/s (x{single / bulk:.1f})")
+
+        with app.app_context():
+            db.engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Temps de calcul de la prévision sur un long historique.
+
+Usage :
+    python benchmarks/bench_forecast.py [--rows 1000000] [--years 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import analytics, create_app, db  # noqa: E402
+from app.models import Product, ProductHistory  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--window', type=int, default=28)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        Product.initialize_products()
+        product_ids = [product_id for (product_id,) in db.session.query(Product.id)]
+
+        rng = random.Random(0)
+        end = datetime.utcnow()
+        span = args.years * 365 * 86400
+        for start in range(0, args.rows, 50_000):
+            db.session.execute(insert(ProductHistory), [
+                {
+                    'product_id': rng.choice(product_ids),
+                    'timestamp': end - timedelta(seconds=rng.randrange(span)),
+                    'action': 'update',
+                    'old_quantity': 10,
+                    'new_quantity': rng.randrange(5, 15),
+                }
+                for _ in range(min(50_000, args.rows - start))
+            ])
+        db.session.commit()
+
+        for window in (args.window, args.years * 365):
+            start = time.perf_counter()
+            analytics.forecast(window_days=window, end=end)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{args.rows} lignes, fenêtre {window} jours : {elapsed:.0f} ms")
+
+        db.engine.dispose()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
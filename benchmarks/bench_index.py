@@ -0,0 +1,81 @@
+"""Mesure de la latence de la page d'accueil (p50/p99).
+
+Compare l'ancien comportement (initialisation produit par produit à chaque
+requête) avec l'initialisation unique du catalogue.
+
+Usage :
+    python benchmarks/bench_index.py [--requests 500]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.catalogue import get_catalogue  # noqa: E402
+from app.models import Product, AVAILABLE_PRODUCTS  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def legacy_initialize_products():
+    """Reproduction de l'ancienne initialisation (2 requêtes par produit + commit)."""
+    for product_name in AVAILABLE_PRODUCTS:
+        for location in get_catalogue().locations:
+            if not Product.query.filter_by(name=product_name, location=location).first():
+                product = Product(name=product_name, quantity=0, location=location)
+                db.session.add(product)
+                db.session.flush()
+                product.log_change('create')
+    db.session.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(legacy, requests):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(BenchConfig)
+    if legacy:
+        app.before_request(legacy_initialize_products)
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    client.get('/')  # Préchauffage
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/')
+        timings.append((time.perf_counter() - start) * 1000)
+
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(path)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    for label, legacy in (('avant', True), ('après', False)):
+        timings = run(legacy, args.requests)
+        print(f"{label:6} p50={statistics.median(timings):.2f} ms "
+              f"p99={percentile(timings, 99):.2f} ms ({args.requests} requêtes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Débit de la génération de bons de commande par lot (documents/seconde).
+
+Usage :
+    python benchmarks/bench_order_batch.py [--documents 200] [--rows 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document  # noqa: E402
+
+from app import order_form  # noqa: E402
+from app.models import PRODUCT_NAME_MAPPING  # noqa: E402
+
+
+def build_template(path, rows):
+    """Crée un modèle synthétique dont les lignes reprennent les libellés connus."""
+    aliases = [names[0] for names in PRODUCT_NAME_MAPPING.values()]
+    document = Document()
+    table = document.add_table(rows=rows, cols=4)
+    for index, row in enumerate(table.rows):
+        row.cells[1].text = aliases[index % len(aliases)]
+    document.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'modele.docx')
+        build_template(path, args.rows)
+        orders = [
+            {'name': f'patient_{index}', 'quantities': {name: index for name in PRODUCT_NAME_MAPPING}}
+            for index in range(args.documents)
+        ]
+
+        for workers in (1, 2, 4, 8):
+            # Préchauffage : démarrage du pool et chargement du modèle dans chaque processus
+            for _ in order_form.iter_orders_zip(orders[:workers * 2], workers, path):
+                pass
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in order_form.iter_orders_zip(orders, workers, path))
+            elapsed = time.perf_counter() - start
+            print(f"workers={workers}: {args.documents / elapsed:.1f} documents/s "
+                  f"({size / 1e6:.1f} Mo)")
+
+
+if __name__ == '__main__':
+    main()
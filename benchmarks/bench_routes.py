@@ -0,0 +1,420 @@
+"""Latence et débit de toutes les routes, à plusieurs volumes d'historique.
+
+Pour chaque volume (10², 10⁴ et 10⁶ lignes d'historique par défaut), une
+base SQLite est remplie une fois, puis copiée pour chaque mode de mesure :
+
+* ``client`` : requêtes séquentielles par le client de test Flask (coût
+  de l'application seule) ;
+* ``server`` : serveur WSGI réel (werkzeug, multi-thread) sur un port
+  local, interrogé par ``--concurrency`` clients HTTP simultanés.
+
+Chaque route est appelée ``--requests`` fois, ou pendant au plus
+``--duration`` secondes. Le script affiche le débit et les percentiles
+p50/p95/p99 (ms) et les enregistre en JSON (avec le commit courant) pour
+comparer deux versions avec ``--compare``. Le flux ``/api/events`` (SSE)
+n'a pas de durée de réponse et n'est pas mesuré.
+
+Sans le modèle de bon de commande réel, un modèle synthétique est créé le
+temps de la mesure (comme dans bench_order_batch.py).
+
+Usage :
+    python benchmarks/bench_routes.py [--scales 100,10000,1000000] [--requests 200]
+        [--duration 10] [--concurrency 8] [--modes client,server] [--routes index,put]
+        [--output resultats.json] [--compare ancien.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+
+from app import create_app, db, order_form  # noqa: E402
+from app.catalogue import get_catalogue  # noqa: E402
+from app.models import CatalogueProduct, CatalogueState, Product, ProductHistory  # noqa: E402
+from config import get_config  # noqa: E402
+from bench_order_batch import build_template  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+SEED_BATCH = 50000
+HISTORY_DAYS = 365
+
+
+def make_app(path, config_name='production'):
+    class BenchConfig(get_config(config_name)):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        DEBUG = False
+
+    return create_app(BenchConfig)
+
+
+def seed(path, history_rows):
+    """Crée l'inventaire complet et ``history_rows`` lignes d'historique réparties sur un an."""
+    app = make_app(path)
+    rng = random.Random(history_rows)
+    with app.app_context():
+        db.create_all()
+        Product.initialize_products()
+        products = db.session.query(Product.id, Product.location_code, Product.tenant).all()
+        start = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+        step = HISTORY_DAYS * 86400 / max(history_rows, 1)
+        for offset in range(0, history_rows, SEED_BATCH):
+            rows = []
+            for index in range(offset, min(offset + SEED_BATCH, history_rows)):
+                product_id, location_code, tenant = products[index % len(products)]
+                old_quantity = rng.randint(0, 50)
+                rows.append({
+                    'tenant': tenant,
+                    'product_id': product_id,
+                    'timestamp': start + timedelta(seconds=index * step),
+                    'action': 'update',
+                    'old_quantity': old_quantity,
+                    'new_quantity': max(0, old_quantity + rng.randint(-5, 5)),
+                    'old_location_code': location_code,
+                    'new_location_code': location_code,
+                })
+            db.session.execute(insert(ProductHistory), rows)
+            db.session.commit()
+        db.engine.dispose()
+
+
+def add_disposable_products(app, count):
+    """Ajoute ``count`` produits au catalogue et à l'inventaire, à supprimer par DELETE."""
+    with app.app_context():
+        ids = db.session.execute(
+            insert(CatalogueProduct).returning(CatalogueProduct.id),
+            [{'name': f'Banc {index}', 'position': 10000 + index} for index in range(count)]
+        ).scalars().all()
+        db.session.execute(update(CatalogueState).values(version=CatalogueState.version + 1))
+        db.session.commit()
+        products = [Product(catalogue_id=catalogue_id, quantity=1, location='box') for catalogue_id in ids]
+        db.session.add_all(products)
+        db.session.commit()
+        return [product.id for product in products]
+
+
+class State:
+    """Données partagées par les générateurs de requêtes d'un mode."""
+
+    def __init__(self, app):
+        self.app = app
+        self.rng = random.Random(0)
+        self.lock = threading.Lock()
+        with app.app_context():
+            rows = db.session.query(Product.id, Product.location_code).all()
+            catalogue = get_catalogue()
+            self.products = [(product_id, catalogue.location_name_of(code)) for product_id, code in rows]
+            self.names = list(catalogue.names)
+            self.locations = list(catalogue.locations)
+        self.as_of = (datetime.utcnow() - timedelta(days=HISTORY_DAYS // 2)).isoformat()
+        self.disposable = []
+
+    def pick(self):
+        with self.lock:
+            return self.rng.choice(self.products), self.rng.randint(0, 50)
+
+    def next_disposable(self):
+        with self.lock:
+            return self.disposable.pop() if self.disposable else None
+
+
+def _put(state):
+    (product_id, location), quantity = state.pick()
+    return 'PUT', f'/api/products/{product_id}', {'json': {'quantity': quantity, 'location': location}}
+
+
+def _patch(state):
+    changes = []
+    for _ in range(10):
+        (product_id, location), quantity = state.pick()
+        changes.append({'id': product_id, 'quantity': quantity, 'location': location})
+    return 'PATCH', '/api/products', {'json': changes}
+
+
+def _add(state):
+    _, quantity = state.pick()
+    with state.lock:
+        name, location = state.rng.choice(state.names), state.rng.choice(state.locations)
+    return 'POST', '/api/products', {'data': {'name': name, 'quantity': quantity, 'location': location}}
+
+
+def _delete(state):
+    product_id = state.next_disposable()
+    return 'DELETE', f'/api/products/{product_id}', {}
+
+
+# (nom, générateur de (méthode, chemin, corps)) ; les écritures viennent
+# après les lectures, et DELETE en dernier car il modifie le catalogue
+ROUTES = [
+    ('index', lambda state: ('GET', '/', {})),
+    ('history', lambda state: ('GET', '/history', {})),
+    ('api-history', lambda state: ('GET', '/api/history', {})),
+    ('changes', lambda state: ('GET', '/api/products/changes', {})),
+    ('as-of', lambda state: ('GET', f'/api/inventory/as-of?{urlencode({"ts": state.as_of})}', {})),
+    ('export-csv', lambda state: ('GET', '/api/export-csv', {})),
+    ('export-history-csv', lambda state: ('GET', '/api/export-history-csv', {})),
+    ('forecast', lambda state: ('GET', '/api/forecast', {})),
+    ('generate-order', lambda state: ('GET', '/api/generate-order', {})),
+    ('catalogue', lambda state: ('GET', '/api/catalogue', {})),
+    ('locations', lambda state: ('GET', '/api/locations', {})),
+    ('history-writer', lambda state: ('GET', '/api/history-writer', {})),
+    ('add', _add),
+    ('put', _put),
+    ('patch', _patch),
+    ('reset', lambda state: ('POST', '/api/reset-inventory', {})),
+    ('delete', _delete),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def summarize(latencies, statuses, elapsed):
+    errors = sum(count for status, count in statuses.items() if not _ok(status))
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'status': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput': round(len(latencies) / elapsed, 2),
+        'p50': round(percentile(latencies, 50) * 1000, 3),
+        'p95': round(percentile(latencies, 95) * 1000, 3),
+        'p99': round(percentile(latencies, 99) * 1000, 3),
+        'max': round(max(latencies) * 1000, 3),
+    }
+
+
+def _ok(status):
+    return 200 <= status < 400
+
+
+def run_client(app, state, make_request, requests, duration):
+    """Requêtes séquentielles par le client de test."""
+    client = app.test_client()
+    latencies, statuses = [], Counter()
+    start = time.perf_counter()
+    deadline = start + duration
+    while len(latencies) < requests and time.perf_counter() < deadline:
+        method, path, body = make_request(state)
+        began = time.perf_counter()
+        response = client.open(path, method=method, **body)
+        response.get_data()  # Consomme les réponses en flux (CSV)
+        latencies.append(time.perf_counter() - began)
+        statuses[response.status_code] += 1
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def _http_request(port, method, path, body):
+    headers = {}
+    payload = None
+    if 'json' in body:
+        payload = json.dumps(body['json']).encode()
+        headers['Content-Type'] = 'application/json'
+    elif 'data' in body:
+        payload = urlencode(body['data']).encode()
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_server(port, state, make_request, requests, duration, concurrency):
+    """Requêtes HTTP de ``concurrency`` clients simultanés vers le serveur WSGI."""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    remaining = [requests]
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            method, path, body = make_request(state)
+            began = time.perf_counter()
+            try:
+                status = _http_request(port, method, path, body)
+            except OSError:
+                status = 0  # Connexion refusée ou interrompue
+            elapsed = time.perf_counter() - began
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def run_mode(mode, template, args, routes):
+    """Mesure toutes les routes sur une copie de la base ``template``."""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    shutil.copy(template, path)
+    app = make_app(path, args.config)
+    state = State(app)
+    server = None
+    if mode == 'server':
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    try:
+        for name, make_request in routes:
+            if name == 'delete':
+                state.disposable = add_disposable_products(app, args.requests)
+            if mode == 'server':
+                summary = run_server(server.server_port, state, make_request,
+                                     args.requests, args.duration, args.concurrency)
+            else:
+                summary = run_client(app, state, make_request, args.requests, args.duration)
+            results[name] = summary
+            print(f"  {mode:6} {name:20} {summary.get('throughput', 0):9.1f} req/s  "
+                  f"p50={summary.get('p50', 0):8.2f}  p95={summary.get('p95', 0):8.2f}  "
+                  f"p99={summary.get('p99', 0):8.2f} ms  erreurs={summary['errors']}", flush=True)
+    finally:
+        if server is not None:
+            server.shutdown()
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Affiche l'évolution des p50/p95 par rapport à un fichier de résultats précédent."""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    print(f"\nComparaison avec {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for scale, modes in results.items():
+        for mode, routes in modes.items():
+            for name, summary in routes.items():
+                old = baseline['results'].get(scale, {}).get(mode, {}).get(name)
+                if not old or 'p50' not in old or 'p50' not in summary:
+                    continue
+                print(f"  {scale:>8} {mode:6} {name:20} "
+                      f"p50 x{summary['p50'] / old['p50']:5.2f}  p95 x{summary['p95'] / old['p95']:5.2f}")
+
+
+def run_scales(scales, modes, args, routes, results):
+    for scale in scales:
+        directory = tempfile.mkdtemp()
+        template = os.path.join(directory, 'template.db')
+        began = time.perf_counter()
+        seed(template, scale)
+        print(f"{scale} lignes d'historique (préparation {time.perf_counter() - began:.1f} s)", flush=True)
+        try:
+            results[str(scale)] = {mode: run_mode(mode, template, args, routes) for mode in modes}
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='100,10000,1000000',
+                        help="Nombres de lignes d'historique, séparés par des virgules")
+    parser.add_argument('--requests', type=int, default=200, help='Requêtes par route')
+    parser.add_argument('--duration', type=float, default=10, help='Durée maximale par route (secondes)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Clients simultanés (mode server)')
+    parser.add_argument('--modes', default='client,server')
+    parser.add_argument('--config', default='production',
+                        help="Configuration de l'application (PRAGMA SQLite, pool de connexions)")
+    parser.add_argument('--routes', default=None, help='Routes à mesurer (toutes par défaut)')
+    parser.add_argument('--output', default=None, help='Fichier JSON des résultats')
+    parser.add_argument('--compare', default=None, help='Fichier JSON de résultats à comparer')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    modes = args.modes.split(',')
+    routes = ROUTES
+    if args.routes:
+        selected = set(args.routes.split(','))
+        routes = [route for route in ROUTES if route[0] in selected]
+
+    commit = git_commit()
+    synthetic_template = not os.path.exists(order_form.TEMPLATE_PATH)
+    if synthetic_template:
+        os.makedirs(os.path.dirname(order_form.TEMPLATE_PATH), exist_ok=True)
+        build_template(order_form.TEMPLATE_PATH, 200)
+
+    results = {}
+    try:
+        run_scales(scales, modes, args, routes, results)
+    finally:
+        if synthetic_template:
+            os.remove(order_form.TEMPLATE_PATH)
+            try:
+                os.rmdir(os.path.dirname(order_form.TEMPLATE_PATH))  # S'il a été créé ici
+            except OSError:
+                pass
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"routes-{(commit or 'local')[:12]}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({
+            'meta': {
+                'commit': commit,
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'requests': args.requests,
+                'duration': args.duration,
+                'concurrency': args.concurrency,
+                'config': args.config,
+            },
+            'results': results,
+        }, file, indent=2)
+    print(f'\nRésultats enregistrés dans {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Lectures et écritures concurrentes : configuration par défaut contre production.
+
+Des threads lecteurs chargent la page d'accueil pendant que des threads
+écrivains modifient des quantités (chaque ligne garde son emplacement, la
+version lue est envoyée). Le script compte séparément les opérations
+réussies, les conflits de version (409), les erreurs de verrouillage
+(« database is locked ») et les autres erreurs.
+
+Usage :
+    python benchmarks/bench_sqlite_concurrency.py [--readers 4] [--writers 4] [--duration 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Product  # noqa: E402
+from config import DevelopmentConfig, ProductionConfig  # noqa: E402
+
+
+def outcome(response, success):
+    """Compteur où ranger une réponse."""
+    if response.status_code == 200:
+        return success
+    if b'database is locked' in response.data:
+        return 'locked'
+    if response.status_code == 409:
+        return 'conflicts'
+    return 'errors'
+
+
+def run(base_config, readers, writers, duration):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+
+    class BenchConfig(base_config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        Product.initialize_products()
+        rows = [(product.id, product.location, product.version) for product in Product.query.order_by(Product.id)]
+
+    counts = {'reads': 0, 'writes': 0, 'conflicts': 0, 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def reader():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = client.get('/')
+            with lock:
+                counts[outcome(response, 'reads')] += 1
+
+    def writer(offset):
+        client = app.test_client()
+        # Chaque écrivain a ses propres lignes : un conflit de version signale
+        # une écriture perdue, pas deux écrivains sur la même ligne
+        own = rows[offset::writers]
+        versions = {product_id: version for product_id, _, version in own}
+        quantity = 0
+        while time.perf_counter() < deadline:
+            quantity += 1
+            product_id, location, _ = own[quantity % len(own)]
+            response = client.put(f'/api/products/{product_id}', json={
+                'quantity': quantity, 'location': location, 'version': versions[product_id]
+            })
+            if response.status_code in (200, 409):
+                versions[product_id] = response.get_json()['product']['version']
+            with lock:
+                counts[outcome(response, 'writes')] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        db.engine.dispose()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    for label, config in (('défaut', DevelopmentConfig), ('production', ProductionConfig)):
+        counts = run(config, args.readers, args.writers, args.duration)
+        print(f"{label:10} lectures={counts['reads'] / args.duration:7.0f}/s "
+              f"écritures={counts['writes'] / args.duration:7.0f}/s conflits={counts['conflicts']} "
+              f"verrous={counts['locked']} erreurs={counts['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,3 +9,124 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Archivage des bons de commande générés (désactivé par défaut)
+    ORDER_ARCHIVE_ENABLED = os.environ.get('ORDER_ARCHIVE_ENABLED', '').lower() in ('1', 'true', 'yes')
+    ORDER_ARCHIVE_DIR = os.environ.get('ORDER_ARCHIVE_DIR') or os.path.join(basedir, 'generated_files')
+    ORDER_ARCHIVE_RETENTION_DAYS = int(os.environ.get('ORDER_ARCHIVE_RETENTION_DAYS', 30))
+    ORDER_ARCHIVE_MAX_FILES = int(os.environ.get('ORDER_ARCHIVE_MAX_FILES', 500))
+
+    # Nombre de processus pour la génération de bons de commande par lot
+    ORDER_BATCH_WORKERS = int(os.environ.get('ORDER_BATCH_WORKERS') or min(4, os.cpu_count() or 1))
+
+    # Écriture différée de l'historique (désactivée par défaut)
+    HISTORY_WRITER_ENABLED = os.environ.get('HISTORY_WRITER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 100))
+    HISTORY_FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 1.0))  # secondes
+    HISTORY_QUEUE_SIZE = int(os.environ.get('HISTORY_QUEUE_SIZE', 10000))
+    HISTORY_JOURNAL_PATH = os.environ.get('HISTORY_JOURNAL_PATH')  # Journal local optionnel
+    HISTORY_JOURNAL_MAX_BYTES = int(os.environ.get('HISTORY_JOURNAL_MAX_BYTES', 1 << 20))
+    HISTORY_SUBMIT_TIMEOUT = float(os.environ.get('HISTORY_SUBMIT_TIMEOUT', 1.0))  # secondes
+    HISTORY_RETRIES = int(os.environ.get('HISTORY_RETRIES', 3))
+    HISTORY_RETRY_BACKOFF = float(os.environ.get('HISTORY_RETRY_BACKOFF', 0.1))  # secondes
+
+    # Jours d'historique toujours consultables en entier (jamais compactés)
+    HISTORY_AUDIT_DAYS = int(os.environ.get('HISTORY_AUDIT_DAYS', 365))
+
+    # Durée de vie maximale (secondes) des pages en cache
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))
+
+    # Attente maximale (secondes) d'une requête /api/products/changes en long-polling
+    LONG_POLL_MAX_WAIT = int(os.environ.get('LONG_POLL_MAX_WAIT', 30))
+
+    # Diffusion des événements : 'local' (processus) ou 'file' (plusieurs workers)
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'local')
+    EVENTS_FILE = os.environ.get('EVENTS_FILE') or os.path.join(basedir, 'events.log')
+    # Taille au-delà de laquelle le fichier d'événements est renommé en .1
+    EVENTS_FILE_MAX_BYTES = int(os.environ.get('EVENTS_FILE_MAX_BYTES', 10 * 1024 * 1024))
+    EVENTS_KEEPALIVE = int(os.environ.get('EVENTS_KEEPALIVE', 15))  # secondes
+
+    # Prévision des commandes
+    ANALYTICS_WINDOW_DAYS = int(os.environ.get('ANALYTICS_WINDOW_DAYS', 28))
+    ORDER_COVERAGE_DAYS = int(os.environ.get('ORDER_COVERAGE_DAYS', 28))
+    SESSIONS_PER_WEEK = float(os.environ.get('SESSIONS_PER_WEEK', 6))
+
+    # Intervalle (secondes) de vérification de la version du catalogue en cache
+    CATALOGUE_CHECK_INTERVAL = float(os.environ.get('CATALOGUE_CHECK_INTERVAL', 5))
+
+    # Multi-patient : tenant de chaque requête (en-tête, sinon ?tenant=, sinon défaut)
+    TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant')
+    DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+    # Dossier d'une base SQLite par tenant (par défaut : une base partagée)
+    TENANT_DATABASE_DIR = os.environ.get('TENANT_DATABASE_DIR')
+
+    # Instrumentation SQL par requête : en-tête Server-Timing, /metrics (désactivée par défaut)
+    QUERY_METRICS_ENABLED = os.environ.get('QUERY_METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    QUERY_METRICS_SLOWEST = int(os.environ.get('QUERY_METRICS_SLOWEST', 5))  # Requêtes SQL les plus lentes conservées
+    # Nombre maximal de requêtes SQL par route (endpoint), sinon QUERY_BUDGET_DEFAULT (aucun si None).
+    # Régime établi + une marge pour le rechargement du catalogue en cache ; l'initialisation
+    # des produits d'un nouveau tenant dépasse une fois le budget de la page d'accueil.
+    QUERY_BUDGETS = {
+        'main.index': 10,
+        'main.view_history': 6,
+        'main.api_history': 6,
+        'main.product_changes': 7,
+        'main.inventory_as_of': 9,
+        'main.forecast': 7,
+        'main.add_product': 9,
+        'main.update_product': 9,
+        'main.delete_product': 9,
+        'main.reset_inventory': 7,
+        'main.list_catalogue': 5,
+        'main.list_locations': 5,
+    }
+    QUERY_BUDGET_DEFAULT = int(os.environ['QUERY_BUDGET_DEFAULT']) if os.environ.get('QUERY_BUDGET_DEFAULT') else None
+    # Lever une exception au lieu de journaliser un dépassement de budget
+    QUERY_BUDGET_STRICT = False
+
+    # PRAGMA SQLite appliqués à chaque nouvelle connexion (aucun par défaut)
+    SQLITE_PRAGMAS = {}
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class ProductionConfig(Config):
+    # WAL : les lectures ne bloquent plus les écritures, et synchronous=NORMAL
+    # évite un fsync à chaque transaction (seulement aux checkpoints).
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'cache_size': -64000,  # 64 Mo
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 20)),
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Retourne la classe de configuration choisie par ``APP_CONFIG`` (development par défaut)."""
+    name = name or os.environ.get('APP_CONFIG') or 'development'
+    try:
+        return configs[name]
+    except KeyError:
+        raise ValueError(f"Configuration inconnue: {name} ({', '.join(configs)})") from None
@@ -0,0 +1,40 @@
+"""Change sequence on product for incremental sync, replacing the last_modified cursor index
+
+Revision ID: 2f7c9e1b4d63
+Revises: 5d8a2c4f7e19
+Create Date: 2026-10-18 22:58:31.226470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7c9e1b4d63'
+down_revision = '5d8a2c4f7e19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), nullable=True))
+    # Numéros initiaux dans l'ordre de l'ancien curseur
+    op.execute(
+        "UPDATE product SET change_seq = (SELECT position FROM ("
+        "SELECT id, ROW_NUMBER() OVER (ORDER BY last_modified, id) AS position FROM product"
+        ") AS numbered WHERE numbered.id = product.id)"
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.alter_column('change_seq', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_index('ix_product_tenant_last_modified_id')
+        batch_op.create_index('ix_product_tenant_change_seq_id', ['tenant', 'change_seq', 'id'], unique=False)
+        batch_op.create_index('ix_product_change_seq', ['change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_change_seq')
+        batch_op.drop_index('ix_product_tenant_change_seq_id')
+        batch_op.create_index('ix_product_tenant_last_modified_id', ['tenant', 'last_modified', 'id'], unique=False)
+        batch_op.drop_column('change_seq')
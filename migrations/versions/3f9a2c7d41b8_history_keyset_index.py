@@ -0,0 +1,26 @@
+"""Index (timestamp, id) for history keyset pagination
+
+Revision ID: 3f9a2c7d41b8
+Revises: d74cfc5560ee
+Create Date: 2026-10-18 09:12:44.381205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c7d41b8'
+down_revision = 'd74cfc5560ee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.create_index('ix_product_history_timestamp_id', ['timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_history_timestamp_id')
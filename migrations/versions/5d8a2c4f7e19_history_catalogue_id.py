@@ -0,0 +1,30 @@
+"""Catalogue product on product_history, to name products after their deletion
+
+Revision ID: 5d8a2c4f7e19
+Revises: 9b3e6f2a1c58
+Create Date: 2026-10-18 22:15:48.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a2c4f7e19'
+down_revision = '9b3e6f2a1c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('catalogue_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE product_history SET catalogue_id = "
+        "(SELECT catalogue_id FROM product WHERE product.id = product_history.product_id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_column('catalogue_id')
@@ -0,0 +1,52 @@
+"""Unique (name, location) on product and product_history lookup index
+
+Revision ID: 8c1e5b0a9d27
+Revises: 3f9a2c7d41b8
+Create Date: 2026-10-18 11:02:17.513846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5b0a9d27'
+down_revision = '3f9a2c7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fusionner les doublons (nom, emplacement) créés par les anciennes versions :
+    # le produit d'ID le plus petit est conservé avec la somme des quantités et
+    # récupère l'historique des doublons.
+    op.execute("""
+        UPDATE product_history SET product_id = (
+            SELECT MIN(p2.id) FROM product p1
+            JOIN product p2 ON p2.name = p1.name AND p2.location = p1.location
+            WHERE p1.id = product_history.product_id
+        )
+        WHERE product_id NOT IN (SELECT MIN(id) FROM product GROUP BY name, location)
+    """)
+    op.execute("""
+        UPDATE product SET quantity = (
+            SELECT SUM(COALESCE(p2.quantity, 0)) FROM product p2
+            WHERE p2.name = product.name AND p2.location = product.location
+        )
+        WHERE id IN (SELECT MIN(id) FROM product GROUP BY name, location HAVING COUNT(*) > 1)
+    """)
+    op.execute("DELETE FROM product WHERE id NOT IN (SELECT MIN(id) FROM product GROUP BY name, location)")
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_name_location', ['name', 'location'], unique=True)
+
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.create_index('ix_product_history_product_id_timestamp', ['product_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_history_product_id_timestamp')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_name_location')
@@ -0,0 +1,33 @@
+"""Drop the product foreign key of product_history so history outlives deleted products
+
+Revision ID: 9b3e6f2a1c58
+Revises: c7d2e5a93b14
+Create Date: 2026-10-18 21:40:07.512946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e6f2a1c58'
+down_revision = 'c7d2e5a93b14'
+branch_labels = None
+depends_on = None
+
+# La clé étrangère de la migration initiale n'a pas de nom : la convention
+# lui en donne un pour pouvoir la supprimer
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def upgrade():
+    with op.batch_alter_table('product_history', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('fk_product_history_product_id_product', type_='foreignkey')
+
+
+def downgrade():
+    # Les lignes des produits supprimés ne satisferaient plus la contrainte
+    op.execute("DELETE FROM product_history WHERE product_id NOT IN (SELECT id FROM product)")
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.create_foreign_key('fk_product_history_product_id_product', 'product',
+                                    ['product_id'], ['id'], ondelete='CASCADE')
@@ -0,0 +1,112 @@
+"""Catalogue tables; product references the catalogue by id
+
+Revision ID: a4e8c1f7b923
+Revises: f3b9d2e6a871
+Create Date: 2026-10-18 18:03:27.551094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e8c1f7b923'
+down_revision = 'f3b9d2e6a871'
+branch_labels = None
+depends_on = None
+
+# Catalogue au moment de la migration
+CATALOGUE = [
+    ('Lignes à sang', ['PHYSIDIA LIGNES A SANG A-V PHYSILINE (1/RA)']),
+    ('K7 Ergo Flow', ['PHYSIDIA CASSETTE dialysat PHYSI.FLOW. ERGO (1 pour 2 RA soit 3/semaine)']),
+    ('K7 FLOW', ['PHYSIDIA CASSETTE dialysat PHYSI.FLOW : avoir toujours 5 unités en stock']),
+    ('Dialyseurs', ['DIALYSEUR FX80 (1/RA)']),
+    ('Dialysats', ['PHYSIDIA DIALYSAT K1 5L/poche (5 poches/RA)']),
+    ('Sodium', ['SODIUM CHL.0.9% emoluer 2 litres (1/RA)']),
+    ('Chlorexydine', []),
+    ('Aiguilles à fistules', ['AIG.PLUME V16G-R20-R (Fresenius F00012286) (2/RA)']),
+    ('Rallonges aiguilles', ['RACCORD FISTULE LG200 (Hémodia) ( 2/RA)']),
+    ('Kits de ponctions', ['SET DIALYSE FISTULE medium 7/8 (1/RA)']),
+    ('Tuyau extentions', ['PHYSIDIA LIGNE EXTENSION 3m (2/RA)']),
+    ('Raccords Y', ['RACCORD Y pour UNIPONCTURE (1/RA)']),
+    ('Seringues 20 ml', ['SERINGUE 20ML', 'SERINGUE 20', 'SERINGUES 20']),
+    ('Enoxaparine', ['ENOXAPARINE 2 000 UI/0,2 ml seringue (1/RA)']),
+    ('Seringues 10 ml', ['SERINGUE 10ML', 'SERINGUE 10', 'SERINGUES 10']),
+]
+
+
+def upgrade():
+    catalogue_product = op.create_table('catalogue_product',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    catalogue_alias = op.create_table('catalogue_alias',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('catalogue_id', sa.Integer(), nullable=False),
+    sa.Column('label', sa.String(length=255), nullable=False),
+    sa.ForeignKeyConstraint(['catalogue_id'], ['catalogue_product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('catalogue_alias', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_catalogue_alias_catalogue_id'), ['catalogue_id'], unique=False)
+
+    catalogue_state = op.create_table('catalogue_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    op.bulk_insert(catalogue_product, [
+        {'id': position + 1, 'name': name, 'position': position}
+        for position, (name, _) in enumerate(CATALOGUE)
+    ])
+    op.bulk_insert(catalogue_alias, [
+        {'catalogue_id': position + 1, 'label': label}
+        for position, (_, labels) in enumerate(CATALOGUE) for label in labels
+    ])
+    op.bulk_insert(catalogue_state, [{'id': 1, 'version': 1}])
+
+    # Les noms hors catalogue déjà présents dans l'inventaire y sont ajoutés
+    op.execute(
+        "INSERT INTO catalogue_product (name, position) "
+        "SELECT DISTINCT name, 1000 FROM product "
+        "WHERE name NOT IN (SELECT name FROM catalogue_product)"
+    )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('catalogue_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE product SET catalogue_id = "
+        "(SELECT id FROM catalogue_product WHERE catalogue_product.name = product.name)"
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_tenant_name_location')
+        batch_op.alter_column('catalogue_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_product_catalogue_id', 'catalogue_product', ['catalogue_id'], ['id'])
+        batch_op.create_index('ix_product_tenant_catalogue_location', ['tenant', 'catalogue_id', 'location'], unique=True)
+        batch_op.drop_column('name')
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name', sa.String(length=100), nullable=True))
+    op.execute(
+        "UPDATE product SET name = "
+        "(SELECT name FROM catalogue_product WHERE catalogue_product.id = product.catalogue_id)"
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_tenant_catalogue_location')
+        batch_op.drop_constraint('fk_product_catalogue_id', type_='foreignkey')
+        batch_op.drop_column('catalogue_id')
+        batch_op.alter_column('name', existing_type=sa.String(length=100), nullable=False)
+        batch_op.create_index('ix_product_tenant_name_location', ['tenant', 'name', 'location'], unique=True)
+
+    op.drop_table('catalogue_state')
+    with op.batch_alter_table('catalogue_alias', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_catalogue_alias_catalogue_id'))
+
+    op.drop_table('catalogue_alias')
+    op.drop_table('catalogue_product')
@@ -0,0 +1,58 @@
+"""Compact history storage: inventory snapshots and history deltas
+
+Revision ID: b62d4f18e3a5
+Revises: 8c1e5b0a9d27
+Create Date: 2026-10-18 13:45:03.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b62d4f18e3a5'
+down_revision = '8c1e5b0a9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('inventory_snapshot', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inventory_snapshot_timestamp'), ['timestamp'], unique=True)
+
+    op.create_table('inventory_snapshot_item',
+    sa.Column('snapshot_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('location_code', sa.SmallInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['snapshot_id'], ['inventory_snapshot.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('snapshot_id', 'product_id')
+    )
+    op.create_table('history_delta',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('action_code', sa.SmallInteger(), nullable=False),
+    sa.Column('quantity_delta', sa.Integer(), nullable=False),
+    sa.Column('location_code', sa.SmallInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('history_delta', schema=None) as batch_op:
+        batch_op.create_index('ix_history_delta_timestamp_id', ['timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('history_delta', schema=None) as batch_op:
+        batch_op.drop_index('ix_history_delta_timestamp_id')
+
+    op.drop_table('history_delta')
+    op.drop_table('inventory_snapshot_item')
+    with op.batch_alter_table('inventory_snapshot', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inventory_snapshot_timestamp'))
+
+    op.drop_table('inventory_snapshot')
@@ -0,0 +1,99 @@
+"""Locations table; product and history reference locations by small integer code
+
+Revision ID: c7d2e5a93b14
+Revises: a4e8c1f7b923
+Create Date: 2026-10-18 19:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e5a93b14'
+down_revision = 'a4e8c1f7b923'
+branch_labels = None
+depends_on = None
+
+# Mêmes codes que l'historique compact (history_delta, inventory_snapshot_item)
+LOCATIONS = [
+    (1, 'box', 'Box'),
+    (2, 'apartment', 'Appartement'),
+]
+
+
+def upgrade():
+    location = op.create_table('location',
+    sa.Column('id', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('label', sa.String(length=100), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(location, [
+        {'id': code, 'name': name, 'label': label, 'position': code} for code, name, label in LOCATIONS
+    ])
+    # Les emplacements inconnus déjà présents en base y sont ajoutés à la suite
+    op.execute(
+        "INSERT INTO location (id, name, label, position) "
+        "SELECT 2 + ROW_NUMBER() OVER (ORDER BY name), name, name, 2 + ROW_NUMBER() OVER (ORDER BY name) FROM ("
+        "SELECT location AS name FROM product UNION "
+        "SELECT old_location FROM product_history UNION "
+        "SELECT new_location FROM product_history"
+        ") WHERE name IS NOT NULL AND name NOT IN (SELECT name FROM location)"
+    )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('location_code', sa.SmallInteger(), nullable=True))
+    op.execute(
+        "UPDATE product SET location_code = "
+        "(SELECT id FROM location WHERE location.name = product.location)"
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_tenant_catalogue_location')
+        batch_op.alter_column('location_code', existing_type=sa.SmallInteger(), nullable=False)
+        batch_op.create_foreign_key('fk_product_location_code', 'location', ['location_code'], ['id'])
+        batch_op.create_index('ix_product_tenant_catalogue_location', ['tenant', 'catalogue_id', 'location_code'], unique=True)
+        batch_op.drop_column('location')
+
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('old_location_code', sa.SmallInteger(), nullable=True))
+        batch_op.add_column(sa.Column('new_location_code', sa.SmallInteger(), nullable=True))
+    op.execute(
+        "UPDATE product_history SET "
+        "old_location_code = (SELECT id FROM location WHERE location.name = product_history.old_location), "
+        "new_location_code = (SELECT id FROM location WHERE location.name = product_history.new_location)"
+    )
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_column('old_location')
+        batch_op.drop_column('new_location')
+
+
+def downgrade():
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('old_location', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('new_location', sa.String(length=50), nullable=True))
+    op.execute(
+        "UPDATE product_history SET "
+        "old_location = (SELECT name FROM location WHERE location.id = product_history.old_location_code), "
+        "new_location = (SELECT name FROM location WHERE location.id = product_history.new_location_code)"
+    )
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_column('old_location_code')
+        batch_op.drop_column('new_location_code')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('location', sa.String(length=50), nullable=True))
+    op.execute(
+        "UPDATE product SET location = "
+        "(SELECT name FROM location WHERE location.id = product.location_code)"
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_tenant_catalogue_location')
+        batch_op.drop_constraint('fk_product_location_code', type_='foreignkey')
+        batch_op.drop_column('location_code')
+        batch_op.alter_column('location', existing_type=sa.String(length=50), nullable=False)
+        batch_op.create_index('ix_product_tenant_catalogue_location', ['tenant', 'catalogue_id', 'location'], unique=True)
+
+    op.drop_table('location')
@@ -0,0 +1,26 @@
+"""Index (last_modified, id) on product for incremental sync
+
+Revision ID: d5a7c93e2f10
+Revises: b62d4f18e3a5
+Create Date: 2026-10-18 15:20:41.166052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a7c93e2f10'
+down_revision = 'b62d4f18e3a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_last_modified_id', ['last_modified', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_last_modified_id')
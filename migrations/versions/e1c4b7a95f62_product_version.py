@@ -0,0 +1,26 @@
+"""Version column on product for optimistic concurrency
+
+Revision ID: e1c4b7a95f62
+Revises: d5a7c93e2f10
+Create Date: 2026-10-18 16:05:12.418337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1c4b7a95f62'
+down_revision = 'd5a7c93e2f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('version')
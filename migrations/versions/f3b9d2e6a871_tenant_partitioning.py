@@ -0,0 +1,69 @@
+"""Tenant column and tenant-led indexes on inventory tables
+
+Revision ID: f3b9d2e6a871
+Revises: e1c4b7a95f62
+Create Date: 2026-10-18 17:12:48.903215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d2e6a871'
+down_revision = 'e1c4b7a95f62'
+branch_labels = None
+depends_on = None
+
+
+def _tenant_column():
+    # Les lignes existantes appartiennent au tenant par défaut
+    return sa.Column('tenant', sa.String(length=64), server_default='default', nullable=False)
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(_tenant_column())
+        batch_op.drop_index('ix_product_name_location')
+        batch_op.drop_index('ix_product_last_modified_id')
+        batch_op.create_index('ix_product_tenant_name_location', ['tenant', 'name', 'location'], unique=True)
+        batch_op.create_index('ix_product_tenant_last_modified_id', ['tenant', 'last_modified', 'id'], unique=False)
+
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.add_column(_tenant_column())
+        batch_op.drop_index('ix_product_history_timestamp_id')
+        batch_op.create_index('ix_product_history_tenant_timestamp_id', ['tenant', 'timestamp', 'id'], unique=False)
+
+    with op.batch_alter_table('inventory_snapshot', schema=None) as batch_op:
+        batch_op.add_column(_tenant_column())
+        batch_op.drop_index('ix_inventory_snapshot_timestamp')
+        batch_op.create_index('ix_inventory_snapshot_tenant_timestamp', ['tenant', 'timestamp'], unique=True)
+
+    with op.batch_alter_table('history_delta', schema=None) as batch_op:
+        batch_op.add_column(_tenant_column())
+        batch_op.drop_index('ix_history_delta_timestamp_id')
+        batch_op.create_index('ix_history_delta_tenant_timestamp_id', ['tenant', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('history_delta', schema=None) as batch_op:
+        batch_op.drop_index('ix_history_delta_tenant_timestamp_id')
+        batch_op.create_index('ix_history_delta_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.drop_column('tenant')
+
+    with op.batch_alter_table('inventory_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_snapshot_tenant_timestamp')
+        batch_op.create_index('ix_inventory_snapshot_timestamp', ['timestamp'], unique=True)
+        batch_op.drop_column('tenant')
+
+    with op.batch_alter_table('product_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_history_tenant_timestamp_id')
+        batch_op.create_index('ix_product_history_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.drop_column('tenant')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_tenant_last_modified_id')
+        batch_op.drop_index('ix_product_tenant_name_location')
+        batch_op.create_index('ix_product_last_modified_id', ['last_modified', 'id'], unique=False)
+        batch_op.create_index('ix_product_name_location', ['name', 'location'], unique=True)
+        batch_op.drop_column('tenant')
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import create_app, db
+from app.analytics import (
+    UsageRule, daily_consumption, forecast, parse_usage_rule, rolling_rates, usage_rules
+)
+from app.models import Product, ProductHistory
+from config import TestingConfig
+
+END = datetime(2025, 3, 1)
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def test_parse_usage_rule():
+    assert parse_usage_rule('DIALYSEUR FX80 (1/RA)') == UsageRule(1.0, 0)
+    assert parse_usage_rule('RACCORD FISTULE LG200 (Hémodia) ( 2/RA)') == UsageRule(2.0, 0)
+    assert parse_usage_rule('PHYSIDIA DIALYSAT K1 5L/poche (5 poches/RA)') == UsageRule(5.0, 0)
+    assert parse_usage_rule('PHYSIDIA CASSETTE dialysat PHYSI.FLOW. ERGO (1 pour 2 RA soit 3/semaine)') == UsageRule(0.5, 0)
+    assert parse_usage_rule('PHYSIDIA CASSETTE dialysat PHYSI.FLOW : avoir toujours 5 unités en stock') == UsageRule(None, 5)
+    assert parse_usage_rule('SERINGUE 20ML') == UsageRule(None, 0)
+
+def test_usage_rules():
+    rules = usage_rules()
+    assert rules['Dialysats'].per_session == 5
+    assert rules['K7 FLOW'].min_stock == 5
+    assert rules['Seringues 20 ml'] == UsageRule()
+
+def test_rolling_rates():
+    matrix = np.array([[1, 2, 3, 4]])
+    assert rolling_rates(matrix, 2).tolist() == [[0.5, 1.5, 2.5, 3.5]]
+
+@pytest.fixture
+def consumption(app):
+    product = Product(id=1, name='Dialyseurs', quantity=20, location='box')
+    db.session.add(product)
+    catalogue_id = product.catalogue_id
+    for day in range(28):
+        timestamp = END - timedelta(days=28 - day) + timedelta(hours=10)
+        db.session.add(ProductHistory(product_id=1, catalogue_id=catalogue_id, timestamp=timestamp,
+                                      action='update', old_quantity=50 - day, new_quantity=49 - day))
+    # Livraison et remise à zéro : ne sont pas des consommations
+    db.session.add(ProductHistory(product_id=1, catalogue_id=catalogue_id, timestamp=END - timedelta(days=1),
+                                  action='update', old_quantity=10, new_quantity=30))
+    db.session.add(ProductHistory(product_id=1, catalogue_id=catalogue_id, timestamp=END - timedelta(days=1),
+                                  action='reset', old_quantity=30, new_quantity=0))
+    db.session.commit()
+
+def test_daily_consumption(consumption):
+    names, matrix = daily_consumption(28, END)
+    row = matrix[names.index('Dialyseurs')]
+    assert row.tolist() == [1] * 28
+    assert matrix.sum() == 28
+
+def test_daily_consumption_keeps_deleted_products(consumption):
+    db.session.delete(db.session.get(Product, 1))
+    db.session.commit()
+    names, matrix = daily_consumption(28, END)
+    assert matrix[names.index('Dialyseurs')].tolist() == [1] * 28
+
+def test_daily_consumption_ignores_transfers(app):
+    box = Product(name='Dialyseurs', quantity=5, location='box')
+    apartment = Product(name='Dialyseurs', quantity=3, location='apartment')
+    db.session.add_all([box, apartment])
+    db.session.commit()
+    box_id, apartment_id = box.id, apartment.id
+    client = app.test_client()
+
+    # Transfert complet vers un emplacement qui contient déjà le produit, puis retour
+    client.put(f'/api/products/{box_id}', json={'quantity': 5, 'location': 'apartment'})
+    client.patch('/api/products', json=[{'id': apartment_id, 'quantity': 8, 'location': 'box'}])
+    names, matrix = daily_consumption(1, datetime.utcnow() + timedelta(minutes=1))
+    assert matrix.sum() == 0
+
+    # Seules 6 des 8 unités arrivent à destination : 2 sont consommées
+    client.put(f'/api/products/{box_id}', json={'quantity': 6, 'location': 'apartment'})
+    names, matrix = daily_consumption(1, datetime.utcnow() + timedelta(minutes=1))
+    assert matrix[names.index('Dialyseurs')].tolist() == [2]
+
+def test_forecast(consumption):
+    result = forecast(window_days=28, coverage_days=28, sessions_per_week=6, end=END)
+
+    dialyseurs = result['Dialyseurs']
+    assert dialyseurs['rate_source'] == 'history'
+    assert dialyseurs['daily_rate'] == 1.0
+    assert dialyseurs['stock'] == 20
+    assert dialyseurs['days_until_stockout'] == 20.0
+    assert dialyseurs['suggested_order'] == 8
+
+    # Sans historique : règle d'usage (5 poches par séance, 6 séances par semaine)
+    dialysats = result['Dialysats']
+    assert dialysats['rate_source'] == 'rule'
+    assert dialysats['suggested_order'] == 120
+    assert dialysats['days_until_stockout'] == 0.0
+
+    # Stock minimal imposé, sans consommation connue
+    assert result['K7 FLOW']['suggested_order'] == 5
+    assert result['Seringues 20 ml']['rate_source'] is None
+
+def test_forecast_route(app, consumption):
+    response = app.test_client().get('/api/forecast')
+    assert response.status_code == 200
+    assert 'Dialyseurs' in response.get_json()
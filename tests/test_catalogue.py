@@ -0,0 +1,173 @@
+import json
+
+import pytest
+from sqlalchemy import insert, update
+
+from app import create_app, db
+from app.catalogue import get_catalogue, save_location, save_product
+from app.models import (
+    AVAILABLE_PRODUCTS, PRODUCT_NAME_MAPPING, CatalogueProduct, CatalogueState, Product, ProductHistory
+)
+from app.totals import compute_product_totals, fetch_totals
+from config import TestingConfig
+
+@pytest.fixture
+def app():
+    class Config(TestingConfig):
+        CATALOGUE_CHECK_INTERVAL = 0
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_initial_catalogue(app):
+    catalogue = get_catalogue()
+    assert list(catalogue.names) == AVAILABLE_PRODUCTS
+    assert catalogue.mapping == PRODUCT_NAME_MAPPING
+    assert catalogue.name_of(catalogue.id_of('Sodium')) == 'Sodium'
+    # Même version : le catalogue en cache est réutilisé
+    assert get_catalogue() is catalogue
+
+def test_product_name_uses_catalogue_id(app):
+    product = Product(name='Sodium', quantity=2, location='box')
+    db.session.add(product)
+    db.session.commit()
+    assert product.catalogue_id == get_catalogue().id_of('Sodium')
+    assert product.name == 'Sodium'
+
+    # Les filtres sur le nom comparent des entiers
+    query = Product.query.filter_by(name='Sodium')
+    assert 'catalogue_id' in str(query.statement)
+    assert query.one() is product
+    assert Product.query.filter(Product.name.in_(['Sodium', 'Inconnu'])).count() == 1
+
+    with pytest.raises(ValueError):
+        Product(name='Inconnu', quantity=1, location='box')
+
+def test_save_product_bumps_version(app):
+    version = get_catalogue().version
+    _, created = save_product('Compresses', ['COMPRESSES STERILES'])
+    assert created
+    catalogue = get_catalogue()
+    assert catalogue.version == version + 1
+    assert catalogue.names[-1] == 'Compresses'
+    assert catalogue.mapping['Compresses'] == ['COMPRESSES STERILES']
+
+    _, created = save_product('Compresses', ['COMPRESSES'])
+    assert not created
+    assert get_catalogue().mapping['Compresses'] == ['COMPRESSES']
+    with pytest.raises(ValueError):
+        save_product('  ')
+
+def test_catalogue_edited_by_another_worker(app):
+    catalogue = get_catalogue()
+    # Modification directe en base, comme depuis un autre processus
+    db.session.execute(insert(CatalogueProduct).values(name='Compresses', position=99))
+    db.session.execute(update(CatalogueState).values(version=CatalogueState.version + 1))
+    db.session.commit()
+    assert 'Compresses' in get_catalogue().names
+    assert get_catalogue() is not catalogue
+
+def test_catalogue_routes(client):
+    client.get('/')
+    response = client.post('/api/catalogue', json={'name': 'Compresses', 'aliases': ['COMPRESSES']})
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['products'][-1] == {'id': data['products'][-1]['id'], 'name': 'Compresses', 'aliases': ['COMPRESSES']}
+
+    # Le nouveau produit apparaît dans le formulaire et dans l'inventaire
+    response = client.get('/')
+    assert '<option value="Compresses">Compresses</option>'.encode() in response.data
+    assert Product.query.filter_by(name='Compresses').count() == len(get_catalogue().locations)
+
+    assert json.loads(client.get('/api/catalogue').data)['version'] == data['version']
+    assert client.post('/api/catalogue', json={'name': 'X', 'aliases': 'X'}).status_code == 400
+
+def test_initial_locations(app):
+    catalogue = get_catalogue()
+    assert catalogue.locations == ('box', 'apartment')
+    # Codes de l'historique compact
+    assert catalogue.location_codes == {'box': 1, 'apartment': 2}
+    assert catalogue.location_labels['apartment'] == 'Appartement'
+
+def test_location_stored_as_code(app):
+    product = Product(name='Sodium', quantity=2, location='apartment')
+    db.session.add(product)
+    db.session.flush()
+    product.location = 'box'
+    product.log_change('update', {'quantity': 2, 'location': 'apartment'})
+    db.session.commit()
+
+    assert product.location_code == 1
+    history = ProductHistory.query.one()
+    assert (history.old_location_code, history.new_location_code) == (2, 1)
+    assert history.to_dict()['old_location'] == 'apartment'
+    # Les requêtes par nom comparent les codes, sans jointure
+    query = Product.query.filter_by(location='box')
+    assert query.one() is product
+    assert 'location_code' in str(query.statement)
+    assert ProductHistory.query.filter(ProductHistory.old_location == 'apartment').count() == 1
+
+    with pytest.raises(ValueError, match='Location must be one of: box, apartment'):
+        product.location = 'cave'
+
+def test_add_location(app):
+    db.session.add(Product(name='Sodium', quantity=2, location='box'))
+    db.session.commit()
+    version = get_catalogue().version
+
+    location, created = save_location('cave', 'Cave')
+    assert created and location.id == 3
+    catalogue = get_catalogue()
+    assert catalogue.version == version + 1
+    assert catalogue.locations == ('box', 'apartment', 'cave')
+
+    product = Product(name='Sodium', quantity=5, location='cave')
+    db.session.add(product)
+    db.session.commit()
+    # Le pivot des totaux a une colonne par emplacement
+    assert fetch_totals() == [('Sodium', 2, 0, 5, 7)]
+    assert compute_product_totals()['Sodium'] == {'box': 2, 'apartment': 0, 'cave': 5, 'total': 7}
+    assert compute_product_totals()['Dialyseurs'] == {'box': 0, 'apartment': 0, 'cave': 0, 'total': 0}
+
+    # Modifier le libellé ne change pas le code
+    location, created = save_location('cave', 'Cave à vin')
+    assert not created and location.id == 3
+    assert get_catalogue().location_labels['cave'] == 'Cave à vin'
+
+@pytest.mark.parametrize('name', ['total', 'all', 'cave à vin', 'box-2', '2e_etage'])
+def test_add_location_rejects_invalid_names(app, name):
+    version = get_catalogue().version
+    with pytest.raises(ValueError, match="Nom d'emplacement"):
+        save_location(name)
+    assert get_catalogue().version == version
+
+def test_location_routes(client):
+    client.get('/')
+    response = client.post('/api/locations', json={'name': 'cave', 'label': 'Cave'})
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['locations'][-1] == {'code': 3, 'name': 'cave', 'label': 'Cave'}
+    assert json.loads(client.get('/api/locations').data) == data
+
+    # Le nouvel emplacement apparaît dans la page et dans l'inventaire
+    response = client.get('/')
+    assert b'<option value="cave">Cave</option>' in response.data
+    assert b'data-total="cave"' in response.data
+    assert Product.query.filter_by(location='cave').count() == len(AVAILABLE_PRODUCTS)
+
+    product = Product.query.filter_by(location='cave').first()
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 4, 'location': 'cave'})
+    assert response.status_code == 200
+    assert ProductHistory.query.filter_by(product_id=product.id, action='update').one().new_location == 'cave'
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 4, 'location': 'grenier'})
+    assert response.status_code == 400
+    assert client.post('/api/locations', json={}).status_code == 400
+
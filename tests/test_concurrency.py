@@ -0,0 +1,70 @@
+import json
+import threading
+
+import pytest
+
+from app import create_app, db
+from app.models import Product, ProductHistory
+from config import TestingConfig
+
+THREADS = 8
+INCREMENTS = 15
+
+@pytest.fixture
+def app(tmp_path):
+    class Config(TestingConfig):
+        # Base fichier : chaque thread a sa propre connexion
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'busy_timeout': 10000}
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_concurrent_updates_lose_nothing(app):
+    products = [Product(name='Sodium', quantity=0, location='box'),
+                Product(name='Dialyseurs', quantity=0, location='box')]
+    db.session.add_all(products)
+    db.session.commit()
+    ids = [product.id for product in products]
+
+    conflicts = []
+    errors = []
+
+    def worker(index):
+        client = app.test_client()
+        product_id = ids[index % len(ids)]
+        done = 0
+        try:
+            while done < INCREMENTS:
+                # Lecture puis écriture conditionnelle ; en cas de conflit, on relit
+                current = next(p for p in json.loads(client.get('/api/products/changes').data)['products']
+                               if p['id'] == product_id)
+                response = client.put(f'/api/products/{product_id}',
+                                      json={'quantity': current['quantity'] + 1, 'location': 'box'},
+                                      headers={'If-Match': f'"{current["version"]}"'})
+                if response.status_code == 409:
+                    conflicts.append(product_id)
+                    continue
+                assert response.status_code == 200, response.data
+                done += 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    expected = THREADS // len(ids) * INCREMENTS
+    db.session.expire_all()
+    for product_id in ids:
+        product = db.session.get(Product, product_id)
+        assert product.quantity == expected
+        assert product.version == 1 + expected
+        assert ProductHistory.query.filter_by(product_id=product_id, action='update').count() == expected
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db
+from config import DevelopmentConfig, ProductionConfig, TestingConfig, get_config
+
+def test_get_config(monkeypatch):
+    monkeypatch.delenv('APP_CONFIG', raising=False)
+    assert get_config() is DevelopmentConfig
+    monkeypatch.setenv('APP_CONFIG', 'production')
+    assert get_config() is ProductionConfig
+    assert get_config('testing') is TestingConfig
+    with pytest.raises(ValueError):
+        get_config('staging')
+
+def test_production_sqlite_pragmas(tmp_path):
+    class Config(ProductionConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'prod.db')
+
+    app = create_app(Config)
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert connection.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+            assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert db.engine.pool.size() == ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS['pool_size']
+        db.engine.dispose()
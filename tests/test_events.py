@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+from app.events import FileBroker, LocalBroker, format_sse
+
+def test_local_broker_fan_out():
+    broker = LocalBroker()
+    first, second = broker.subscribe(), broker.subscribe()
+    broker.publish({'type': 'delete', 'data': {'id': 1}})
+    assert first.get(timeout=1) == {'type': 'delete', 'data': {'id': 1}}
+    assert second.get(timeout=1) == {'type': 'delete', 'data': {'id': 1}}
+
+    second.close()
+    broker.publish({'type': 'reset', 'data': {'location': None}})
+    assert first.get(timeout=1)['type'] == 'reset'
+    assert second.get(timeout=0.05) is None
+
+def test_slow_subscriber_drops_oldest_events():
+    broker = LocalBroker()
+    subscription = broker.subscribe()
+    for index in range(150):
+        broker.publish({'type': 'delete', 'data': {'id': index}})
+    assert subscription.get(timeout=1)['data']['id'] == 50
+
+def test_file_broker_between_workers(tmp_path):
+    path = str(tmp_path / 'events.log')
+    # Deux brokers sur le même fichier, comme deux workers
+    publisher = FileBroker(path, poll_interval=0.01)
+    listener = FileBroker(path, poll_interval=0.01)
+    try:
+        subscription = listener.subscribe()
+        publisher.publish({'type': 'delete', 'data': {'id': 3}})
+        assert subscription.get(timeout=2) == {'type': 'delete', 'data': {'id': 3}}
+    finally:
+        publisher.close()
+        listener.close()
+
+    # Un nouveau worker ne rejoue pas les événements déjà écrits
+    late = FileBroker(path, poll_interval=0.01)
+    try:
+        subscription = late.subscribe()
+        time.sleep(0.05)
+        assert subscription.get(timeout=0.05) is None
+    finally:
+        late.close()
+
+def test_subscription_limited_to_tenant():
+    broker = LocalBroker()
+    first, second, every = broker.subscribe('a'), broker.subscribe('b'), broker.subscribe()
+    broker.publish({'tenant': 'a', 'type': 'delete', 'data': {'id': 1}})
+    assert first.get(timeout=1)['tenant'] == 'a'
+    assert every.get(timeout=1)['tenant'] == 'a'
+    assert second.get(timeout=0.05) is None
+
+    first.close()
+    broker.publish({'tenant': 'a', 'type': 'reset', 'data': {'location': None}})
+    assert every.get(timeout=1)['type'] == 'reset'
+
+def test_file_broker_skips_malformed_lines(tmp_path):
+    path = str(tmp_path / 'events.log')
+    broker = FileBroker(path, poll_interval=0.01)
+    try:
+        subscription = broker.subscribe()
+        with open(path, 'a') as events:
+            events.write('{pas du json\n')
+        broker.publish({'type': 'delete', 'data': {'id': 4}})
+        # Le lecteur survit à la ligne illisible
+        assert subscription.get(timeout=2) == {'type': 'delete', 'data': {'id': 4}}
+    finally:
+        broker.close()
+
+def test_file_broker_rotation(tmp_path):
+    path = str(tmp_path / 'events.log')
+    publisher = FileBroker(path, poll_interval=0.01, max_bytes=200)
+    listener = FileBroker(path, poll_interval=0.01)
+    try:
+        subscription = listener.subscribe()
+        for event_id in range(20):
+            publisher.publish({'type': 'delete', 'data': {'id': event_id}})
+            assert subscription.get(timeout=2)['data']['id'] == event_id
+        assert os.path.getsize(path) <= 200
+        assert os.path.exists(path + '.1')
+    finally:
+        publisher.close()
+        listener.close()
+
+def test_format_sse():
+    event = {'type': 'products', 'data': {'products': []}}
+    assert format_sse(event) == 'event: products\ndata: {"products": []}\n\n'
+    assert json.loads(format_sse(event).split('data: ')[1]) == {'products': []}
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from app.history_store import compact_history, inventory_as_of, materialize_snapshot
+from app.models import HistoryDelta, InventorySnapshot, Product, ProductHistory
+from config import TestingConfig
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def add_history(product_id, day, action, old, new, old_location, new_location):
+    db.session.add(ProductHistory(
+        product_id=product_id, timestamp=datetime(2025, 1, day), action=action,
+        old_quantity=old, new_quantity=new, old_location=old_location, new_location=new_location
+    ))
+
+@pytest.fixture
+def history(app):
+    db.session.add_all([
+        Product(id=1, name='Sodium', quantity=0, location='apartment'),
+        Product(id=2, name='Dialyseurs', quantity=4, location='box'),
+    ])
+    add_history(1, 1, 'create', None, 10, None, 'box')
+    add_history(2, 1, 'create', None, 4, None, 'box')
+    add_history(1, 3, 'update', 10, 6, 'box', 'box')
+    add_history(1, 5, 'update', 6, 6, 'box', 'apartment')
+    add_history(1, 8, 'reset', 6, 0, None, 'apartment')
+    db.session.commit()
+
+def test_inventory_as_of_full_history(history):
+    assert inventory_as_of(datetime(2025, 1, 2)) == {
+        1: {'quantity': 10, 'location': 'box'},
+        2: {'quantity': 4, 'location': 'box'},
+    }
+    assert inventory_as_of(datetime(2025, 1, 6))[1] == {'quantity': 6, 'location': 'apartment'}
+    assert inventory_as_of(datetime(2024, 12, 31)) == {}
+
+def test_compact_history(history):
+    expected = {day: inventory_as_of(datetime(2025, 1, day)) for day in range(1, 10)}
+
+    assert compact_history(datetime(2025, 1, 4)) == 3
+    assert ProductHistory.query.count() == 2
+    assert HistoryDelta.query.count() == 3
+    assert InventorySnapshot.query.count() == 1
+
+    # La reconstruction donne le même résultat avant et après compactage
+    for day, state in expected.items():
+        assert inventory_as_of(datetime(2025, 1, day)) == state
+
+    assert compact_history(datetime(2025, 1, 9)) == 2
+    assert ProductHistory.query.count() == 0
+    for day, state in expected.items():
+        assert inventory_as_of(datetime(2025, 1, day)) == state
+
+    with pytest.raises(ValueError):
+        compact_history(datetime(2025, 1, 9))
+
+def test_compact_history_after_daily_snapshot(history):
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    materialize_snapshot(today)
+    expected = inventory_as_of(today)
+
+    assert compact_history(datetime(2025, 1, 4)) == 3
+    assert inventory_as_of(today) == expected
+    assert inventory_as_of(datetime(2025, 1, 6))[1] == {'quantity': 6, 'location': 'apartment'}
+
+def test_compact_history_refuses_snapshot_in_range(history):
+    materialize_snapshot(datetime(2025, 1, 2))
+    with pytest.raises(ValueError, match='2025-01-02'):
+        compact_history(datetime(2025, 1, 4))
+    assert ProductHistory.query.count() == 5
+
+def test_compact_history_keeps_audit_period(app, history):
+    app.config['HISTORY_AUDIT_DAYS'] = 30
+    with pytest.raises(ValueError, match='HISTORY_AUDIT_DAYS'):
+        compact_history(datetime.utcnow() - timedelta(days=29))
+    assert ProductHistory.query.count() == 5
+    assert compact_history(datetime.utcnow() - timedelta(days=31)) == 5
+
+def test_materialize_snapshot(history):
+    snapshot = materialize_snapshot(datetime(2025, 1, 4))
+    assert {item.product_id: item.quantity for item in snapshot.items} == {1: 6, 2: 4}
+    assert materialize_snapshot(datetime(2025, 1, 4)) is snapshot
+
+    # Les lignes postérieures à l'instantané sont toujours prises en compte
+    assert inventory_as_of(datetime(2025, 1, 9))[1] == {'quantity': 0, 'location': 'apartment'}
+
+def test_inventory_as_of_route(app, history):
+    client = app.test_client()
+    response = client.get('/api/inventory/as-of?ts=2025-01-04T00:00:00')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['products'] == [
+        {'product_id': 1, 'name': 'Sodium', 'quantity': 6, 'location': 'box'},
+        {'product_id': 2, 'name': 'Dialyseurs', 'quantity': 4, 'location': 'box'},
+    ]
+    assert data['totals'] == {'Sodium': 6, 'Dialyseurs': 4}
+
+    assert client.get('/api/inventory/as-of').status_code == 400
+
+def test_inventory_as_of_deleted_product(app, history):
+    # Produit supprimé sans événement ni ligne d'inventaire (ancienne suppression) : ignoré
+    add_history(99, 2, 'create', None, 3, None, 'box')
+    db.session.commit()
+    client = app.test_client()
+    assert client.delete('/api/products/2').status_code == 204
+
+    before = client.get('/api/inventory/as-of?ts=2025-01-04T00:00:00').get_json()
+    assert [product['product_id'] for product in before['products']] == [1, 2]
+    assert before['totals'] == {'Sodium': 6, 'Dialyseurs': 4}
+
+    after = client.get(f'/api/inventory/as-of?ts={(datetime.utcnow() + timedelta(minutes=1)).isoformat()}')
+    data = after.get_json()
+    assert [product['product_id'] for product in data['products']] == [1]
+    assert data['totals'] == {'Sodium': 0}
+    assert client.get('/api/inventory/as-of?ts=hier').status_code == 400
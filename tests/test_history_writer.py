@@ -0,0 +1,185 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app import create_app, db
+from app.history_writer import HistoryWriter
+from app.models import Product, ProductHistory
+from config import TestingConfig
+
+@pytest.fixture
+def app(tmp_path):
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        HISTORY_WRITER_ENABLED = True
+        HISTORY_BATCH_SIZE = 10
+        HISTORY_FLUSH_INTERVAL = 0.05
+        HISTORY_JOURNAL_PATH = str(tmp_path / 'history.journal')
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        app.extensions['history_writer'].stop()
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_history_written_after_commit(app, client):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 5, 'location': 'box'})
+    product_id = Product.query.one().id
+    client.put(f'/api/products/{product_id}', json={'quantity': 7, 'location': 'box'})
+
+    writer = app.extensions['history_writer']
+    writer.flush()
+    history = ProductHistory.query.order_by(ProductHistory.id).all()
+    assert [(h.action, h.old_quantity, h.new_quantity) for h in history] == [
+        ('create', None, 5), ('update', 5, 7)
+    ]
+
+    metrics = json.loads(client.get('/api/history-writer').data)
+    assert metrics['enabled'] is True
+    assert metrics['written'] == 2
+    assert metrics['queue_depth'] == 0
+
+def test_history_discarded_on_rollback(app):
+    product = Product(name='Sodium', quantity=1, location='box')
+    db.session.add(product)
+    db.session.commit()
+
+    product.quantity = 3
+    product.log_change('update', {'quantity': 1, 'location': 'box'})
+    db.session.rollback()
+
+    app.extensions['history_writer'].flush()
+    assert ProductHistory.query.count() == 0
+
+def test_journal_recovery(app, tmp_path):
+    db.session.add(Product(id=1, name='Sodium', quantity=1, location='box'))
+    db.session.commit()
+
+    journal = tmp_path / 'recovery.journal'
+    event = {'product_id': 1, 'timestamp': '2025-01-01T10:00:00', 'action': 'update',
+             'old_quantity': 1, 'new_quantity': 2, 'old_location_code': 1, 'new_location_code': 1}
+    journal.write_text(
+        json.dumps({'seq': 1, 'event': event}) + '\n'
+        + json.dumps({'committed': [1]}) + '\n'
+        + json.dumps({'seq': 2, 'event': {**event, 'new_quantity': 3}}) + '\n'
+        + '{"seq": 3, "ev'  # Ligne tronquée
+    )
+
+    writer = HistoryWriter(db.engine, ProductHistory.__table__, journal_path=str(journal)).start()
+    writer.stop()
+
+    history = ProductHistory.query.all()
+    assert [(h.new_quantity, h.timestamp.year) for h in history] == [(3, 2025)]
+    assert journal.read_text() == ''
+
+def test_savepoint_rollback_keeps_outer_events(app):
+    product = Product(name='Sodium', quantity=1, location='box')
+    db.session.add(product)
+    db.session.commit()
+
+    product.quantity = 2
+    product.log_change('update', {'quantity': 1, 'location': 'box'})
+    with db.session.begin_nested() as savepoint:
+        product.quantity = 3
+        product.log_change('update', {'quantity': 2, 'location': 'box'})
+        savepoint.rollback()
+    db.session.commit()
+
+    app.extensions['history_writer'].flush()
+    history = ProductHistory.query.filter_by(action='update').all()
+    assert [(h.old_quantity, h.new_quantity) for h in history] == [(1, 2)]
+
+def test_released_savepoint_follows_outer_rollback(app):
+    product = Product(name='Sodium', quantity=1, location='box')
+    db.session.add(product)
+    db.session.commit()
+
+    with db.session.begin_nested():
+        product.quantity = 2
+        product.log_change('update', {'quantity': 1, 'location': 'box'})
+    db.session.rollback()
+
+    app.extensions['history_writer'].flush()
+    assert ProductHistory.query.filter_by(action='update').count() == 0
+
+def test_released_savepoint_written_with_outer_commit(app):
+    product = Product(name='Sodium', quantity=1, location='box')
+    db.session.add(product)
+    db.session.commit()
+
+    with db.session.begin_nested():
+        product.quantity = 2
+        product.log_change('update', {'quantity': 1, 'location': 'box'})
+    writer = app.extensions['history_writer']
+    writer.flush()
+    assert ProductHistory.query.filter_by(action='update').count() == 0
+    db.session.commit()
+
+    writer.flush()
+    history = ProductHistory.query.filter_by(action='update').all()
+    assert [(h.old_quantity, h.new_quantity) for h in history] == [(1, 2)]
+
+def test_failed_batch_is_replayed(app, tmp_path, monkeypatch):
+    db.session.add(Product(id=1, name='Sodium', quantity=1, location='box'))
+    db.session.commit()
+
+    journal = tmp_path / 'failed.journal'
+    writer = HistoryWriter(db.engine, ProductHistory.__table__, flush_interval=0.01,
+                           journal_path=str(journal), retries=2, retry_backoff=0).start()
+    attempts = []
+
+    def failing_insert(rows):
+        attempts.append(rows)
+        raise RuntimeError('base indisponible')
+
+    monkeypatch.setattr(writer, '_insert', failing_insert)
+    event = {'product_id': 1, 'timestamp': datetime(2025, 1, 1), 'action': 'update',
+             'old_quantity': 1, 'new_quantity': 2, 'old_location_code': 1, 'new_location_code': 1}
+    writer.submit([event])
+    writer.flush()
+    writer.stop()
+
+    assert len(attempts) == 3
+    assert writer.metrics()['failed'] == 1
+    assert ProductHistory.query.count() == 0
+
+    # Le lot en échec reste dans le journal et est rejoué au démarrage suivant
+    HistoryWriter(db.engine, ProductHistory.__table__, journal_path=str(journal)).start().stop()
+    assert [h.new_quantity for h in ProductHistory.query.all()] == [2]
+    assert journal.read_text() == ''
+
+def test_full_queue_writes_synchronously(app):
+    db.session.add(Product(id=1, name='Sodium', quantity=1, location='box'))
+    db.session.commit()
+
+    # Sans thread d'écriture, la file d'un seul élément reste pleine
+    writer = HistoryWriter(db.engine, ProductHistory.__table__, max_queue=1, submit_timeout=0.01)
+    event = {'product_id': 1, 'timestamp': datetime(2025, 1, 1), 'action': 'update',
+             'old_quantity': 1, 'new_quantity': 2, 'old_location_code': 1, 'new_location_code': 1}
+    writer.submit([event, {**event, 'new_quantity': 3}])
+
+    assert [h.new_quantity for h in ProductHistory.query.all()] == [3]
+    assert writer.metrics()['queue_depth'] == 1
+
+def test_journal_is_compacted(app, tmp_path):
+    db.session.add(Product(id=1, name='Sodium', quantity=1, location='box'))
+    db.session.commit()
+
+    journal = tmp_path / 'compact.journal'
+    writer = HistoryWriter(db.engine, ProductHistory.__table__, flush_interval=0.01,
+                           journal_path=str(journal), journal_max_bytes=500).start()
+    event = {'product_id': 1, 'timestamp': datetime(2025, 1, 1), 'action': 'update',
+             'old_quantity': 1, 'new_quantity': 2, 'old_location_code': 1, 'new_location_code': 1}
+    for quantity in range(20):
+        writer.submit([{**event, 'new_quantity': quantity}])
+        writer.flush()
+        assert journal.stat().st_size <= 1000
+    writer.stop()
+    assert ProductHistory.query.count() == 20
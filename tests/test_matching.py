@@ -0,0 +1,76 @@
+from app import create_app, db
+from app.catalogue import save_product
+from app.matching import MatchReport, ProductNameMatcher, get_matcher, normalize
+from app.models import PRODUCT_NAME_MAPPING
+from config import TestingConfig
+
+def test_normalize():
+    assert normalize('  seringue   20ml ') == 'SERINGUE 20ML'
+
+def test_exact_match():
+    matcher = get_matcher()
+    assert matcher.match('DIALYSEUR FX80 (1/RA)') == ('Dialyseurs', 'exact')
+    assert matcher.match('seringue  20') == ('Seringues 20 ml', 'exact')
+
+def test_fuzzy_match():
+    matcher = get_matcher()
+    # Libellé qui commence par un alias connu
+    assert matcher.match('SERINGUE 20 ML STERILE') == ('Seringues 20 ml', 'fuzzy')
+    # Début de libellé sans ambiguïté
+    assert matcher.match('ENOXAPARINE') == ('Enoxaparine', 'fuzzy')
+    # L'alias doit se terminer sur une limite de mot
+    assert matcher.match('SERINGUE 200') == (None, None)
+    # Début de libellé ambigu
+    assert matcher.match('SERINGUE') == (None, None)
+
+def test_fuzzy_match_minimum_prefix():
+    matcher = get_matcher()
+    # Début trop court pour être significatif
+    assert matcher.match('D') == (None, None)
+    assert matcher.match('ENO') == (None, None)
+    assert matcher.match('ENOX') == ('Enoxaparine', 'fuzzy')
+    # Mot entier d'un alias, même court
+    assert matcher.match('AIG') == ('Aiguilles à fistules', 'fuzzy')
+
+def test_fuzzy_disabled():
+    matcher = ProductNameMatcher(PRODUCT_NAME_MAPPING, fuzzy=False)
+    assert matcher.match('SERINGUE 20 ML STERILE') == (None, None)
+
+def test_matcher_cache_invalidation():
+    mapping = {'Sodium': ['SODIUM']}
+    matcher = get_matcher(mapping)
+    assert get_matcher(mapping) is matcher
+
+    mapping['Sodium'].append('NACL')
+    updated = get_matcher(mapping)
+    assert updated is not matcher
+    assert updated.match('NACL') == ('Sodium', 'exact')
+    get_matcher()
+
+def test_matcher_follows_catalogue_version():
+    class Config(TestingConfig):
+        CATALOGUE_CHECK_INTERVAL = 0
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        matcher = get_matcher()
+        assert get_matcher() is matcher
+
+        save_product('Compresses', ['COMPRESSES STERILES'])
+        updated = get_matcher()
+        assert updated is not matcher
+        assert updated.match('COMPRESSES STERILES') == ('Compresses', 'exact')
+        db.session.remove()
+        db.drop_all()
+
+def test_match_report():
+    report = MatchReport()
+    report.add((0, 1), 'SERINGUE 20', 'Seringues 20 ml', 'exact')
+    report.add((0, 2), 'SERINGUE 20 ML', 'Seringues 20 ml', 'fuzzy')
+    report.add((0, 3), 'INCONNU', None, None)
+    assert report.to_dict() == {
+        'exact': [[0, 1, 'SERINGUE 20', 'Seringues 20 ml']],
+        'fuzzy': [[0, 2, 'SERINGUE 20 ML', 'Seringues 20 ml']],
+        'unmatched': [[0, 3, 'INCONNU']],
+    }
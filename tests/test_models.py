@@ -1,6 +1,7 @@
 import pytest
 from app import create_app, db
-from app.models import Product
+from app.models import Product, AVAILABLE_PRODUCTS
+from app.totals import compute_product_totals
 
 @pytest.fixture
 def app():
@@ -42,3 +43,30 @@ def test_product_location_validation(app):
                 location='invalid_location'  # Location invalide
             )
         assert "Location must be one of: box, apartment" in str(excinfo.value)
+
+def test_initialize_products_only_creates_missing(app):
+    with app.app_context():
+        db.session.add(Product(name='Lignes à sang', quantity=7, location='box'))
+        db.session.commit()
+
+        created = Product.initialize_products()
+        assert created == 2 * len(AVAILABLE_PRODUCTS) - 1
+        assert Product.query.filter_by(name='Lignes à sang', location='box').one().quantity == 7
+
+        # Un second appel ne crée plus rien
+        assert Product.initialize_products() == 0
+
+def test_compute_product_totals(app):
+    with app.app_context():
+        db.session.add_all([
+            Product(name='Lignes à sang', quantity=10, location='box'),
+            Product(name='Lignes à sang', quantity=5, location='apartment'),
+            Product(name='K7 FLOW', quantity=3, location='apartment'),
+        ])
+        db.session.commit()
+
+        totals = compute_product_totals()
+        assert totals['Lignes à sang'] == {'box': 10, 'apartment': 5, 'total': 15}
+        assert totals['K7 FLOW'] == {'box': 0, 'apartment': 3, 'total': 3}
+        assert totals['Dialyseurs'] == {'box': 0, 'apartment': 0, 'total': 0}
+        assert list(totals)[:len(AVAILABLE_PRODUCTS)] == AVAILABLE_PRODUCTS
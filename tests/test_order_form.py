@@ -0,0 +1,116 @@
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from docx import Document
+
+from app import create_app, db, order_form
+from config import TestingConfig
+
+def build_template(path, labels):
+    document = Document()
+    table = document.add_table(rows=len(labels), cols=4)
+    for row, label in zip(table.rows, labels):
+        row.cells[1].text = label
+        row.cells[3].text = '?'
+    document.save(path)
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = str(tmp_path / 'modele.docx')
+    build_template(path, ['Désignation', 'SERINGUE 20', 'DIALYSEUR FX80 (1/RA)', 'SERINGUE 20 ML STERILE'])
+    yield path
+    order_form.clear_cache()
+
+def test_template_report(template_path):
+    template = order_form.get_template(template_path)
+    assert [entry[1] for entry in template.report.exact] == [1, 2]
+    assert [entry[1] for entry in template.report.fuzzy] == [3]
+    assert [entry[1] for entry in template.report.unmatched] == [0]
+
+def test_fill_template(template_path):
+    template = order_form.get_template(template_path)
+    content = template.fill({'Seringues 20 ml': 12, 'Dialyseurs': 4})
+
+    table = Document(io.BytesIO(content)).tables[0]
+    assert [row.cells[3].text for row in table.rows] == ['?', '12', '4', '12']
+
+    # Le modèle en cache n'est pas modifié par le remplissage
+    content = template.fill({})
+    table = Document(io.BytesIO(content)).tables[0]
+    assert [row.cells[3].text for row in table.rows] == ['?', '0', '0', '0']
+
+def test_template_cache_invalidation(template_path):
+    template = order_form.get_template(template_path)
+    assert order_form.get_template(template_path) is template
+
+    build_template(template_path, ['ENOXAPARINE 2 000 UI/0,2 ml seringue (1/RA)'])
+    stat = os.stat(template_path)
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    reloaded = order_form.get_template(template_path)
+    assert reloaded is not template
+    assert reloaded.report.exact[0][3] == 'Enoxaparine'
+
+def test_batch_shares_single_template(template_path):
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        template = order_form.get_template(template_path)
+        assert len(list(order_form.generate_batch([{}, {}], 1, template_path))) == 2
+        # Bons unique et par lot alternés : ni matcher ni modèle reconstruits
+        assert order_form.get_template(template_path) is template
+        db.session.remove()
+        db.drop_all()
+
+def test_archive_disabled(tmp_path):
+    config = {'ORDER_ARCHIVE_ENABLED': False, 'ORDER_ARCHIVE_DIR': str(tmp_path)}
+    assert order_form.archive_order(config, 'bon.docx', b'contenu') is None
+    assert os.listdir(tmp_path) == []
+
+def test_archive_retention(tmp_path):
+    config = {
+        'ORDER_ARCHIVE_ENABLED': True,
+        'ORDER_ARCHIVE_DIR': str(tmp_path),
+        'ORDER_ARCHIVE_RETENTION_DAYS': 30,
+        'ORDER_ARCHIVE_MAX_FILES': 2,
+    }
+    old_file = tmp_path / 'ancien.docx'
+    old_file.write_bytes(b'ancien')
+    os.utime(old_file, (0, 0))
+
+    for index in range(3):
+        path = order_form.archive_order(config, f'bon_{index}.docx', b'contenu').result()
+        mtime = time.time() - 300 + index
+        os.utime(path, (mtime, mtime))
+
+    assert sorted(os.listdir(tmp_path)) == ['bon_1.docx', 'bon_2.docx']
+
+def test_parse_orders():
+    assert order_form.parse_orders([{'name': 'p1', 'quantities': {'Sodium': '2'}}]) == [
+        {'name': 'p1', 'quantities': {'Sodium': 2}}
+    ]
+    with pytest.raises(ValueError):
+        order_form.parse_orders([])
+    with pytest.raises(ValueError):
+        order_form.parse_orders([{'name': 'p1'}])
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_orders_zip(template_path, workers):
+    orders = [
+        {'name': 'patient 1', 'quantities': {'Dialyseurs': 1}},
+        {'name': 'patient 1', 'quantities': {'Dialyseurs': 2}},
+        {'name': '', 'quantities': {'Dialyseurs': 3}},
+    ]
+    content = b''.join(order_form.iter_orders_zip(orders, workers, template_path))
+
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        names = archive.namelist()
+        assert names == ['patient_1.docx', 'patient_1_2.docx', 'BON_COMMANDE_3.docx']
+        quantities = [
+            Document(io.BytesIO(archive.read(name))).tables[0].rows[2].cells[3].text
+            for name in names
+        ]
+    assert quantities == ['1', '2', '3']
@@ -0,0 +1,123 @@
+import json
+import logging
+
+import pytest
+
+from app import create_app, db
+from app.models import Product
+from app.query_metrics import QueryBudgetExceeded, assert_max_queries
+from app.seeding import ensure_products_seeded
+from config import TestingConfig
+
+class MetricsConfig(TestingConfig):
+    QUERY_METRICS_ENABLED = True
+    QUERY_BUDGET_STRICT = True
+
+def make_app(config):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        ensure_products_seeded()
+    return app
+
+@pytest.fixture
+def app():
+    app = make_app(MetricsConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_disabled_by_default():
+    class Config(TestingConfig):
+        QUERY_METRICS_ENABLED = False
+
+    app = make_app(Config)
+    client = app.test_client()
+    assert 'Server-Timing' not in client.get('/').headers
+    assert client.get('/metrics').status_code == 404
+    assert json.loads(client.get('/api/query-metrics').data) == {'enabled': False}
+
+def test_server_timing_header(client):
+    response = client.get('/api/history')
+    assert response.status_code == 200
+    db_timing, app_timing = response.headers['Server-Timing'].split(', ')
+    assert db_timing.startswith('db;dur=') and db_timing.endswith(';desc="1 queries"')
+    assert app_timing.startswith('app;dur=')
+
+def test_prometheus_metrics(client):
+    client.get('/api/history')
+    client.get('/api/history')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode()
+    assert '# TYPE diadom_db_queries_total counter' in text
+    assert 'diadom_http_requests_total{endpoint="main.api_history",method="GET",status="200"} 2' in text
+    assert 'diadom_db_queries_total{endpoint="main.api_history"} 2' in text
+    assert 'diadom_db_queries_per_request_max{endpoint="main.api_history"} 1' in text
+
+def test_slowest_statements(client):
+    client.get('/api/history')
+    data = json.loads(client.get('/api/query-metrics').data)
+    assert data['routes']['main.api_history']['queries'] == 1
+    assert data['routes']['main.api_history']['budget'] == TestingConfig.QUERY_BUDGETS['main.api_history']
+    assert data['slowest'][0]['statement'].startswith('SELECT')
+    assert {entry['endpoint'] for entry in data['slowest']} == {'main.api_history'}
+
+def test_budget_exceeded_fails_in_strict_mode():
+    class Config(MetricsConfig):
+        QUERY_BUDGETS = {'main.api_history': 0}
+
+    client = make_app(Config).test_client()
+    with pytest.raises(QueryBudgetExceeded, match='main.api_history: 1 requêtes SQL'):
+        client.get('/api/history')
+
+def test_budget_exceeded_is_logged(caplog):
+    class Config(MetricsConfig):
+        QUERY_BUDGET_STRICT = False
+        QUERY_BUDGETS = {}
+        QUERY_BUDGET_DEFAULT = 0
+
+    client = make_app(Config).test_client()
+    with caplog.at_level(logging.WARNING):
+        assert client.get('/api/history').status_code == 200
+    assert 'main.api_history: 1 requêtes SQL (budget : 0)' in caplog.text
+    data = json.loads(client.get('/api/query-metrics').data)
+    assert data['routes']['main.api_history']['budget_exceeded'] == 1
+
+def test_routes_within_budget(client):
+    product = Product.query.filter_by(location='box').first()
+    product_id = product.id
+    responses = [
+        client.get('/'),
+        client.get('/history'),
+        client.get('/api/history'),
+        client.get('/api/products/changes'),
+        client.get('/api/inventory/as-of?ts=2030-01-01T00:00:00'),
+        client.get('/api/forecast'),
+        client.get('/api/catalogue'),
+        client.get('/api/locations'),
+        client.post('/api/products', data={'name': product.name, 'quantity': 2, 'location': 'box'}),
+        client.put(f'/api/products/{product_id}', json={'quantity': 5, 'location': 'box'}),
+        client.post('/api/reset-inventory'),
+        client.delete(f'/api/products/{product_id}'),
+    ]
+    assert all(response.status_code < 400 for response in responses)
+
+def test_assert_max_queries_catches_n_plus_one(app):
+    products = Product.query.all()
+    db.session.expire_all()
+    with pytest.raises(QueryBudgetExceeded, match=f'{len(products) + 1} requêtes SQL'):
+        with assert_max_queries(2):
+            for product in Product.query.all():
+                product.history  # Chargement paresseux : une requête par produit
+
+    db.session.expire_all()
+    with assert_max_queries(1) as recorder:
+        Product.query.all()
+    assert recorder.count == 1
@@ -0,0 +1,66 @@
+"""Vérifie avec EXPLAIN QUERY PLAN que les requêtes fréquentes utilisent un index."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db, sync
+from app.history import build_history_query, encode_cursor
+from app.models import Product, ProductHistory
+from config import TestingConfig
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def query_plan(query):
+    statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).all()
+    return [row[-1] for row in rows]
+
+def assert_uses_index(plan):
+    for step in plan:
+        # Un parcours complet de table apparaît comme « SCAN <table> » sans index
+        if step.startswith('SCAN') and 'INDEX' not in step:
+            pytest.fail(f'Parcours complet de table: {plan}')
+        assert 'TEMP B-TREE' not in step, f'Tri sans index: {plan}'
+
+def test_product_lookup_uses_index(app):
+    plan = query_plan(Product.of_tenant().filter_by(name='Sodium', location='box'))
+    assert_uses_index(plan)
+    assert any('ix_product_tenant_catalogue_location' in step for step in plan)
+
+def test_product_history_lookup_uses_index(app):
+    query = ProductHistory.query.filter_by(product_id=1).order_by(ProductHistory.timestamp)
+    plan = query_plan(query)
+    assert_uses_index(plan)
+    assert any('ix_product_history_product_id_timestamp' in step for step in plan)
+
+def test_history_sort_uses_index(app):
+    query = ProductHistory.of_tenant().order_by(ProductHistory.timestamp.desc(), ProductHistory.id.desc()).limit(50)
+    plan = query_plan(query)
+    assert_uses_index(plan)
+    assert any('ix_product_history_tenant_timestamp_id' in step for step in plan)
+
+def test_history_cursor_uses_index(app):
+    cursor = encode_cursor(ProductHistory(id=10, timestamp=datetime(2025, 1, 1)))
+    plan = query_plan(build_history_query(cursor=cursor, action='update'))
+    assert_uses_index(plan)
+
+def test_product_changes_uses_index(app):
+    cursor = sync.encode_cursor(Product(id=3, change_seq=42))
+    plan = query_plan(sync.build_changes_query(cursor))
+    assert_uses_index(plan)
+    assert any('ix_product_tenant_change_seq_id' in step for step in plan)
+
+def test_tenant_totals_use_index(app):
+    statement = (db.session.query(Product.catalogue_id)
+                 .filter(Product.tenant == 'patient-1').group_by(Product.catalogue_id))
+    plan = query_plan(statement)
+    assert_uses_index(plan)
+    assert any('ix_product_tenant_catalogue_location' in step for step in plan)
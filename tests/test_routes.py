@@ -1,5 +1,6 @@
 import pytest
-from app import create_app, db
+from docx import Document
+from app import create_app, db, order_form
 from app.models import Product, ProductHistory, AVAILABLE_PRODUCTS
 import json
 from datetime import datetime
@@ -322,6 +323,17 @@ def test_delete_product(client, init_database):
         deleted_product = Product.query.get(product.id)
         assert deleted_product is None
 
+        # L'historique du produit est conservé, avec l'événement de suppression
+        history = ProductHistory.query.filter_by(product_id=product.id).order_by(ProductHistory.id).all()
+        assert [(h.action, h.old_quantity, h.new_quantity) for h in history] == [
+            ('create', None, 5), ('delete', 5, None)
+        ]
+
+    # Le produit supprimé garde son nom dans l'historique
+    response = client.get('/history')
+    assert 'Suppression'.encode() in response.data
+    assert 'Lignes à sang'.encode() in response.data
+
 def test_reset_inventory(client, init_database):
     # Ajouter des produits
     client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
@@ -369,3 +381,325 @@ def test_generate_order(client, init_database):
     assert response.status_code == 200
     assert response.headers['Content-Type'] == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
     assert 'BON_COMMANDE_' in response.headers['Content-Disposition']
+
+def test_order_match_report(client, init_database, tmp_path, monkeypatch):
+    path = str(tmp_path / 'modele.docx')
+    document = Document()
+    table = document.add_table(rows=3, cols=4)
+    for row, label in zip(table.rows, ['Désignation', 'SERINGUE 20', 'SERINGUE 20 ML STERILE']):
+        row.cells[1].text = label
+    document.save(path)
+    monkeypatch.setattr(order_form, 'TEMPLATE_PATH', path)
+
+    response = client.get('/api/order-match')
+    order_form.clear_cache()
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['counts'] == {'exact': 1, 'fuzzy': 1, 'unmatched': 1}
+    assert data['unmatched'] == [[0, 0, 'Désignation']]
+    assert data['fuzzy'] == [[0, 2, 'SERINGUE 20 ML STERILE', 'Seringues 20 ml']]
+
+def test_history_pagination(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    client.post('/api/products', data={'name': 'K7 FLOW', 'quantity': 3, 'location': 'apartment'})
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 1, 'location': 'box'})
+
+    response = client.get('/api/history?limit=2')
+    assert response.status_code == 200
+    first_page = json.loads(response.data)
+    assert len(first_page['history']) == 2
+    assert first_page['next_cursor'] is not None
+
+    response = client.get(f"/api/history?limit=2&cursor={first_page['next_cursor']}")
+    second_page = json.loads(response.data)
+    assert len(second_page['history']) == 1
+    assert second_page['next_cursor'] is None
+
+    ids = [entry['id'] for entry in first_page['history'] + second_page['history']]
+    assert len(set(ids)) == 3
+
+    # Filtre par action et paramètre invalide
+    response = client.get('/api/history?action=update')
+    assert json.loads(response.data)['history'] == []
+    assert client.get('/api/history?limit=0').status_code == 400
+
+    # Une date de fin sans heure inclut toute la journée
+    today = datetime.utcnow().date()
+    response = client.get(f'/api/history?start={today.isoformat()}&end={today.isoformat()}')
+    assert len(json.loads(response.data)['history']) == 3
+    response = client.get(f'/api/history?end={today.isoformat()}T00:00:00')
+    assert json.loads(response.data)['history'] == []
+    # La date saisie est réaffichée telle quelle dans le formulaire
+    response = client.get('/history?end=2025-01-31')
+    assert b'value="2025-01-31"' in response.data
+
+    response = client.get('/history?limit=2')
+    assert response.status_code == 200
+    assert 'Page suivante'.encode() in response.data
+
+def test_export_history_csv(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    client.post('/api/reset-inventory')
+
+    response = client.get('/api/export-history-csv')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert 'historique_' in response.headers['Content-Disposition']
+
+    lines = response.data.decode('utf-8').splitlines()
+    assert lines[0].startswith('ID,ID produit,Date,Action')
+    assert [line.split(',')[3] for line in lines[1:]] == ['create', 'reset']
+
+def test_generate_orders_invalid_payload(client, init_database):
+    response = client.post('/api/generate-orders', json={'orders': []})
+    assert response.status_code == 400
+    assert 'error' in json.loads(response.data)
+
+def test_bulk_update_products(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    client.post('/api/products', data={'name': 'K7 FLOW', 'quantity': 3, 'location': 'apartment'})
+    with client.application.app_context():
+        ids = [product.id for product in Product.query.order_by(Product.id)]
+
+    response = client.patch('/api/products', json=[
+        {'id': ids[0], 'quantity': 8, 'location': 'box'},
+        {'id': ids[1], 'quantity': 3, 'location': 'apartment'},  # Inchangé
+    ])
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['updated'] == 1
+    assert data['products'][0]['quantity'] == 8
+
+    with client.application.app_context():
+        assert db.session.get(Product, ids[0]).quantity == 8
+        history = ProductHistory.query.filter_by(action='update').all()
+        assert [(h.product_id, h.old_quantity, h.new_quantity) for h in history] == [(ids[0], 5, 8)]
+
+def test_bulk_update_products_is_atomic(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    with client.application.app_context():
+        product_id = Product.query.first().id
+
+    response = client.patch('/api/products', json=[
+        {'id': product_id, 'quantity': 8, 'location': 'box'},
+        {'id': product_id + 100, 'quantity': 1, 'location': 'box'},
+    ])
+    assert response.status_code == 404
+    assert json.loads(response.data)['missing'] == [product_id + 100]
+
+    response = client.patch('/api/products', json=[
+        {'id': product_id, 'quantity': 8, 'location': 'garage'},
+    ])
+    assert response.status_code == 400
+
+    with client.application.app_context():
+        assert db.session.get(Product, product_id).quantity == 5
+        assert ProductHistory.query.filter_by(action='update').count() == 0
+
+def test_bulk_update_version_conflict(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    with client.application.app_context():
+        product = Product.query.first()
+        product_id, version = product.id, product.version
+    client.put(f'/api/products/{product_id}', json={'quantity': 6, 'location': 'box'})
+
+    response = client.patch('/api/products', json=[
+        {'id': product_id, 'quantity': 8, 'location': 'box', 'version': version},
+    ])
+    assert response.status_code == 409
+    data = json.loads(response.data)
+    assert data['error'] == 'Le produit a été modifié entre-temps'
+    assert [(p['id'], p['quantity'], p['version']) for p in data['products']] == [(product_id, 6, version + 1)]
+
+    response = client.patch('/api/products', json=[
+        {'id': product_id, 'quantity': 8, 'location': 'box', 'version': version + 1},
+    ])
+    assert response.status_code == 200
+    with client.application.app_context():
+        assert db.session.get(Product, product_id).quantity == 8
+
+def test_move_product_to_location_holding_it(client, init_database):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 5, 'location': 'box'})
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 3, 'location': 'apartment'})
+    with client.application.app_context():
+        box = Product.query.filter_by(name='Sodium', location='box').one().id
+        apartment = Product.query.filter_by(name='Sodium', location='apartment').one().id
+
+    # Les quantités sont regroupées à l'emplacement cible
+    response = client.put(f'/api/products/{box}', json={'quantity': 5, 'location': 'apartment'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert {p['id']: (p['quantity'], p['location']) for p in data['products']} == {
+        box: (0, 'box'), apartment: (8, 'apartment')
+    }
+
+    # Même chose par lot
+    response = client.patch('/api/products', json=[{'id': apartment, 'quantity': 8, 'location': 'box'}])
+    assert response.status_code == 200
+
+    with client.application.app_context():
+        assert db.session.get(Product, box).quantity == 8
+        assert db.session.get(Product, apartment).quantity == 0
+        history = ProductHistory.query.filter_by(action='update').order_by(ProductHistory.id).all()
+        assert [(h.product_id, h.old_quantity, h.new_quantity) for h in history] == [
+            (box, 5, 0), (apartment, 3, 8), (apartment, 8, 0), (box, 0, 8)
+        ]
+
+def test_reset_inventory_by_location(client, init_database):
+    client.post('/api/products', data={'name': 'Lignes à sang', 'quantity': 5, 'location': 'box'})
+    client.post('/api/products', data={'name': 'K7 FLOW', 'quantity': 3, 'location': 'apartment'})
+
+    response = client.post('/api/reset-inventory', data={'location': 'box'})
+    assert response.status_code == 302
+
+    with client.application.app_context():
+        quantities = {p.location: p.quantity for p in Product.query.all()}
+        assert quantities == {'box': 0, 'apartment': 3}
+
+        history = ProductHistory.query.filter_by(action='reset').all()
+        assert len(history) == 1
+        assert history[0].old_quantity == 5
+        assert history[0].new_quantity == 0
+        assert history[0].new_location == 'box'
+
+def test_add_existing_product_updates_quantity(client, init_database):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 5, 'location': 'box'})
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 8, 'location': 'box'})
+
+    with client.application.app_context():
+        products = Product.query.filter_by(name='Sodium', location='box').all()
+        assert len(products) == 1
+        assert products[0].quantity == 8
+        actions = [h.action for h in ProductHistory.query.order_by(ProductHistory.id)]
+        assert actions == ['create', 'update']
+
+def test_index_etag(client, init_database):
+    response = client.get('/')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    # Toute écriture invalide la page en cache
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 4, 'location': 'box'})
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Produit ajouté avec succès'.encode() in response.data
+    assert 'ETag' not in response.headers
+
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert '>4<'.encode() in response.data
+
+def test_product_changes(client, init_database):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 4, 'location': 'box'})
+    client.post('/api/products', data={'name': 'Dialyseurs', 'quantity': 2, 'location': 'box'})
+
+    data = json.loads(client.get('/api/products/changes').data)
+    assert [p['name'] for p in data['products']] == ['Sodium', 'Dialyseurs']
+    cursor = data['cursor']
+
+    data = json.loads(client.get(f'/api/products/changes?since={cursor}').data)
+    assert data['products'] == []
+    assert data['cursor'] == cursor
+
+    sodium_id = data['ids'][0]
+    client.put(f'/api/products/{sodium_id}', json={'quantity': 9, 'location': 'box'})
+    data = json.loads(client.get(f'/api/products/changes?since={cursor}').data)
+    assert [(p['id'], p['quantity']) for p in data['products']] == [(sodium_id, 9)]
+    assert data['cursor'] != cursor
+
+    # Suppression : le produit disparaît de la liste des IDs
+    client.delete(f'/api/products/{sodium_id}')
+    data = json.loads(client.get(f"/api/products/changes?since={data['cursor']}").data)
+    assert sodium_id not in data['ids']
+
+    assert client.get('/api/products/changes?since=invalide').status_code == 400
+
+def test_product_changes_late_commit(client, init_database):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 4, 'location': 'box'})
+    client.post('/api/products', data={'name': 'Dialyseurs', 'quantity': 2, 'location': 'box'})
+    data = json.loads(client.get('/api/products/changes').data)
+    sodium_id, dialyseurs_id = data['ids']
+    client.put(f'/api/products/{dialyseurs_id}', json={'quantity': 3, 'location': 'box'})
+    cursor = json.loads(client.get(f"/api/products/changes?since={data['cursor']}").data)['cursor']
+
+    # Transaction horodatée avant le curseur mais validée après lui
+    with client.application.app_context():
+        product = db.session.get(Product, sodium_id)
+        product.quantity = 7
+        product.last_modified = datetime(2000, 1, 1)
+        db.session.commit()
+    data = json.loads(client.get(f'/api/products/changes?since={cursor}').data)
+    assert [(p['id'], p['quantity']) for p in data['products']] == [(sodium_id, 7)]
+
+    # Les remises à zéro en lot font aussi avancer les numéros de modification
+    client.post('/api/reset-inventory')
+    data = json.loads(client.get(f"/api/products/changes?since={data['cursor']}").data)
+    assert sorted(p['id'] for p in data['products']) == [sodium_id, dialyseurs_id]
+
+def test_product_changes_long_poll(client, init_database):
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 4, 'location': 'box'})
+    cursor = json.loads(client.get('/api/products/changes').data)['cursor']
+
+    start = datetime.now()
+    data = json.loads(client.get(f'/api/products/changes?since={cursor}&wait=0.2').data)
+    assert data['products'] == []
+    assert (datetime.now() - start).total_seconds() >= 0.2
+
+def test_inventory_events_stream(app, client, init_database):
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    stream = response.response
+    assert next(stream) == b': connected\n\n'
+
+    client.post('/api/products', data={'name': 'Sodium', 'quantity': 4, 'location': 'box'})
+    chunk = next(stream).decode()
+    assert chunk.startswith('event: products\n')
+    product = json.loads(chunk.split('data: ')[1])['products'][0]
+    assert (product['name'], product['quantity']) == ('Sodium', 4)
+
+    client.delete(f"/api/products/{product['id']}")
+    assert next(stream) == f'event: delete\ndata: {{"id": {product["id"]}}}\n\n'.encode()
+
+    client.post('/api/reset-inventory')
+    assert next(stream) == b'event: reset\ndata: {"location": null}\n\n'
+    response.close()
+    assert not app.extensions['event_broker']._subscribers
+
+def test_update_product_version_conflict(client, init_database):
+    product = Product(name='Sodium', quantity=4, location='box')
+    db.session.add(product)
+    db.session.commit()
+    assert product.version == 1
+
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 5, 'location': 'box', 'version': 1})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    assert json.loads(response.data)['product']['version'] == 2
+
+    # Version périmée, par le champ version ou par If-Match
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 6, 'location': 'box', 'version': 1})
+    assert response.status_code == 409
+    data = json.loads(response.data)
+    assert (data['product']['quantity'], data['product']['version']) == (5, 2)
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 6, 'location': 'box'},
+                          headers={'If-Match': '"1"'})
+    assert response.status_code == 409
+    assert response.headers['ETag'] == '"2"'
+
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 6, 'location': 'box'},
+                          headers={'If-Match': '"2"'})
+    assert response.status_code == 200
+    # Sans version attendue, la modification reste acceptée
+    response = client.put(f'/api/products/{product.id}', json={'quantity': 7, 'location': 'box'})
+    assert json.loads(response.data)['product']['version'] == 4
+
+    # La remise à zéro incrémente aussi la version
+    client.post('/api/reset-inventory')
+    db.session.expire_all()
+    assert db.session.get(Product, product.id).version == 5
@@ -0,0 +1,130 @@
+import json
+import sqlite3
+
+import pytest
+
+from app import create_app, db
+from app.models import Product, ProductHistory
+from app.tenancy import current_tenant, use_tenant
+from config import TestingConfig
+
+@pytest.fixture
+def app():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def add(client, tenant, name, quantity, location='box'):
+    return client.post('/api/products', data={'name': name, 'quantity': quantity, 'location': location},
+                       headers={'X-Tenant': tenant})
+
+def test_routes_are_scoped_to_tenant(client):
+    add(client, 'patient-a', 'Sodium', 4)
+    add(client, 'patient-b', 'Sodium', 7)
+
+    data = json.loads(client.get('/api/products/changes', headers={'X-Tenant': 'patient-a'}).data)
+    assert [(p['name'], p['quantity']) for p in data['products']] == [('Sodium', 4)]
+    product_a = data['products'][0]['id']
+    data = json.loads(client.get('/api/products/changes', headers={'X-Tenant': 'patient-b'}).data)
+    assert [(p['name'], p['quantity']) for p in data['products']] == [('Sodium', 7)]
+    product_b = data['products'][0]['id']
+    assert product_a not in data['ids']
+
+    # Le produit d'un autre tenant est introuvable
+    response = client.put(f'/api/products/{product_a}', json={'quantity': 0, 'location': 'box'},
+                          headers={'X-Tenant': 'patient-b'})
+    assert response.status_code != 200
+    response = client.patch('/api/products', json=[{'id': product_a, 'quantity': 0, 'location': 'box'}],
+                            headers={'X-Tenant': 'patient-b'})
+    assert response.status_code == 404
+    client.delete(f'/api/products/{product_a}', headers={'X-Tenant': 'patient-b'})
+    assert db.session.get(Product, product_a).quantity == 4
+
+    client.post('/api/reset-inventory', headers={'X-Tenant': 'patient-b'})
+    db.session.expire_all()
+    assert db.session.get(Product, product_a).quantity == 4
+
+    csv = client.get('/api/export-csv', headers={'X-Tenant': 'patient-a'}).data.decode()
+    assert csv.count('Sodium') == 1 and ',4,' in csv
+    history = json.loads(client.get('/api/history', headers={'X-Tenant': 'patient-b'}).data)['history']
+    assert {entry['product_id'] for entry in history} == {product_b}
+    assert ProductHistory.query.filter_by(tenant='patient-a').count() == 1
+
+def test_tenant_from_query_string_is_remembered(client):
+    client.get('/?tenant=patient-a')
+    add(client, 'patient-a', 'Sodium', 3)
+    response = client.get('/')
+    # Le catalogue du patient a été initialisé, et ses quantités sont affichées
+    assert '>3<'.encode() in response.data
+    assert Product.query.filter_by(tenant='patient-a').count() == 30
+    assert Product.query.filter_by(tenant='default').count() == 0
+
+def test_invalid_tenant(client):
+    response = client.get('/api/products/changes', headers={'X-Tenant': '../secret'})
+    assert response.status_code == 400
+    assert 'invalide' in json.loads(response.data)['error']
+
+def test_use_tenant(app):
+    assert current_tenant() == 'default'
+    with use_tenant('patient-a'):
+        Product.initialize_products()
+        assert current_tenant() == 'patient-a'
+    assert current_tenant() == 'default'
+    assert {product.tenant for product in Product.query} == {'patient-a'}
+    with pytest.raises(ValueError):
+        with use_tenant('a/b'):
+            pass
+
+def test_events_are_scoped_to_tenant(client):
+    response = client.get('/api/events', buffered=False, headers={'X-Tenant': 'patient-b'})
+    stream = response.response
+    assert next(stream) == b': connected\n\n'
+    add(client, 'patient-a', 'Sodium', 4)
+    add(client, 'patient-b', 'Dialyseurs', 2)
+    product = json.loads(next(stream).decode().split('data: ')[1])['products'][0]
+    assert product['name'] == 'Dialyseurs'
+    response.close()
+
+@pytest.fixture
+def file_app(tmp_path):
+    class Config(TestingConfig):
+        TENANT_DATABASE_DIR = str(tmp_path / 'tenants')
+        HISTORY_WRITER_ENABLED = True
+        HISTORY_FLUSH_INTERVAL = 0.05
+
+    app = create_app(Config)
+    with app.app_context():
+        # La base principale garde les tables communes (catalogue)
+        db.create_all()
+        yield app
+        app.extensions['history_writer'].stop()
+        db.session.remove()
+        app.extensions['tenant_engines'].dispose()
+
+def test_database_per_tenant(file_app, tmp_path):
+    client = file_app.test_client()
+    add(client, 'patient-a', 'Sodium', 4)
+    add(client, 'patient-b', 'Sodium', 7)
+    add(client, 'patient-b', 'Dialyseurs', 1)
+    file_app.extensions['history_writer'].flush()
+
+    def rows(tenant, table):
+        with sqlite3.connect(tmp_path / 'tenants' / f'{tenant}.db') as connection:
+            return connection.execute(f'SELECT tenant, COUNT(*) FROM {table} GROUP BY tenant').fetchall()
+
+    assert rows('patient-a', 'product') == [('patient-a', 1)]
+    assert rows('patient-b', 'product') == [('patient-b', 2)]
+    # L'historique différé est écrit dans la base de son tenant
+    assert rows('patient-a', 'product_history') == [('patient-a', 1)]
+    assert rows('patient-b', 'product_history') == [('patient-b', 2)]
+    assert file_app.extensions['tenant_engines'].tenants() == ['patient-a', 'patient-b']
+
+    data = json.loads(client.get('/api/products/changes', headers={'X-Tenant': 'patient-b'}).data)
+    assert [p['name'] for p in data['products']] == ['Sodium', 'Dialyseurs']